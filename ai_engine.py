@@ -1,8 +1,19 @@
 import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import pandas as pd
 import numpy as np
-from granite_model import initialize_granite_model, generate_granite_response
+from granite_model import initialize_granite_model, agenerate_many, run_async
+from summarizer import summarize, SUMMARY_BUDGET_MS
+from prompts import build_prompt, record_usage, complete
+from database import get_learning_stats
+from recommender import get_recommender
 
 HF_TOKEN = os.getenv("HF_TOKEN")
 
@@ -71,25 +82,24 @@ def generate_content(ai_models, topic, difficulty="intermediate", learning_style
         st.error(f"Error generating content: {e}")
         return "An error occurred while generating content. Please try again."
 
-def evaluate_answer(ai_models, question, student_answer, reference_answer):
-    """Evaluate a student's answer and provide feedback"""
-    try:
-        if ai_models and "assessment_feedback" in ai_models:
-            # Simulated AI evaluation for demo purposes
-            if len(student_answer) < 10:
-                evaluation = "Your answer is too brief. Consider expanding on your ideas."
-            elif any(keyword in student_answer.lower() for keyword in reference_answer.lower().split()[:5]):
-                evaluation = "Good start! Your answer includes some key concepts, but could be more comprehensive."
-            else:
-                evaluation = "Your answer shows understanding of the topic. Well done!"
-                
-            return f"""
-            ## Evaluation of Your Answer
+EVALUATION_UNAVAILABLE = "AI evaluation not available. Please try again later."
 
-            **Question:** {question}
-
-            **Your answer:** {student_answer}
+def grade_answer(ai_models, question, student_answer, reference_answer):
+    """Feedback on a student's answer without the answer itself, or None if evaluation is unavailable
 
+    The result does not quote the student, so it can be shared between
+    students who gave the same answer.
+    """
+    if not ai_models or "assessment_feedback" not in ai_models:
+        return None
+    # Simulated AI evaluation for demo purposes
+    if len(student_answer) < 10:
+        evaluation = "Your answer is too brief. Consider expanding on your ideas."
+    elif any(keyword in student_answer.lower() for keyword in reference_answer.lower().split()[:5]):
+        evaluation = "Good start! Your answer includes some key concepts, but could be more comprehensive."
+    else:
+        evaluation = "Your answer shows understanding of the topic. Well done!"
+    return f"""
             **Feedback:**
             {evaluation}
 
@@ -100,8 +110,24 @@ def evaluate_answer(ai_models, question, student_answer, reference_answer):
 
             Keep practicing and refining your understanding!
             """
-        else:
-            return "AI evaluation not available. Please try again later."
+
+def format_evaluation(question, student_answer, feedback):
+    """Evaluation block showing the question and the student's own answer above the feedback"""
+    return f"""
+            ## Evaluation of Your Answer
+
+            **Question:** {question}
+
+            **Your answer:** {student_answer}
+            {feedback}"""
+
+def evaluate_answer(ai_models, question, student_answer, reference_answer):
+    """Evaluate a student's answer and provide feedback"""
+    try:
+        feedback = grade_answer(ai_models, question, student_answer, reference_answer)
+        if feedback is None:
+            return EVALUATION_UNAVAILABLE
+        return format_evaluation(question, student_answer, feedback)
     except Exception as e:
         st.error(f"Error evaluating answer: {e}")
         return "An error occurred while evaluating your answer. Please try again."
@@ -141,257 +167,232 @@ def answer_question(ai_models, title, content, topic):
         st.error(f"Error answering question: {e}")
         return "An error occurred while generating an answer. Please try again."
 
-def get_course_recommendations(ai_models, current_courses, interests, learning_style, recent_performance):
-    """Generate personalized course recommendations"""
-    try:
-        if ai_models and "course_recommendation" in ai_models:
-            # Simulated AI recommendation for demo purposes
-            interests_list = ", ".join(interests) if isinstance(interests, list) else interests
-            
-            return f"""
-            ## Personalized Learning Recommendations
+RECOMMENDATION_CANDIDATES = 8
+RECOMMENDATION_TTL = int(os.getenv("RECOMMENDATION_TTL", str(24 * 3600)))  # seconds before a plan is refreshed
+RECOMMENDATION_CACHE_SIZE = 1024
+RECOMMENDATION_RETRY_AFTER = int(os.getenv("RECOMMENDATION_RETRY_AFTER", "300"))  # seconds after a failed refresh, doubling per failure
+RECOMMENDATION_RETRY_MAX = 3600
 
-            Based on your current progress and interests in {interests_list}, here are some recommendations to enhance your learning journey:
+_plan_cache = OrderedDict()  # user_id -> {"hash", "plan", "created_at", "failures", "failed_at"}
+_plan_refreshing = set()
+_plan_lock = threading.Lock()
+_plan_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="recommendations")
 
-            1. **Next Course Recommendation**: Consider exploring "Advanced Applications of {interests_list if isinstance(interests, str) else interests[0] if interests else 'Your Subject'}"
-               - This would build upon your current knowledge
-               - Aligns with your {learning_style} learning style
-               - Would help improve your performance in areas where you scored {recent_performance}
+def _parse_recommendations(response, candidates, count):
+    """Ranked [{course_id, title, reason}] from a Granite response, keeping only known candidates"""
+    if not response or response.startswith("Error"):
+        return []
+    items = []
+    match = re.search(r"\[.*\]", response, re.DOTALL)
+    if match:
+        try:
+            items = [item for item in json.loads(match.group(0)) if isinstance(item, dict)]
+        except ValueError:
+            items = []
+    if not items:
+        # Free-text fallback: candidates in the order the model mentions them
+        mentioned = sorted((response.find(course_id), course_id) for course_id in candidates if course_id in response)
+        items = [{"course_id": course_id, "reason": ""} for _, course_id in mentioned]
 
-            2. **Skill Enhancement**: To complement your current courses, focus on developing skills in:
-               - Practical application of theoretical concepts
-               - Problem-solving techniques specific to your field
-               - Collaborative learning opportunities with peers
+    plan = []
+    for item in items:
+        course_id = str(item.get("course_id", "")).strip()
+        if course_id in candidates and all(p["course_id"] != course_id for p in plan):
+            plan.append({
+                "course_id": course_id,
+                "title": candidates[course_id]["title"],
+                "reason": str(item.get("reason", "")).strip()
+            })
+    return plan[:count]
 
-            These recommendations are personalized based on your unique learning profile and will help you progress effectively in your educational journey.
-            """
-        else:
-            return "AI recommendation not available. Please try again later."
-    except Exception as e:
-        st.error(f"Error generating recommendations: {e}")
-        return "An error occurred while generating recommendations. Please try again."
+def get_course_recommendations(ai_models, current_courses, interests, learning_style, recent_performance, candidates, count=3, user=None):
+    """Ask Granite to rank candidate courses for a learner; returns [{course_id, title, reason}]
+
+    candidates are course documents (e.g. the recommender's top courses);
+    current_courses are the titles of the learner's enrolled courses.
+    """
+    granite_model = ai_models.get("granite_model") if ai_models else None
+    if not granite_model or not candidates:
+        return []
+    by_id = {c["_id"]: c for c in candidates}
+    response, _ = complete(
+        granite_model, "recommendation", user=user,
+        interests=", ".join(interests) if isinstance(interests, list) else interests,
+        learning_style=learning_style,
+        performance=recent_performance,
+        enrolled=", ".join(current_courses) or "none",
+        candidates="\n".join(
+            f"- {c['_id']}: {c['title']} ({c.get('category', 'General')}, {c.get('difficulty', 'any level')})"
+            for c in candidates
+        ),
+        count=count
+    )
+    return _parse_recommendations(response, by_id, count)
 
-def generate_practice_questions(ai_models, topic, difficulty="intermediate", num_questions=3):
-    """Generate practice questions on a specific topic"""
+def learner_profile(db, user_id, stats=None):
+    """Compact, hashable summary of a learner and their candidate courses"""
+    stats = stats or get_learning_stats(db, user_id)
+    user = db["users"].find_one({"_id": user_id}) or {}
+    preferences = user.get("preferences", {})
+    progress = stats["progress_data"]
+    enrolled = progress["course"].tolist() if not progress.empty else []
+    course_progress = ", ".join(f"{row.course} {row.progress:.0f}%" for row in progress.head(5).itertuples()) if enrolled else "none"
+    candidates = get_recommender(db).recommend(user_id, k=RECOMMENDATION_CANDIDATES)
+    return {
+        "interests": preferences.get("interests", []),
+        "learning_style": preferences.get("learning_style", "not specified"),
+        "performance": f"average quiz score {stats['avg_score']:.0f}%, average progress {stats['avg_progress']:.0f}%; {course_progress}",
+        "enrolled": enrolled,
+        "candidates": [
+            {k: c.get(k) for k in ("_id", "title", "category", "difficulty")} for c in candidates
+        ]
+    }
+
+def _retry_delay(failures):
+    """Seconds to wait before another refresh after this many failed ones in a row"""
+    return min(RECOMMENDATION_RETRY_AFTER * 2 ** (failures - 1), RECOMMENDATION_RETRY_MAX)
+
+def _refresh_plan(granite_model, user_id, profile, profile_hash):
+    plan = None
     try:
-        if ai_models:
-            # Create structured practice questions based on the topic
-            questions = []
-            
-            # Define difficulty adjustments
-            complexity = {
-                "beginner": "basic, fundamental concepts with straightforward answers",
-                "intermediate": "moderately complex concepts that require some analysis",
-                "advanced": "complex, in-depth concepts that require critical thinking"
-            }
-            
-            # Generate different question types based on topic
-            if topic.lower() in ["python", "programming", "coding"]:
-                questions = [
-                    {
-                        "question": "What is the output of the following Python code?\n\nx = [1, 2, 3]\ny = x\ny.append(4)\nprint(x)",
-                        "options": [
-                            "A) [1, 2, 3]",
-                            "B) [1, 2, 3, 4]",
-                            "C) [4, 1, 2, 3]",
-                            "D) Error"
-                        ],
-                        "correct_answer": 1,  # B is correct (index 1)
-                        "explanation": "In Python, assignment operations create references to the same object, not copies. When we modify y by appending 4, we're also modifying x since they reference the same list object."
-                    },
-                    {
-                        "question": "Which of the following is NOT a valid way to create a dictionary in Python?",
-                        "options": [
-                            "A) dict(a=1, b=2)",
-                            "B) {'a': 1, 'b': 2}",
-                            "C) dict([('a', 1), ('b', 2)])",
-                            "D) {a=1, b=2}"
-                        ],
-                        "correct_answer": 3,  # D is correct (index 3)
-                        "explanation": "Option D is invalid syntax for dictionary creation in Python. The correct syntax would be {'a': 1, 'b': 2} or dict(a=1, b=2) or dict([('a', 1), ('b', 2)])."
-                    },
-                    {
-                        "question": "What is the primary purpose of the __init__ method in Python classes?",
-                        "options": [
-                            "A) To initialize class variables",
-                            "B) To initialize instance variables when an object is created",
-                            "C) To define class methods",
-                            "D) To end the execution of a program"
-                        ],
-                        "correct_answer": 1,  # B is correct (index 1)
-                        "explanation": "The __init__ method in Python is used to initialize instance variables when an object is created. It's called automatically when you create a new instance of a class."
-                    }
-                ]
-            elif topic.lower() in ["data science", "machine learning", "ai"]:
-                questions = [
-                    {
-                        "question": "Which of the following is NOT a supervised learning algorithm?",
-                        "options": [
-                            "A) Linear Regression",
-                            "B) K-means Clustering",
-                            "C) Support Vector Machines",
-                            "D) Logistic Regression"
-                        ],
-                        "correct_answer": 1,  # B is correct (index 1)
-                        "explanation": "K-means Clustering is an unsupervised learning algorithm used for finding clusters in data. Linear Regression, Support Vector Machines, and Logistic Regression are all supervised learning algorithms."
-                    },
-                    {
-                        "question": "What is the purpose of regularization in machine learning?",
-                        "options": [
-                            "A) To increase model complexity",
-                            "B) To decrease training time",
-                            "C) To prevent overfitting",
-                            "D) To improve model interpretability"
-                        ],
-                        "correct_answer": 2,  # C is correct (index 2)
-                        "explanation": "Regularization is used to prevent overfitting by adding a penalty term to the loss function, which discourages the model from learning overly complex patterns that may not generalize well to new data."
-                    },
-                    {
-                        "question": "Which of the following metrics is most appropriate for evaluating a classification model on an imbalanced dataset?",
-                        "options": [
-                            "A) Accuracy",
-                            "B) F1 Score",
-                            "C) Mean Squared Error",
-                            "D) R-squared"
-                        ],
-                        "correct_answer": 1,  # B is correct (index 1)
-                        "explanation": "The F1 Score is a good metric for imbalanced datasets as it combines precision and recall. Accuracy can be misleading on imbalanced datasets, while MSE and R-squared are typically used for regression problems."
-                    }
-                ]
-            elif topic.lower() in ["mathematics", "math", "algebra", "calculus"]:
-                questions = [
-                    {
-                        "question": "What is the derivative of f(x) = x³ + 2x² - 5x + 3?",
-                        "options": [
-                            "A) 3x² + 4x - 5",
-                            "B) 3x² + 4x + 5",
-                            "C) x² + 4x - 5",
-                            "D) 3x² - 4x - 5"
-                        ],
-                        "correct_answer": 0,  # A is correct (index 0)
-                        "explanation": "The derivative of x³ is 3x², the derivative of 2x² is 4x, the derivative of -5x is -5, and the derivative of the constant 3 is 0. Adding these together gives 3x² + 4x - 5."
-                    },
-                    {
-                        "question": "Solve the equation: 2x² - 5x - 3 = 0",
-                        "options": [
-                            "A) x = 3 or x = -0.5",
-                            "B) x = 3 or x = 0.5",
-                            "C) x = -3 or x = 0.5",
-                            "D) x = -3 or x = -0.5"
-                        ],
-                        "correct_answer": 0,  # A is correct (index 0)
-                        "explanation": "Using the quadratic formula x = (-b ± √(b²-4ac))/(2a) with a=2, b=-5, c=-3, we get x = (5 ± √(25+24))/4 = (5 ± √49)/4 = (5 ± 7)/4, which gives x = 3 or x = -0.5."
-                    },
-                    {
-                        "question": "What is the value of ∫(2x + 3) dx?",
-                        "options": [
-                            "A) x² + 3x",
-                            "B) x² + 3x + C",
-                            "C) 2x + 3 + C",
-                            "D) 2(x² + 3x)"
-                        ],
-                        "correct_answer": 1,  # B is correct (index 1)
-                        "explanation": "The integral of 2x is x², the integral of 3 is 3x, and we need to add a constant of integration C. So ∫(2x + 3) dx = x² + 3x + C."
-                    }
-                ]
+        plan = get_course_recommendations(
+            {"granite_model": granite_model}, profile["enrolled"], profile["interests"],
+            profile["learning_style"], profile["performance"], profile["candidates"], user=user_id
+        )
+    finally:
+        with _plan_lock:
+            entry = _plan_cache.setdefault(user_id, {"hash": None, "plan": None, "created_at": 0.0})
+            if plan:
+                entry.update(hash=profile_hash, plan=plan, created_at=time.time(), failures=0, failed_at=None)
             else:
-                # Generic questions for other topics
-                questions = [
-                    {
-                        "question": f"What is a key principle of {topic}?",
-                        "options": [
-                            f"A) {topic} is primarily focused on theoretical concepts without practical applications",
-                            f"B) {topic} integrates multiple disciplines to solve complex problems",
-                            f"C) {topic} was developed primarily in the 21st century",
-                            f"D) {topic} is mainly used in academic research but rarely in industry"
-                        ],
-                        "correct_answer": 1,  # B is correct (index 1)
-                        "explanation": f"{topic} is known for its interdisciplinary approach, integrating knowledge from various fields to address complex problems effectively."
-                    },
-                    {
-                        "question": f"Which statement best describes the relationship between {topic} and critical thinking?",
-                        "options": [
-                            f"A) {topic} replaces the need for critical thinking with algorithmic procedures",
-                            f"B) {topic} and critical thinking are unrelated disciplines",
-                            f"C) {topic} enhances critical thinking by providing analytical frameworks",
-                            f"D) Critical thinking is only relevant to theoretical aspects of {topic}"
-                        ],
-                        "correct_answer": 2,  # C is correct (index 2)
-                        "explanation": f"{topic} provides structured frameworks that enhance critical thinking by encouraging systematic analysis, evaluation of evidence, and logical reasoning."
-                    },
-                    {
-                        "question": f"Which of the following best represents an application of {topic}?",
-                        "options": [
-                            f"A) Developing theoretical models without practical implementation",
-                            f"B) Applying established principles to solve novel problems",
-                            f"C) Memorizing facts and procedures",
-                            f"D) Working exclusively with qualitative data"
-                        ],
-                        "correct_answer": 1,  # B is correct (index 1)
-                        "explanation": f"A key application of {topic} involves applying established principles and methodologies to address new and emerging problems, demonstrating its practical value."
-                    }
-                ]
-            
-            # Adjust number of questions if needed
-            if len(questions) > num_questions:
-                questions = questions[:num_questions]
-            elif len(questions) < num_questions:
-                # Add generic questions if we need more
-                for i in range(len(questions), num_questions):
-                    questions.append({
-                        "question": f"Question {i+1}: According to modern research, what is a significant factor in understanding {topic}?",
-                        "options": [
-                            f"A) Historical development is irrelevant to understanding {topic}",
-                            f"B) Comprehensive knowledge of {topic} requires understanding its foundational principles",
-                            f"C) {topic} is best learned through memorization alone",
-                            f"D) {topic} concepts are unchanging and not subject to revision"
-                        ],
-                        "correct_answer": 1,  # B is correct (index 1)
-                        "explanation": f"Understanding the foundational principles of {topic} is essential for developing comprehensive knowledge, as these principles provide the framework for all advanced concepts."
-                    })
-                    
-            # Format the questions for display
-            formatted_questions = f"# Practice Questions on {topic} ({difficulty} level)\n\n"
-            
-            for i, q in enumerate(questions):
-                formatted_questions += f"## Question {i+1}\n"
-                formatted_questions += f"{q['question']}\n\n"
-                formatted_questions += "**Options:**\n"
-                for option in q['options']:
-                    formatted_questions += f"{option}\n"
-                formatted_questions += f"\n**Correct Answer:** {q['options'][q['correct_answer']][0]}\n\n"
-                formatted_questions += f"**Explanation:** {q['explanation']}\n\n"
-                
-            return formatted_questions
-        else:
-            return "AI model not available. Please try again later."
+                # A failed call or unusable output keeps the previous plan and backs off before the next attempt
+                entry.update(failures=entry.get("failures", 0) + 1, failed_at=time.time())
+            _plan_cache.move_to_end(user_id)
+            while len(_plan_cache) > RECOMMENDATION_CACHE_SIZE:
+                _plan_cache.popitem(last=False)
+            _plan_refreshing.discard(user_id)
+
+def get_recommendation_plan(db, ai_models, user_id, stats=None):
+    """A learner's Granite course plan without ever waiting for Granite
+
+    Returns (plan, refreshing). A cached plan is returned at once; if it is
+    older than RECOMMENDATION_TTL or was made for a different profile, a
+    background refresh is started and the stale plan is served meanwhile.
+    After a failed refresh the next one waits RECOMMENDATION_RETRY_AFTER
+    seconds, doubling with each further failure. plan is None until the
+    first plan for the user is ready.
+    """
+    granite_model = ai_models.get("granite_model") if ai_models else None
+    if not granite_model:
+        return None, False
+    profile = learner_profile(db, user_id, stats)
+    profile_hash = hashlib.sha1(json.dumps(profile, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    with _plan_lock:
+        entry = _plan_cache.get(user_id)
+        fresh = entry is not None and entry["hash"] == profile_hash and time.time() - entry["created_at"] < RECOMMENDATION_TTL
+        if entry is not None:
+            _plan_cache.move_to_end(user_id)
+        refreshing = user_id in _plan_refreshing
+        backing_off = entry is not None and entry.get("failed_at") is not None \
+            and time.time() - entry["failed_at"] < _retry_delay(entry["failures"])
+        if not fresh and not refreshing and not backing_off and profile["candidates"]:
+            _plan_refreshing.add(user_id)
+            _plan_executor.submit(_refresh_plan, granite_model, user_id, profile, profile_hash)
+            refreshing = True
+    return (entry["plan"] if entry else None), refreshing
+
+PRACTICE_BATCH_SIZE = 2  # questions per Granite call when a set is generated concurrently
+
+def _parse_practice_questions(prompt, response):
+    """Validated question dicts from a Granite response (malformed items are dropped)"""
+    if not response or response.startswith("Error"):
+        return []
+    
+    # The inference API may echo the prompt; parse the first array after it
+    if response.startswith(prompt):
+        response = response[len(prompt):]
+    match = re.search(r"\[.*\]", response, re.DOTALL)
+    if not match:
+        return []
+    
+    questions = []
+    for item in json.loads(match.group(0)):
+        if not isinstance(item, dict):
+            continue
+        options = item.get("options")
+        correct = item.get("correct_answer")
+        if item.get("question") and isinstance(options, list) and len(options) >= 2 \
+                and isinstance(correct, int) and 0 <= correct < len(options):
+            questions.append({
+                "question": str(item["question"]).strip(),
+                "options": [str(o).strip() for o in options],
+                "correct_answer": correct,
+                "explanation": str(item.get("explanation", "")).strip()
+            })
+    return questions
+
+def _practice_batches(num_questions):
+    return [min(PRACTICE_BATCH_SIZE, num_questions - i) for i in range(0, num_questions, PRACTICE_BATCH_SIZE)]
+
+async def agenerate_practice_questions(ai_models, topic, difficulty="intermediate", num_questions=3, user=None, feature="practice"):
+    """Async generate_practice_questions: the set is split into small prompts that run concurrently"""
+    granite_model = ai_models.get("granite_model") if ai_models else None
+    if not granite_model:
+        return []
+    built = [
+        build_prompt("practice", max_new_tokens=256 * n, count=n, difficulty=difficulty, topic=topic)
+        for n in _practice_batches(num_questions)
+    ]
+    prompts = [prompt for prompt, _ in built]
+    max_tokens = max(accounting["max_new_tokens"] for _, accounting in built)
+    responses = await agenerate_many(granite_model, prompts, max_tokens=max_tokens, user=user, feature=feature)
+    questions = []
+    for (prompt, accounting), response in zip(built, responses):
+        record_usage(accounting, "" if response.startswith("Error") else response)
+        try:
+            questions.extend(_parse_practice_questions(prompt, response))
+        except ValueError:
+            continue
+    return questions[:num_questions]
+
+def generate_practice_questions(ai_models, topic, difficulty="intermediate", num_questions=3, user=None, feature="practice"):
+    """Generate structured multiple-choice practice questions on a topic with Granite
+
+    Returns a list of dicts with question, options, correct_answer (option
+    index) and explanation keys; malformed items are dropped, and an empty list
+    is returned if the model is unavailable. Larger sets are generated as
+    concurrent smaller requests.
+    """
+    try:
+        if not (ai_models and ai_models.get("granite_model")):
+            return []
+        return run_async(agenerate_practice_questions(ai_models, topic, difficulty, num_questions, user, feature))
     except Exception as e:
         st.error(f"Error generating practice questions: {e}")
-        return "An error occurred while generating practice questions. Please try again."
+        return []
+
+def summarize_learning_material(ai_models, content, max_length=500, use_granite=True, budget_ms=SUMMARY_BUDGET_MS):
+    """Summarize learning material to a concise version
 
-def summarize_learning_material(ai_models, content, max_length=500):
-    """Summarize learning material to a concise version"""
+    Uses the Granite map-reduce path when the model is configured and
+    use_granite is set, and the extractive path otherwise. budget_ms bounds the
+    time spent waiting on Granite before falling back to extractive output.
+    """
     try:
         if ai_models:
-            # Simulated summary for demo purposes
-            # Just return first part of the content up to max_length
-            if len(content) > max_length:
-                summary = content[:max_length] + "..."
-            else:
-                summary = content
+            granite_model = ai_models.get("granite_model") if use_granite else None
+            result = summarize(content, max_length=max_length, granite_model=granite_model, budget_ms=budget_ms)
+            takeaways = "\n".join(f"- {sentence}" for sentence in result["takeaways"])
                 
             return f"""
-            ## Summary of Learning Material
-            
-            {summary}
-            
-            **Key takeaways:**
-            - First important concept from the material
-            - Second important concept
-            - Third important concept
-            
-            This summary captures the essential points while omitting supplementary details.
-            """
+## Summary of Learning Material
+
+{result["summary"]}
+
+**Key takeaways:**
+{takeaways}
+"""
         else:
             return "AI model not available. Please try again later."
     except Exception as e:
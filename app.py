@@ -3,6 +3,10 @@ import os
 import importlib.util
 from database import initialize_db
 from ai_engine import load_ai_models
+from granite_model import request_queue
+from rate_limit import get_rate_limiter, prometheus_metrics
+from instrumentation import instrument_db, page_rerun, register_collector, start_metrics_server
+from session_memory import prometheus_memory_metrics, track_session
 
 # Page configuration
 st.set_page_config(
@@ -37,8 +41,18 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize database connection
+# Initialize database connection (traced when INSTRUMENTATION=1)
 db_client, db = initialize_db()
+db = instrument_db(db)
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_export(_db):
+    """Serve Prometheus metrics, including rate-limit, model queue and session memory metrics, once per process"""
+    register_collector(lambda: prometheus_metrics(get_rate_limiter(_db), request_queue))
+    register_collector(prometheus_memory_metrics)
+    return start_metrics_server()
+
+start_metrics_export(db)
 
 # Load AI models
 ai_models = load_ai_models()
@@ -54,6 +68,9 @@ if 'username' not in st.session_state:
 if 'current_course' not in st.session_state:
     st.session_state['current_course'] = None
 
+# Account this session's state size and evict heavy state from idle sessions
+track_session()
+
 # Import page modules dynamically to avoid displaying in UI
 pages = {}
 for module_name in ["dashboard", "courses", "assessments", "community", "qa", "todo"]:
@@ -126,24 +143,25 @@ else:
         format_func=lambda x: f"{nav_options[x]} {x}"
     )
 
-# Display the selected page
-if selection == "Dashboard":
-    pages["dashboard"].show_dashboard(db)
+# Display the selected page, timing the rerun per page
+with page_rerun(selection):
+    if selection == "Dashboard":
+        pages["dashboard"].show_dashboard(db, ai_models)
     
-elif selection == "Courses & Materials":
-    pages["courses"].show_courses(db, ai_models)
+    elif selection == "Courses & Materials":
+        pages["courses"].show_courses(db, ai_models)
     
-elif selection == "Assessments":
-    pages["assessments"].show_assessments(db, ai_models)
+    elif selection == "Assessments":
+        pages["assessments"].show_assessments(db, ai_models)
     
-elif selection == "Task Planner":
-    pages["todo"].show_todo(db)
+    elif selection == "Task Planner":
+        pages["todo"].show_todo(db)
     
-elif selection == "Community":
-    pages["community"].show_community(db)
+    elif selection == "Community":
+        pages["community"].show_community(db)
     
-elif selection == "Q&A":
-    pages["qa"].show_qa(db, ai_models)
+    elif selection == "Q&A":
+        pages["qa"].show_qa(db, ai_models)
 
 # Footer
 st.sidebar.divider()
@@ -0,0 +1,288 @@
+"""
+Assessment analytics for the SmartLearn Platform
+
+Represents answer keys and submitted answers as arrays so per-question
+correctness, per-attempt scores and score distributions are computed in one
+vectorized pass, whether for a single attempt, a user's results view or a
+cohort of thousands of results.
+"""
+
+import numpy as np
+import pandas as pd
+import pymongo
+from datetime import datetime
+
+def question_ids(questions):
+    """Question ids in assessment order, defaulting to q1, q2, ... like the assessment page does"""
+    return [q.get("question_id", f"q{i + 1}") for i, q in enumerate(questions)]
+
+def answer_key(questions):
+    """Answer key as a Series indexed by question id, plus a mask of auto-gradable questions"""
+    ids = question_ids(questions)
+    key = pd.Series([q.get("correct_answer") for q in questions], index=ids, dtype=object)
+    gradable = pd.Series([q.get("type") == "multiple_choice" for q in questions], index=ids, dtype=bool)
+    return key, gradable
+
+def answers_frame(answer_dicts, ids):
+    """One row per attempt, one column per question id"""
+    return pd.DataFrame.from_records(list(answer_dicts), columns=ids)
+
+def correctness(questions, answer_dicts):
+    """Boolean frame of correct multiple-choice answers (rows are attempts, columns are gradable questions)"""
+    key, gradable = answer_key(questions)
+    gradable_ids = key.index[gradable.to_numpy()]
+    answers = answers_frame(answer_dicts, list(key.index))
+    return answers[gradable_ids].eq(key[gradable_ids])
+
+def scores(questions, answer_dicts):
+    """Percentage score of each attempt over its multiple-choice questions"""
+    correct = correctness(questions, answer_dicts)
+    if correct.shape[1] == 0:
+        return np.zeros(len(correct))
+    return correct.to_numpy().mean(axis=1) * 100
+
+def score_attempt(questions, answers):
+    """Score a single attempt: returns (percentage, {question_id: is_correct}) for multiple-choice questions"""
+    correct = correctness(questions, [answers])
+    if correct.shape[1] == 0:
+        return 0.0, {}
+    row = correct.iloc[0]
+    return float(row.to_numpy().mean() * 100), row.to_dict()
+
+def score_distribution(values, bins=10):
+    """Histogram of percentage scores over [0, 100]"""
+    counts, edges = np.histogram(np.asarray(values, dtype=float), bins=bins, range=(0, 100))
+    return pd.DataFrame({
+        "range": [f"{edges[i]:.0f}-{edges[i + 1]:.0f}" for i in range(len(counts))],
+        "count": counts
+    })
+
+def results_frame(results, assessments, courses):
+    """Numeric results table for the results view
+
+    results are assessment_results documents, assessments maps id to the
+    assessment document and courses maps course id to title.
+    """
+    frame = pd.DataFrame.from_records(
+        [(r.get("assessment_id"), r.get("score", 0), r.get("completed_at")) for r in results],
+        columns=["assessment_id", "Score", "Completed"]
+    )
+    titles = {aid: a.get("title", "Unknown Assessment") for aid, a in assessments.items()}
+    course_ids = {aid: a.get("course_id", "") for aid, a in assessments.items()}
+    frame["Assessment"] = frame["assessment_id"].map(titles).fillna("Unknown Assessment")
+    frame["Course"] = frame["assessment_id"].map(course_ids).map(courses).fillna("Unknown Course")
+    frame["Score"] = pd.to_numeric(frame["Score"], errors="coerce").fillna(0.0)
+    return frame[["Assessment", "Course", "Score", "Completed", "assessment_id"]]
+
+def cohort_summary(questions, answer_dicts, bins=10):
+    """Per-question correctness rates, per-attempt scores and the score distribution for many attempts"""
+    correct = correctness(questions, answer_dicts)
+    values = correct.to_numpy()
+    attempt_scores = values.mean(axis=1) * 100 if values.shape[1] else np.zeros(len(values))
+    return {
+        "question_correct_rate": pd.Series(values.mean(axis=0) if len(values) else np.zeros(values.shape[1]), index=correct.columns),
+        "scores": attempt_scores,
+        "mean_score": float(attempt_scores.mean()) if len(attempt_scores) else 0.0,
+        "distribution": score_distribution(attempt_scores, bins)
+    }
+
+# ---------------------------------------------------------------------------
+# Cohort item statistics (batch job)
+#
+# assessment_stats keeps, per assessment, sufficient statistics that can be
+# merged with a batch of results or have results taken out again: attempt
+# count, score sums, a score histogram and per-item correct counts,
+# score-of-correct sums and option counts. Difficulty and point-biserial
+# discrimination are derived from them.
+#
+# assessment_results holds one document per (user, assessment) that a retake
+# overwrites, so every write sets stats_pending and each result remembers
+# the answers it last contributed (stats_answers). Incremental runs only read
+# pending results, take their previous contribution out and add the new one,
+# which keeps them equal to a full rebuild.
+# ---------------------------------------------------------------------------
+
+STATS_HISTOGRAM_BINS = 10
+STATS_BATCH_SIZE = 5000
+STATS_WATERMARK_ID = "assessment_stats"
+
+def _empty_stats(assessment_id):
+    return {
+        "_id": assessment_id,
+        "assessment_id": assessment_id,
+        "attempts": 0,
+        "score_sum": 0.0,
+        "score_sq_sum": 0.0,
+        "histogram": [0] * STATS_HISTOGRAM_BINS,
+        "items": {}
+    }
+
+def accumulate_item_stats(stats, questions, answer_dicts, sign=1):
+    """Merge a batch of attempts into an assessment's sufficient statistics (sign=-1 takes them out)"""
+    key, gradable = answer_key(questions)
+    gradable_ids = list(key.index[gradable.to_numpy()])
+    answers = answers_frame(answer_dicts, list(key.index))
+    if not len(answers) or not gradable_ids:
+        return stats
+
+    correct = answers[gradable_ids].eq(key[gradable_ids]).to_numpy()
+    attempt_scores = correct.mean(axis=1) * 100
+    counts, _ = np.histogram(attempt_scores, bins=STATS_HISTOGRAM_BINS, range=(0, 100))
+
+    stats["attempts"] += sign * int(len(attempt_scores))
+    stats["score_sum"] += sign * float(attempt_scores.sum())
+    stats["score_sq_sum"] += sign * float((attempt_scores ** 2).sum())
+    stats["histogram"] = (np.asarray(stats["histogram"]) + sign * counts).tolist()
+
+    correct_counts = correct.sum(axis=0)
+    correct_score_sums = correct.T.astype(float) @ attempt_scores
+
+    # Option frequencies for every gradable item in one grouped count
+    options = answers[gradable_ids].fillna("(no answer)").melt(var_name="question_id", value_name="option")
+    option_counts = options.value_counts()
+
+    for j, question_id in enumerate(gradable_ids):
+        item = stats["items"].setdefault(question_id, {"correct": 0, "correct_score_sum": 0.0, "options": {}})
+        item["correct"] += sign * int(correct_counts[j])
+        item["correct_score_sum"] += sign * float(correct_score_sums[j])
+    for (question_id, option), count in option_counts.items():
+        item_options = stats["items"][question_id]["options"]
+        item_options[str(option)] = item_options.get(str(option), 0) + sign * int(count)
+        if item_options[str(option)] <= 0:
+            del item_options[str(option)]
+    return stats
+
+def derive_item_stats(stats):
+    """Difficulty, point-biserial discrimination and distractor frequencies from sufficient statistics"""
+    n = stats["attempts"]
+    mean = stats["score_sum"] / n if n else 0.0
+    std = float(np.sqrt(max(stats["score_sq_sum"] / n - mean ** 2, 0.0))) if n else 0.0
+
+    items = []
+    for question_id, item in stats["items"].items():
+        c = item["correct"]
+        p = c / n if n else 0.0
+        discrimination = None
+        if 0 < c < n and std > 0:
+            mean_correct = item["correct_score_sum"] / c
+            mean_incorrect = (stats["score_sum"] - item["correct_score_sum"]) / (n - c)
+            discrimination = (mean_correct - mean_incorrect) / std * np.sqrt(p * (1 - p))
+        items.append({
+            "question_id": question_id,
+            "difficulty": p,
+            "discrimination": None if discrimination is None else float(discrimination),
+            "distractors": sorted(
+                ({"option": option, "count": count} for option, count in item["options"].items()),
+                key=lambda d: -d["count"]
+            )
+        })
+    return {"mean_score": mean, "score_std": std, "item_stats": items}
+
+def _to_document(stats):
+    """Store item statistics as a list, since answer options are not safe Mongo field names"""
+    doc = dict(stats)
+    doc["items"] = [
+        dict(item, question_id=qid, options=[{"option": o, "count": c} for o, c in item["options"].items()])
+        for qid, item in stats["items"].items()
+    ]
+    doc.update(derive_item_stats(stats))
+    doc["histogram_edges"] = np.linspace(0, 100, STATS_HISTOGRAM_BINS + 1).tolist()
+    doc["updated_at"] = datetime.now()
+    return doc
+
+def _from_document(doc):
+    stats = {k: doc[k] for k in ("_id", "assessment_id", "attempts", "score_sum", "score_sq_sum", "histogram")}
+    stats["items"] = {
+        item["question_id"]: {
+            "correct": item["correct"],
+            "correct_score_sum": item["correct_score_sum"],
+            "options": {o["option"]: o["count"] for o in item["options"]}
+        }
+        for item in doc.get("items", [])
+    }
+    return stats
+
+def run_assessment_stats_job(db, full=False):
+    """Update assessment_stats from results written since they were last counted
+
+    With full=True, or on the first run, the statistics are rebuilt from
+    every result. Returns the number of results processed.
+    """
+    stats_collection = db["assessment_stats"]
+    watermarks = db["job_watermarks"]
+    results_collection = db["assessment_results"]
+
+    full = full or watermarks.find_one({"_id": STATS_WATERMARK_ID}) is None
+    if full:
+        stats_collection.delete_many({})
+    cursor = results_collection.find(
+        {} if full else {"stats_pending": True},
+        {"assessment_id": 1, "submission_id": 1, "answers": 1, "stats_answers": 1}
+    )
+
+    assessments = {}
+    stats_by_assessment = {}
+    counted = []
+    processed = 0
+
+    def flush(batch):
+        added, removed = {}, {}
+        for result in batch:
+            added.setdefault(result["assessment_id"], []).append(result.get("answers") or {})
+            # A retake replaces the answers this result contributed before
+            if not full and "stats_answers" in result:
+                removed.setdefault(result["assessment_id"], []).append(result["stats_answers"] or {})
+        missing = [aid for aid in added if aid not in assessments]
+        if missing:
+            for assessment in db["assessments"].find({"_id": {"$in": missing}}, {"questions": 1}):
+                assessments[assessment["_id"]] = assessment
+            for doc in stats_collection.find({"_id": {"$in": missing}}):
+                stats_by_assessment[doc["_id"]] = _from_document(doc)
+        for assessment_id, answer_dicts in added.items():
+            assessment = assessments.get(assessment_id)
+            if not assessment:
+                continue
+            stats = stats_by_assessment.setdefault(assessment_id, _empty_stats(assessment_id))
+            if assessment_id in removed:
+                accumulate_item_stats(stats, assessment.get("questions", []), removed[assessment_id], sign=-1)
+            accumulate_item_stats(stats, assessment.get("questions", []), answer_dicts)
+        # Remember what each result now contributes; a result rewritten meanwhile stays pending
+        counted.extend(
+            pymongo.UpdateOne(
+                {"_id": result["_id"], "submission_id": result.get("submission_id")},
+                {"$set": {"stats_answers": result.get("answers") or {}}, "$unset": {"stats_pending": ""}}
+            )
+            for result in batch
+        )
+
+    batch = []
+    for result in cursor:
+        batch.append(result)
+        if len(batch) >= STATS_BATCH_SIZE:
+            flush(batch)
+            processed += len(batch)
+            batch = []
+    if batch:
+        flush(batch)
+        processed += len(batch)
+
+    if stats_by_assessment:
+        stats_collection.bulk_write(
+            [pymongo.ReplaceOne({"_id": aid}, _to_document(stats), upsert=True) for aid, stats in stats_by_assessment.items()],
+            ordered=False
+        )
+    for i in range(0, len(counted), STATS_BATCH_SIZE):
+        results_collection.bulk_write(counted[i:i + STATS_BATCH_SIZE], ordered=False)
+    watermarks.update_one({"_id": STATS_WATERMARK_ID}, {"$set": {"updated_at": datetime.now()}}, upsert=True)
+    return processed
+
+if __name__ == "__main__":
+    import argparse
+    from database import initialize_db
+
+    parser = argparse.ArgumentParser(description="Update cohort-level item statistics in assessment_stats")
+    parser.add_argument("--full", action="store_true", help="rebuild from every result instead of only the ones written since the last run")
+    args = parser.parse_args()
+
+    _, db = initialize_db()
+    print(f"Processed {run_assessment_stats_job(db, full=args.full)} assessment results")
@@ -0,0 +1,180 @@
+"""
+Load-testing harness for the SmartLearn pages
+
+Runs page functions headlessly with Streamlit's AppTest against a seeded
+database and the local stub Granite server (stub_inference.py), and reports
+p50/p95/p99 rerun latency, database operations per rerun and memory for each
+page and data size. Results can be written as JSON to compare runs before and after a
+change to database.py.
+
+Data is seeded into the in-memory fallback database by default, or into a
+real MongoDB with --mongo-uri (the target database is dropped first).
+Page assets fetched over the network (the Q&A lottie animation) are served
+as empty stubs, so the harness runs offline.
+
+Usage:
+    python benchmarks/bench_pages.py [--sizes 1k 100k 1M] [--pages dashboard qa] [--reruns 20]
+                                     [--mongo-uri mongodb://localhost:27017] [--json results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tracemalloc
+from datetime import datetime
+
+# Count database operations through the instrumentation proxy
+os.environ.setdefault("INSTRUMENTATION", "1")
+os.environ.setdefault("SLOW_QUERY_MS", "1e9")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import requests
+from streamlit.testing.v1 import AppTest
+import instrumentation
+from database import setup_fallback_db, ensure_indexes
+from seeder import DEMO_USER_ID, seed
+from stub_inference import StubConfig, start_stub_server
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+STUBBED_ASSET_HOSTS = ("lottiefiles.com",)
+USER_ID = DEMO_USER_ID  # the most active synthetic user
+
+# Each scenario: page module, function, argument names and extra session state
+SCENARIOS = {
+    "dashboard": ("pages.dashboard", "show_dashboard", ["db", "ai_models"], {}),
+    "qa": ("pages.qa", "show_questions", ["db"], {}),
+    "community": ("pages.community", "show_community_posts", ["db"], {}),
+    "task_history": ("pages.todo", "show_task_history", ["db", "user_id"], {}),
+    "assessment": ("pages.assessments", "display_assessment", ["db", "ai_models", "user_id"], {
+        "current_assessment": "assessment_python_basics",
+        "current_question": 0,
+        "answers": {}
+    })
+}
+
+# The AppTest script: everything it needs is passed through session state
+PAGE_SCRIPT = """
+import importlib
+import streamlit as st
+
+bench = st.session_state["_bench"]
+page = importlib.import_module(bench["module"])
+getattr(page, bench["function"])(*bench["args"])
+"""
+
+def stub_asset_requests():
+    """Answer page asset downloads (pages.qa loads a lottie animation on import) with an empty JSON document"""
+    real_get = requests.get
+
+    def get(url, *args, **kwargs):
+        if any(host in url for host in STUBBED_ASSET_HOSTS):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = b"{}"
+            response.url = url
+            return response
+        return real_get(url, *args, **kwargs)
+
+    requests.get = get
+
+# ---------------------------------------------------------------------------
+# Database
+# ---------------------------------------------------------------------------
+
+def open_database(mongo_uri, size_label):
+    if not mongo_uri:
+        _, db = setup_fallback_db()
+        # The fallback database seeds the demo data itself; start from it
+        return db
+    import pymongo
+    client = pymongo.MongoClient(mongo_uri)
+    name = f"smartlearn_bench_{size_label.lower()}"
+    client.drop_database(name)
+    db = client[name]
+    ensure_indexes(db)
+    return db
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def run_scenario(name, db, ai_models, reruns, warmup, trace_memory):
+    module, function, arg_names, state = SCENARIOS[name]
+    values = {"db": db, "ai_models": ai_models, "user_id": USER_ID}
+
+    at = AppTest.from_string(PAGE_SCRIPT, default_timeout=600)
+    at.session_state["_bench"] = {"module": module, "function": function, "args": [values[a] for a in arg_names]}
+    at.session_state["user_id"] = USER_ID
+
+    latencies, queries, peaks = [], [], []
+    for i in range(warmup + reruns):
+        for key, value in state.items():
+            at.session_state[key] = value
+        if trace_memory:
+            tracemalloc.start()
+        before = instrumentation.span_count("db")
+        start = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - start
+        if trace_memory:
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        if at.exception:
+            raise RuntimeError(f"{name} raised: {at.exception[0].message}")
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(instrumentation.span_count("db") - before)
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "page": name,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "db_ops_per_rerun": float(np.mean(queries)),
+        "peak_alloc_mb": float(max(peaks) / 2 ** 20) if peaks else None,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["1k", "100k"], choices=list(SIZES))
+    parser.add_argument("--pages", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--stub-latency", default="fixed:50", help="stub Granite latency, e.g. lognormal:300,0.5")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--mongo-uri", help="seed and query a real MongoDB instead of the in-memory fallback")
+    parser.add_argument("--trace-memory", action="store_true", help="report peak Python allocations per rerun (slower)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    stub_asset_requests()
+    stub = start_stub_server(StubConfig(latency=args.stub_latency, error_rate=args.stub_error_rate, seed=args.seed))
+    ai_models = {"granite_model": stub.granite_model(), "assessment_feedback": True, "qa_answer": True}
+    results = []
+    print(f"{'size':>6} {'page':>14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'db ops':>8} {'rss MB':>8}")
+    for size in args.sizes:
+        db = instrumentation.instrument_db(open_database(args.mongo_uri, size))
+        start = time.perf_counter()
+        seed(db, SIZES[size], args.seed)
+        print(f"# seeded {size} documents in {time.perf_counter() - start:.1f}s")
+        for page in args.pages:
+            result = dict(run_scenario(page, db, ai_models, args.reruns, args.warmup, args.trace_memory), size=size)
+            results.append(result)
+            print(f"{size:>6} {page:>14} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                  f"{result['db_ops_per_rerun']:>8.1f} {result['max_rss_mb']:>8.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"created_at": datetime.now().isoformat(), "args": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmarks for the summarization engine
+
+Times the extractive path and cache hits on synthetic 10 KB, 100 KB and 1 MB
+inputs. Pass --granite to also time the Granite map-reduce path (requires
+HF_TOKEN) under the configured latency budget.
+
+Usage:
+    python benchmarks/bench_summarizer.py [--granite] [--budget-ms 8000] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import summarizer
+from granite_model import initialize_granite_model
+
+SIZES = {"10KB": 10_000, "100KB": 100_000, "1MB": 1_000_000}
+VOCABULARY = """
+python function variable loop list dictionary class object method data frame array numpy pandas
+model training regression classification cluster gradient descent learning rate loss accuracy
+derivative integral matrix vector probability distribution mean median variance hypothesis test
+""".split()
+
+def synthetic_document(size, seed=0):
+    """Paragraphs of random sentences over a small technical vocabulary"""
+    rng = random.Random(seed)
+    sentences = []
+    length = 0
+    while length < size:
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(6, 24))).capitalize() + "."
+        if rng.random() < 0.1:
+            sentence += "\n\n"
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(sentences)[:size]
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings), sum(timings) / len(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--granite", action="store_true", help="also benchmark the Granite map-reduce path")
+    parser.add_argument("--budget-ms", type=int, default=summarizer.SUMMARY_BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    granite_model = initialize_granite_model() if args.granite else None
+
+    print(f"{'input':>8} {'path':>12} {'best ms':>10} {'mean ms':>10}")
+    for label, size in SIZES.items():
+        text = synthetic_document(size)
+
+        best, mean = time_call(lambda: summarizer.extractive_summary(text), args.repeat)
+        print(f"{label:>8} {'extractive':>12} {best:>10.1f} {mean:>10.1f}")
+
+        summarizer.summarize(text)
+        best, mean = time_call(lambda: summarizer.summarize(text), args.repeat)
+        print(f"{label:>8} {'cache hit':>12} {best:>10.3f} {mean:>10.3f}")
+
+        if granite_model:
+            best, mean = time_call(
+                lambda: summarizer.abstractive_summary(granite_model, text, budget_ms=args.budget_ms),
+                1
+            )
+            print(f"{label:>8} {'granite':>12} {best:>10.1f} {mean:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,12 @@ import pymongo
 import streamlit as st
 from datetime import datetime
 import pandas as pd
+from retrieval import index_user_material, remove_user_material
+from seeder import seed_demo_data
+from recommender import enrollment_weight, get_recommender
+from tasks import migrate_task_days
+from uploads import release_images
+from assessment_analytics import STATS_WATERMARK_ID
 
 def initialize_db():
     """Initialize MongoDB connection and return client and database objects"""
@@ -13,6 +19,8 @@ def initialize_db():
         
         # Initialize collections if they don't exist
         create_initial_data(db)
+        ensure_indexes(db)
+        migrate_task_days(db)
         
         return client, db
     except Exception as e:
@@ -30,123 +38,305 @@ def setup_fallback_db():
     """Setup a fallback database using a dictionary-based approach for demo purposes"""
     from datetime import datetime
     
+    import re
+    import copy
+    
+    _missing = object()
+    
+    def _values(doc, path):
+        """Resolve a dotted path, expanding arrays along the way like MongoDB does"""
+        values = [doc]
+        for part in path.split("."):
+            next_values = []
+            for value in values:
+                if isinstance(value, dict) and part in value:
+                    next_values.append(value[part])
+                elif isinstance(value, list):
+                    if part.isdigit() and int(part) < len(value):
+                        next_values.append(value[int(part)])
+                    else:
+                        next_values.extend(v[part] for v in value if isinstance(v, dict) and part in v)
+            values = next_values
+        return values
+    
+    def _equals(value, target):
+        return value == target or (isinstance(value, list) and not isinstance(target, list) and target in value)
+    
+    def _compare(values, op, op_val, options=""):
+        if op == "$in":
+            return any(_equals(v, t) for v in values for t in op_val)
+        if op == "$nin":
+            return not any(_equals(v, t) for v in values for t in op_val)
+        if op == "$ne":
+            return not any(_equals(v, op_val) for v in values)
+        if op == "$eq":
+            return any(_equals(v, op_val) for v in values)
+        if op == "$exists":
+            return bool(values) == bool(op_val)
+        if op == "$regex":
+            flags = re.IGNORECASE if "i" in options else 0
+            return any(re.search(op_val, str(v), flags) for v in values)
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            checks = {
+                "$gt": lambda a, b: a > b,
+                "$gte": lambda a, b: a >= b,
+                "$lt": lambda a, b: a < b,
+                "$lte": lambda a, b: a <= b
+            }
+            for v in values:
+                try:
+                    if checks[op](v, op_val):
+                        return True
+                except TypeError:
+                    continue
+            return False
+        if op == "$options":
+            return True
+        # Unsupported operators are treated as matching
+        return True
+    
+    def _matches(doc, query):
+        for k, v in (query or {}).items():
+            if k == "$or":
+                if not any(_matches(doc, clause) for clause in v):
+                    return False
+            elif k == "$and":
+                if not all(_matches(doc, clause) for clause in v):
+                    return False
+            elif isinstance(v, dict) and v and all(op.startswith("$") for op in v):
+                values = _values(doc, k)
+                for op, op_val in v.items():
+                    if not _compare(values, op, op_val, v.get("$options", "")):
+                        return False
+            elif not any(_equals(value, v) for value in _values(doc, k)):
+                return False
+        return True
+    
+    def _set_path(doc, path, value, array_filters, mode="set"):
+        """Apply a single-field update, supporting dotted paths and $[identifier] array filters"""
+        parts = path.split(".")
+        targets = [doc]
+        for i, part in enumerate(parts[:-1]):
+            next_targets = []
+            for target in targets:
+                if part.startswith("$[") and isinstance(target, list):
+                    name = part[2:-1]
+                    conditions = {k[len(name) + 1:]: c for f in array_filters for k, c in f.items() if k.split(".")[0] == name}
+                    next_targets.extend(el for el in target if not conditions or _matches(el, conditions))
+                elif isinstance(target, list) and part.isdigit():
+                    next_targets.append(target[int(part)])
+                elif isinstance(target, dict):
+                    next_targets.append(target.setdefault(part, {}))
+            targets = next_targets
+        
+        last = parts[-1]
+        for target in targets:
+            if mode == "set":
+                target[last] = value
+            elif mode == "unset":
+                target.pop(last, None)
+            elif mode == "inc":
+                target[last] = target.get(last, 0) + value
+            elif mode == "push":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                target.setdefault(last, []).extend(items)
+            elif mode == "addToSet":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                existing = target.setdefault(last, [])
+                existing.extend(item for item in items if item not in existing)
+            elif mode == "pull":
+                existing = target.get(last, [])
+                if isinstance(value, dict):
+                    target[last] = [el for el in existing if not _matches(el, value)]
+                else:
+                    target[last] = [el for el in existing if el != value]
+            elif mode == "min" and (last not in target or value < target[last]):
+                target[last] = value
+            elif mode == "max" and (last not in target or value > target[last]):
+                target[last] = value
+    
+    def _apply_update(doc, update, array_filters=None, is_insert=False):
+        modes = {"$set": "set", "$unset": "unset", "$inc": "inc", "$push": "push",
+                 "$addToSet": "addToSet", "$pull": "pull", "$min": "min", "$max": "max"}
+        for op, values in update.items():
+            if op == "$setOnInsert":
+                if is_insert:
+                    for field, value in values.items():
+                        _set_path(doc, field, value, array_filters or [])
+            elif op in modes:
+                for field, value in values.items():
+                    _set_path(doc, field, value, array_filters or [], modes[op])
+    
+    class MockCursor(list):
+        """List of results that also supports the chained cursor methods used by the pages"""
+        def sort(self, key_or_list, direction=1):
+            keys = key_or_list if isinstance(key_or_list, list) else [(key_or_list, direction)]
+            for field, field_direction in reversed(keys):
+                # Missing values sort lowest, as in MongoDB
+                super().sort(key=lambda x: (x.get(field) is not None, x.get(field, 0)), reverse=field_direction < 0)
+            return self
+        
+        def limit(self, count):
+            return MockCursor(self[:count]) if count else self
+        
+        def skip(self, count):
+            return MockCursor(self[count:])
+    
+    class MockResult:
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+    
     # Create a simple class to mimic MongoDB collection behavior
     class MockCollection:
         def __init__(self, name, initial_data=None):
             self.name = name
             self.data = initial_data or []
             self._id_counter = 1000  # Starting ID for new documents
+            self._unique = []        # field lists of unique indexes
             
         def find(self, query=None, *args, **kwargs):
-            if query is None:
-                query = {}
-            
-            # Simple implementation of find with basic filtering
-            results = []
-            for doc in self.data:
-                match = True
-                for k, v in query.items():
-                    if k == "$or":
-                        or_match = False
-                        for or_clause in v:
-                            or_clause_match = True
-                            for or_k, or_v in or_clause.items():
-                                if or_k in doc:
-                                    if isinstance(or_v, dict) and "$regex" in or_v:
-                                        # Very basic regex support
-                                        pattern = or_v["$regex"].lower()
-                                        if pattern not in str(doc[or_k]).lower():
-                                            or_clause_match = False
-                                    elif doc[or_k] != or_v:
-                                        or_clause_match = False
-                                else:
-                                    or_clause_match = False
-                            if or_clause_match:
-                                or_match = True
-                                break
-                        if not or_match:
-                            match = False
-                    elif k == "$nin" and k in doc:
-                        if doc[k] in v:
-                            match = False
-                    elif k in doc:
-                        if isinstance(v, dict):
-                            # Handle operators like $in, $nin
-                            for op, op_val in v.items():
-                                if op == "$in" and doc[k] not in op_val:
-                                    match = False
-                                elif op == "$nin" and doc[k] in op_val:
-                                    match = False
-                                # Add more operators as needed
-                        elif doc[k] != v:
-                            match = False
-                    else:
-                        match = False
-                
-                if match:
-                    results.append(doc.copy())
+            results = MockCursor(copy.deepcopy(doc) for doc in self.data if _matches(doc, query))
             
             # Simple sort implementation
             if kwargs.get("sort"):
-                field, direction = kwargs["sort"]
-                reverse = direction < 0
-                results.sort(key=lambda x: x.get(field, 0), reverse=reverse)
+                sort = kwargs["sort"]
+                results.sort(sort if isinstance(sort, list) else [sort])
             
             # Simple limit implementation
             if kwargs.get("limit"):
-                results = results[:kwargs["limit"]]
+                results = results.limit(kwargs["limit"])
                 
             return results
             
-        def find_one(self, query=None):
-            results = self.find(query)
+        def find_one(self, query=None, *args, **kwargs):
+            results = self.find(query, *args, **kwargs)
             return results[0] if results else None
+        
+        def count_documents(self, query=None, **kwargs):
+            return len(self.find(query))
+        
+        def distinct(self, field, query=None):
+            values = []
+            for doc in self.find(query):
+                for value in _values(doc, field):
+                    for v in (value if isinstance(value, list) else [value]):
+                        if v not in values:
+                            values.append(v)
+            return values
+        
+        def create_index(self, keys, unique=False, **kwargs):
+            # Indexes only matter for performance, which the in-memory store doesn't need, except unique constraints
+            fields = [k for k, _ in keys] if isinstance(keys, list) else [keys]
+            if unique and fields not in self._unique:
+                values = [tuple(doc.get(f) for f in fields) for doc in self.data]
+                if len(set(values)) < len(values):
+                    raise pymongo.errors.DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}", 11000)
+                self._unique.append(fields)
+            return "_".join(f"{k}_{d}" for k, d in keys) if isinstance(keys, list) else f"{keys}_1"
             
-        def insert_one(self, document):
+        def insert_one(self, document, **kwargs):
+            for fields in self._unique:
+                key = [document.get(f) for f in fields]
+                if any([doc.get(f) for f in fields] == key for doc in self.data):
+                    raise pymongo.errors.DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {'_'.join(fields)}", 11000)
             if "_id" not in document:
                 document["_id"] = str(self._id_counter)
                 self._id_counter += 1
             self.data.append(document)
-            return type('obj', (object,), {'inserted_id': document["_id"]})
+            return MockResult(inserted_id=document["_id"])
             
-        def insert_many(self, documents):
+        def insert_many(self, documents, **kwargs):
             for doc in documents:
                 self.insert_one(doc)
-            return type('obj', (object,), {'inserted_ids': [d.get("_id") for d in documents]})
+            return MockResult(inserted_ids=[d.get("_id") for d in documents])
+        
+        def _update(self, query, update, many=False, upsert=False, array_filters=None):
+            matched = modified = 0
+            for doc in self.data:
+                if _matches(doc, query):
+                    before = copy.deepcopy(doc)
+                    _apply_update(doc, update, array_filters)
+                    matched += 1
+                    modified += doc != before
+                    if not many:
+                        break
+            upserted_id = None
+            if not matched and upsert:
+                new_doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+                _apply_update(new_doc, update, array_filters, is_insert=True)
+                upserted_id = self.insert_one(new_doc).inserted_id
+            return MockResult(matched_count=matched, modified_count=modified, upserted_id=upserted_id)
             
-        def update_one(self, query, update, *args, **kwargs):
+        def update_one(self, query, update, upsert=False, array_filters=None, **kwargs):
+            return self._update(query, update, upsert=upsert, array_filters=array_filters)
+        
+        def update_many(self, query, update, upsert=False, array_filters=None, **kwargs):
+            return self._update(query, update, many=True, upsert=upsert, array_filters=array_filters)
+        
+        def replace_one(self, query, replacement, upsert=False, **kwargs):
+            for i, doc in enumerate(self.data):
+                if _matches(doc, query):
+                    self.data[i] = dict(replacement, _id=doc["_id"])
+                    return MockResult(matched_count=1, modified_count=1, upserted_id=None)
+            upserted_id = self.insert_one(dict(replacement)).inserted_id if upsert else None
+            return MockResult(matched_count=0, modified_count=0, upserted_id=upserted_id)
+        
+        def find_one_and_update(self, query, update, upsert=False, return_document=False, array_filters=None, **kwargs):
+            before = self.find_one(query)
+            result = self._update(query, update, upsert=upsert, array_filters=array_filters)
+            if return_document:  # ReturnDocument.AFTER
+                return self.find_one({"_id": before["_id"] if before else result.upserted_id})
+            return before
+        
+        def find_one_and_delete(self, query, **kwargs):
             for i, doc in enumerate(self.data):
-                match = True
-                for k, v in query.items():
-                    if k in doc and doc[k] != v:
-                        match = False
-                    elif k not in doc:
-                        match = False
-                        
-                if match:
-                    for op, values in update.items():
-                        if op == "$set":
-                            for field, value in values.items():
-                                self.data[i][field] = value
-                        elif op == "$push":
-                            for field, value in values.items():
-                                if field not in self.data[i]:
-                                    self.data[i][field] = []
-                                self.data[i][field].append(value)
-                    break
+                if _matches(doc, query):
+                    return self.data.pop(i)
+            return None
                     
-        def delete_one(self, query):
+        def delete_one(self, query, **kwargs):
             for i, doc in enumerate(self.data):
-                match = True
-                for k, v in query.items():
-                    if k in doc and doc[k] != v:
-                        match = False
-                    elif k not in doc:
-                        match = False
-                        
-                if match:
+                if _matches(doc, query):
                     del self.data[i]
-                    break
+                    return MockResult(deleted_count=1)
+            return MockResult(deleted_count=0)
+        
+        def delete_many(self, query, **kwargs):
+            before = len(self.data)
+            self.data = [doc for doc in self.data if not _matches(doc, query)]
+            return MockResult(deleted_count=before - len(self.data))
+        
+        def bulk_write(self, requests, ordered=True, **kwargs):
+            counts = {"inserted_count": 0, "matched_count": 0, "modified_count": 0, "deleted_count": 0, "upserted_count": 0}
+            upserted_ids = {}
+            for index, request in enumerate(requests):
+                kind = type(request).__name__
+                if kind == "InsertOne":
+                    self.insert_one(request._doc)
+                    counts["inserted_count"] += 1
+                elif kind in ("UpdateOne", "UpdateMany"):
+                    result = self._update(request._filter, request._doc, many=kind == "UpdateMany",
+                                          upsert=request._upsert, array_filters=request._array_filters)
+                    counts["matched_count"] += result.matched_count
+                    counts["modified_count"] += result.modified_count
+                    if result.upserted_id is not None:
+                        counts["upserted_count"] += 1
+                        upserted_ids[index] = result.upserted_id
+                elif kind == "ReplaceOne":
+                    for i, doc in enumerate(self.data):
+                        if _matches(doc, request._filter):
+                            self.data[i] = dict(request._doc, _id=doc["_id"])
+                            counts["matched_count"] += 1
+                            counts["modified_count"] += 1
+                            break
+                    else:
+                        if request._upsert:
+                            upserted_ids[index] = self.insert_one(dict(request._doc)).inserted_id
+                            counts["upserted_count"] += 1
+                elif kind in ("DeleteOne", "DeleteMany"):
+                    delete = self.delete_many if kind == "DeleteMany" else self.delete_one
+                    counts["deleted_count"] += delete(request._filter).deleted_count
+            return MockResult(upserted_ids=upserted_ids, **counts)
     
     # Create a simple class to mimic MongoDB database behavior
     class MockDatabase:
@@ -175,283 +365,59 @@ def setup_fallback_db():
     
     # Initialize the mock database with sample data
     create_initial_data(db)
+    ensure_indexes(db)
     
     return client, db
 
 def create_initial_data(db):
     """Create initial data in the database if collections are empty"""
-    
-    # Create users collection if it doesn't exist
-    if "users" not in db.list_collection_names():
-        users_collection = db["users"]
-        # Create a demo student user
-        demo_user = {
-            "_id": "demo_student_id",
-            "username": "Demo Student",
-            "email": "demo@example.com",
-            "role": "student",
-            "created_at": datetime.now(),
-            "preferences": {
-                "learning_style": "visual",
-                "difficulty_level": "intermediate",
-                "interests": ["programming", "data science", "mathematics"]
-            }
-        }
-        users_collection.insert_one(demo_user)
-    
-    # Create courses collection if it doesn't exist
-    if "courses" not in db.list_collection_names():
-        courses_collection = db["courses"]
-        # Add sample courses with real materials
-        sample_courses = [
-            {
-                "_id": "course_python_basics",
-                "title": "Python Programming Basics",
-                "description": "An introduction to Python programming language fundamentals with practical examples and exercises.",
-                "category": "Computer Science",
-                "difficulty": "beginner",
-                "topics": ["variables", "data types", "control flow", "functions"],
-                "materials": [
-                    {
-                        "id": "python_w3schools",
-                        "title": "Python Tutorial - W3Schools",
-                        "type": "url",
-                        "url": "https://www.w3schools.com/python/"
-                    },
-                    {
-                        "id": "python_docs",
-                        "title": "Python Official Documentation",
-                        "type": "url",
-                        "url": "https://docs.python.org/3/tutorial/"
-                    }
-                ],
-                "created_at": datetime.now()
-            },
-            {
-                "_id": "course_data_science_intro",
-                "title": "Introduction to Data Science",
-                "description": "Learn the fundamentals of data science with Python, including data analysis, visualization, and basic machine learning.",
-                "category": "Data Science",
-                "difficulty": "intermediate",
-                "topics": ["data analysis", "visualization", "statistics", "machine learning basics"],
-                "materials": [
-                    {
-                        "id": "data_science_coursera",
-                        "title": "Data Science Specialization - Coursera",
-                        "type": "url",
-                        "url": "https://www.coursera.org/specializations/jhu-data-science"
-                    },
-                    {
-                        "id": "pandas_docs",
-                        "title": "Pandas Documentation",
-                        "type": "url",
-                        "url": "https://pandas.pydata.org/docs/"
-                    }
-                ],
-                "created_at": datetime.now()
-            },
-            {
-                "_id": "course_web_dev",
-                "title": "Web Development Fundamentals",
-                "description": "Master the basics of web development including HTML, CSS, and JavaScript.",
-                "category": "Computer Science",
-                "difficulty": "beginner",
-                "topics": ["HTML", "CSS", "JavaScript", "Web Design"],
-                "materials": [
-                    {
-                        "id": "mdn_web",
-                        "title": "MDN Web Docs",
-                        "type": "url",
-                        "url": "https://developer.mozilla.org/en-US/docs/Learn"
-                    },
-                    {
-                        "id": "freecodecamp",
-                        "title": "FreeCodeCamp Web Development",
-                        "type": "url",
-                        "url": "https://www.freecodecamp.org/learn/responsive-web-design/"
-                    }
-                ],
-                "created_at": datetime.now()
-            },
-            {
-                "_id": "course_machine_learning",
-                "title": "Machine Learning Fundamentals",
-                "description": "Learn the core concepts of machine learning and implement them using Python.",
-                "category": "Data Science",
-                "difficulty": "advanced",
-                "topics": ["supervised learning", "unsupervised learning", "neural networks", "deep learning"],
-                "materials": [
-                    {
-                        "id": "ml_coursera",
-                        "title": "Machine Learning by Andrew Ng",
-                        "type": "url",
-                        "url": "https://www.coursera.org/learn/machine-learning"
-                    },
-                    {
-                        "id": "scikit_learn",
-                        "title": "Scikit-learn Documentation",
-                        "type": "url",
-                        "url": "https://scikit-learn.org/stable/"
-                    }
-                ],
-                "created_at": datetime.now()
-            }
-        ]
-        courses_collection.insert_many(sample_courses)
-    
-    # Create assessments collection if it doesn't exist
-    if "assessments" not in db.list_collection_names():
-        assessments_collection = db["assessments"]
-        # Add some demo assessments
-        demo_assessments = [
-            {
-                "_id": "assessment_python_basics",
-                "title": "Python Basics Quiz",
-                "course_id": "course_python_basics",
-                "description": "Test your knowledge of Python fundamentals",
-                "questions": [
-                    {
-                        "question_id": "q1",
-                        "text": "What is the correct way to create a variable in Python?",
-                        "type": "multiple_choice",
-                        "options": ["var x = 5", "x = 5", "x := 5", "set x = 5"],
-                        "correct_answer": "x = 5"
-                    },
-                    {
-                        "question_id": "q2",
-                        "text": "What is the output of: print(2 + 2 * 2)",
-                        "type": "multiple_choice",
-                        "options": ["6", "8", "4", "Error"],
-                        "correct_answer": "6"
-                    },
-                    {
-                        "question_id": "q3",
-                        "text": "Explain how functions help with code reusability in Python.",
-                        "type": "open_ended",
-                        "sample_answer": "Functions allow code to be defined once and executed multiple times, promoting reusability and reducing redundancy. They can accept parameters and return values, making them versatile for different contexts."
-                    }
-                ],
-                "created_at": datetime.now()
-            },
-            {
-                "_id": "assessment_data_science",
-                "title": "Data Science Concepts",
-                "course_id": "course_data_science_intro",
-                "description": "Evaluate your understanding of data science principles",
-                "questions": [
-                    {
-                        "question_id": "q1",
-                        "text": "Which Python library is most commonly used for data manipulation?",
-                        "type": "multiple_choice",
-                        "options": ["NumPy", "Pandas", "Matplotlib", "Scikit-learn"],
-                        "correct_answer": "Pandas"
-                    },
-                    {
-                        "question_id": "q2",
-                        "text": "What does EDA stand for in data science?",
-                        "type": "multiple_choice",
-                        "options": ["External Data Analysis", "Exploratory Data Analysis", "Extended Data Architecture", "Efficient Data Algorithms"],
-                        "correct_answer": "Exploratory Data Analysis"
-                    }
-                ],
-                "created_at": datetime.now()
-            }
-        ]
-        assessments_collection.insert_many(demo_assessments)
-    
-    # Create progress collection if it doesn't exist
-    if "progress" not in db.list_collection_names():
-        progress_collection = db["progress"]
-        # Add some demo progress
-        demo_progress = [
-            {
-                "user_id": "demo_student_id",
-                "course_id": "course_python_basics",
-                "completed_topics": ["variables", "data types"],
-                "progress_percentage": 50,
-                "quiz_scores": [
-                    {"quiz_id": "quiz_variables", "score": 85},
-                    {"quiz_id": "quiz_data_types", "score": 90}
-                ],
-                "last_updated": datetime.now()
-            },
-            {
-                "user_id": "demo_student_id",
-                "course_id": "course_data_science_intro",
-                "completed_topics": ["data analysis"],
-                "progress_percentage": 25,
-                "quiz_scores": [
-                    {"quiz_id": "quiz_data_analysis", "score": 75}
-                ],
-                "last_updated": datetime.now()
-            }
-        ]
-        progress_collection.insert_many(demo_progress)
-        
-    # Create community posts collection if it doesn't exist
-    if "community_posts" not in db.list_collection_names():
-        posts_collection = db["community_posts"]
-        # Add some demo posts
-        demo_posts = [
-            {
-                "user_id": "system",
-                "username": "System",
-                "title": "Welcome to the EduTutor AI Community!",
-                "content": "This is a space for students to connect, collaborate, and learn together. Feel free to share your questions, insights, and resources with others!",
-                "topic": "General",
-                "likes": 5,
-                "comments": [],
-                "created_at": datetime.now()
-            },
-            {
-                "user_id": "demo_student_id",
-                "username": "Demo Student",
-                "title": "Looking for study partners in Data Science",
-                "content": "I'm currently taking the Introduction to Data Science course and would love to connect with others who are learning similar topics. Anyone interested in forming a study group?",
-                "topic": "Data Science",
-                "likes": 2,
-                "comments": [
-                    {
-                        "user_id": "system",
-                        "username": "System",
-                        "content": "Great idea! You can also check out the resources section for additional study materials.",
-                        "created_at": datetime.now()
-                    }
-                ],
-                "created_at": datetime.now()
-            }
-        ]
-        posts_collection.insert_many(demo_posts)
-        
-    # Create Q&A collection if it doesn't exist
-    if "qa_questions" not in db.list_collection_names():
-        qa_collection = db["qa_questions"]
-        # Add some demo questions
-        demo_questions = [
-            {
-                "user_id": "demo_student_id",
-                "username": "Demo Student",
-                "title": "How do list comprehensions work in Python?",
-                "content": "I'm confused about the syntax of list comprehensions. Can someone explain with examples?",
-                "topic": "Python",
-                "answered": True,
-                "ai_answer": "List comprehensions provide a concise way to create lists based on existing lists. The basic syntax is: [expression for item in iterable if condition]. For example, to create a list of squares: squares = [x**2 for x in range(10)]. This is equivalent to using a for loop but more concise and often faster.",
-                "likes": 3,
-                "created_at": datetime.now()
-            },
-            {
-                "user_id": "demo_student_id",
-                "username": "Demo Student",
-                "title": "What's the difference between mean, median, and mode?",
-                "content": "I'm studying statistics and getting confused about when to use each of these measures of central tendency.",
-                "topic": "Statistics",
-                "answered": True,
-                "ai_answer": "Mean is the average of all values (sum divided by count). Median is the middle value when data is sorted. Mode is the most frequently occurring value. Mean is sensitive to outliers, while median is more robust. Use mean for normally distributed data, median for skewed data, and mode for categorical data or when you need the most common value.",
-                "likes": 2,
-                "created_at": datetime.now()
-            }
-        ]
-        qa_collection.insert_many(demo_questions)
+    seed_demo_data(db)
+
+def dedupe_assessment_results(db):
+    """Keep only the latest result of each (user, assessment) pair; returns the number removed"""
+    seen = set()
+    duplicates = []
+    results = db["assessment_results"].find({}, {"user_id": 1, "assessment_id": 1, "completed_at": 1})
+    for result in results.sort("completed_at", pymongo.DESCENDING):
+        pair = (result.get("user_id"), result.get("assessment_id"))
+        if pair in seen:
+            duplicates.append(result["_id"])
+        seen.add(pair)
+    for i in range(0, len(duplicates), 1000):
+        db["assessment_results"].delete_many({"_id": {"$in": duplicates[i:i + 1000]}})
+    if duplicates:
+        # The item statistics counted the removed results; rebuild them on the next run
+        db["job_watermarks"].delete_one({"_id": STATS_WATERMARK_ID})
+    return len(duplicates)
+
+def _ensure_unique_results_index(db):
+    """Unique (user_id, assessment_id) index on assessment_results, removing older duplicate results first if needed"""
+    keys = [("user_id", pymongo.ASCENDING), ("assessment_id", pymongo.ASCENDING)]
+    try:
+        db["assessment_results"].create_index(keys, unique=True)
+        return
+    except pymongo.errors.OperationFailure as e:
+        if e.code not in (11000, 11001):
+            raise
+    # Databases from before submissions were idempotent can hold several results per pair
+    removed = dedupe_assessment_results(db)
+    try:
+        db["assessment_results"].create_index(keys, unique=True)
+        st.warning(f"Removed {removed} duplicate assessment results to enforce one result per user and assessment.")
+    except pymongo.errors.OperationFailure as e:
+        # Keep the real database; until the index exists a repeated submission can add a second result
+        st.error(f"Could not create the unique assessment results index: {e}")
+
+def ensure_indexes(db):
+    """Create the indexes that the per-user queries rely on (no-op if they already exist)"""
+    _ensure_unique_results_index(db)
+    db["assessment_results"].create_index([("stats_pending", pymongo.ASCENDING)], sparse=True)
+    db["progress"].create_index([("user_id", pymongo.ASCENDING), ("course_id", pymongo.ASCENDING)])
+    db["item_parameters"].create_index([("course_id", pymongo.ASCENDING)])
+    db["question_bank"].create_index([("topic", pymongo.ASCENDING), ("difficulty", pymongo.ASCENDING)])
+    db["user_tasks"].create_index([("user_id", pymongo.ASCENDING), ("day", pymongo.ASCENDING)])
+    db["task_rules"].create_index([("user_id", pymongo.ASCENDING), ("start", pymongo.ASCENDING)])
+    db["user_tasks"].create_index([("user_id", pymongo.ASCENDING), ("completed", pymongo.ASCENDING), ("completed_at", pymongo.DESCENDING)])
 
 def get_user_progress(db, user_id):
     """Get progress data for a user across all courses"""
@@ -473,117 +439,77 @@ def get_user_courses(db, user_id):
 
 def get_course_recommendations(db, user_id):
     """Get course recommendations for a user based on their interests and progress"""
-    users_collection = db["users"]
-    courses_collection = db["courses"]
-    
-    # Get user preferences
-    user = users_collection.find_one({"_id": user_id})
-    interests = user.get("preferences", {}).get("interests", [])
-    
-    # Get user's current courses
-    current_courses = get_user_courses(db, user_id)
-    current_course_ids = [c["_id"] for c in current_courses]
-    
-    # Find courses matching user interests that the user is not already enrolled in
-    recommended_courses = []
-    if interests:
-        for interest in interests:
-            similar_courses = list(courses_collection.find({
-                "_id": {"$nin": current_course_ids},
-                "$or": [
-                    {"category": {"$regex": interest, "$options": "i"}},
-                    {"title": {"$regex": interest, "$options": "i"}},
-                    {"description": {"$regex": interest, "$options": "i"}}
-                ]
-            }).limit(3))
-            recommended_courses.extend(similar_courses)
-    
-    # If we don't have enough recommendations, add some popular courses
-    if len(recommended_courses) < 3:
-        additional_courses = list(courses_collection.find({
-            "_id": {"$nin": current_course_ids + [c["_id"] for c in recommended_courses]}
-        }).limit(3 - len(recommended_courses)))
-        recommended_courses.extend(additional_courses)
-    
-    return recommended_courses[:3]  # Return at most 3 recommendations
+    return get_recommender(db).recommend(user_id, k=3)
 
-def save_user_assessment_result(db, user_id, assessment_id, score, answers):
-    """Save user's assessment results"""
-    assessment_results = db["assessment_results"]
-    
-    # Check if this user has already taken this assessment
-    existing_result = assessment_results.find_one({
+def _run_in_transaction(db, write):
+    """Run write(session) in a multi-document transaction when the deployment supports one"""
+    client = getattr(db, "client", None)
+    topology = getattr(client, "topology_description", None)
+    if topology is not None and topology.topology_type_name in ("ReplicaSetWithPrimary", "Sharded", "LoadBalanced"):
+        with client.start_session() as session:
+            return session.with_transaction(write)
+    # Standalone servers and the fallback database run the writes without a transaction
+    return write(None)
+
+def submit_assessment_result(db, user_id, assessment, score, answers, submission_id, feedback=None, progress_field="quiz_scores"):
+    """Persist a completed assessment exactly once per submission and return the stored result
+
+    submission_id is the idempotency key generated when the attempt starts.
+    The result is written with a single upsert that only matches a stored
+    result with a different submission_id. A repeat matches nothing, so its
+    insert collides with the unique (user_id, assessment_id) index, the
+    stored result is left untouched and the progress update is skipped. The
+    course progress update is one ordered bulk_write. Both run in one
+    transaction when the server supports it. progress_field is the progress
+    array the score is kept in; scores that are not percent correct go in
+    their own array so they don't skew quiz averages.
+    """
+    assessment_id = assessment["_id"]
+    course_id = assessment.get("course_id")
+    result = {
         "user_id": user_id,
-        "assessment_id": assessment_id
-    })
+        "assessment_id": assessment_id,
+        "submission_id": submission_id,
+        "score": score,
+        "answers": answers,
+        "feedback": feedback or {},
+        "completed_at": datetime.now(),
+        "stats_pending": True  # counted by the next assessment_stats job
+    }
     
-    if existing_result:
-        # Update existing result
-        assessment_results.update_one(
-            {"_id": existing_result["_id"]},
-            {
-                "$set": {
-                    "score": score,
-                    "answers": answers,
-                    "completed_at": datetime.now()
-                }
-            }
+    def write(session):
+        db["assessment_results"].update_one(
+            {"user_id": user_id, "assessment_id": assessment_id, "submission_id": {"$ne": submission_id}},
+            {"$set": result},
+            upsert=True,
+            session=session
         )
-    else:
-        # Create new result
-        assessment_results.insert_one({
-            "user_id": user_id,
-            "assessment_id": assessment_id,
-            "score": score,
-            "answers": answers,
-            "completed_at": datetime.now()
-        })
-    
-    # Update user progress for the corresponding course
-    assessments_collection = db["assessments"]
-    assessment = assessments_collection.find_one({"_id": assessment_id})
-    
-    if assessment and "course_id" in assessment:
-        progress_collection = db["progress"]
-        progress = progress_collection.find_one({
-            "user_id": user_id,
-            "course_id": assessment["course_id"]
-        })
         
-        if progress:
-            # Update quiz score in progress
-            quiz_scores = progress.get("quiz_scores", [])
-            
-            # Check if this assessment is already in the quiz scores
-            for i, quiz in enumerate(quiz_scores):
-                if quiz["quiz_id"] == assessment_id:
-                    quiz_scores[i] = {"quiz_id": assessment_id, "score": score}
-                    break
-            else:
-                # This assessment wasn't in the quiz scores, so add it
-                quiz_scores.append({"quiz_id": assessment_id, "score": score})
-            
-            # Calculate new progress percentage
-            course = db["courses"].find_one({"_id": assessment["course_id"]})
-            if course:
-                topics = course.get("topics", [])
-                completed_topics = progress.get("completed_topics", [])
-                if topics:
-                    new_progress = min(100, int((len(completed_topics) / len(topics)) * 100))
-                else:
-                    new_progress = progress.get("progress_percentage", 0)
-                
-                # Update progress
-                progress_collection.update_one(
-                    {"_id": progress["_id"]},
-                    {
-                        "$set": {
-                            "quiz_scores": quiz_scores,
-                            "progress_percentage": new_progress,
-                            "last_updated": datetime.now()
-                        }
-                    }
+        if course_id:
+            progress_filter = {"user_id": user_id, "course_id": course_id}
+            db["progress"].bulk_write([
+                # Add a placeholder entry for this assessment if there isn't one yet...
+                pymongo.UpdateOne(
+                    dict(progress_filter, **{f"{progress_field}.quiz_id": {"$ne": assessment_id}}),
+                    {"$push": {progress_field: {"quiz_id": assessment_id, "score": score}}}
+                ),
+                # ...then set its score in place
+                pymongo.UpdateOne(
+                    progress_filter,
+                    {"$set": {f"{progress_field}.$[quiz].score": score, "last_updated": datetime.now()}},
+                    array_filters=[{"quiz.quiz_id": assessment_id}]
                 )
+            ], ordered=True, session=session)
+    
+    try:
+        _run_in_transaction(db, write)
+    except pymongo.errors.DuplicateKeyError:
+        # Already applied by an earlier rerun or another tab; return what was stored
+        stored = db["assessment_results"].find_one({"user_id": user_id, "assessment_id": assessment_id})
+        return stored or result
+    # Quiz scores feed the recommendation profile
+    get_recommender(db).invalidate(user_id)
+    return result
 
 def get_learning_stats(db, user_id):
     """Get learning statistics for the dashboard"""
@@ -687,13 +613,17 @@ def enroll_in_course(db, user_id, course_id):
     try:
         # Add to progress collection
         progress_collection = db["progress"]
-        progress_collection.insert_one({
+        enrollment = {
             "user_id": user_id,
             "course_id": course_id,
             "enrolled_at": datetime.now(),
             "status": "in_progress",
             "progress": 0
-        })
+        }
+        # The weight this enrollment is counted with in the co-occurrence model, subtracted again on unenroll
+        enrollment["cf_weight"] = enrollment_weight(enrollment)
+        progress_collection.insert_one(enrollment)
+        get_recommender(db).record_enrollment(user_id, enrollment)
         return True
     except Exception as e:
         st.error(f"Failed to enroll in course: {e}")
@@ -703,10 +633,12 @@ def unenroll_from_course(db, user_id, course_id):
     """Remove a user's enrollment from a course"""
     try:
         progress_collection = db["progress"]
-        progress_collection.delete_one({
+        enrollment = progress_collection.find_one_and_delete({
             "user_id": user_id,
             "course_id": course_id
         })
+        if enrollment:
+            get_recommender(db).record_enrollment(user_id, enrollment, removed=True)
         return True
     except Exception as e:
         st.error(f"Failed to unenroll from course: {e}")
@@ -721,6 +653,11 @@ def update_user_material(db, material_id, updates):
             {"_id": material_id},
             {"$set": updates}
         )
+        
+        # Re-embed only the edited material so the Q&A index stays current
+        material = materials_collection.find_one({"_id": material_id})
+        if material:
+            index_user_material(material)
         return True
     except Exception as e:
         st.error(f"Failed to update material: {e}")
@@ -780,8 +717,10 @@ def delete_material(db, material_id):
     """Delete a material from the database"""
     try:
         materials_collection = db["user_materials"]
-        result = materials_collection.delete_one({"_id": material_id})
-        if result.deleted_count > 0:
+        material = materials_collection.find_one_and_delete({"_id": material_id})
+        if material:
+            remove_user_material(material_id)
+            release_images(db, material.get("images", []))
             return True
         return False
     except Exception as e:
@@ -0,0 +1,72 @@
+"""
+Grading engine for open-ended assessment answers
+
+Evaluates all open-ended answers of a submission concurrently on a bounded
+thread pool and yields each feedback block as soon as it is ready, so the
+completion screen waits for the slowest answer rather than the sum of all of
+them. Feedback is cached per (assessment, question, normalized answer) so
+identical answers are only graded once. The cache holds only the
+answer-independent feedback; each student's own answer is rendered around it.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ai_engine import EVALUATION_UNAVAILABLE, format_evaluation, grade_answer
+
+GRADING_MAX_WORKERS = int(os.getenv("GRADING_MAX_WORKERS", "4"))
+FEEDBACK_CACHE_SIZE = 2048
+
+_executor = ThreadPoolExecutor(max_workers=GRADING_MAX_WORKERS, thread_name_prefix="grading")
+_feedback_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def normalize_answer(answer):
+    """Case- and whitespace-insensitive form of an answer used as a cache key"""
+    answer = re.sub(r"\s+", " ", (answer or "").strip().lower())
+    return answer.strip(" .!?;:,")
+
+def _cache_get(key):
+    with _cache_lock:
+        if key in _feedback_cache:
+            _feedback_cache.move_to_end(key)
+            return _feedback_cache[key]
+    return None
+
+def _cache_put(key, feedback):
+    with _cache_lock:
+        _feedback_cache[key] = feedback
+        while len(_feedback_cache) > FEEDBACK_CACHE_SIZE:
+            _feedback_cache.popitem(last=False)
+
+def grade_open_ended(ai_models, assessment_id, items):
+    """Grade open-ended answers concurrently, yielding (item, feedback) as each one completes
+
+    items is a list of dicts with question_id, question, answer and reference
+    keys. Cached feedback is yielded first, without touching the pool.
+    """
+    pending = {}
+    for item in items:
+        key = (assessment_id, item["question_id"], normalize_answer(item["answer"]))
+        feedback = _cache_get(key)
+        if feedback is not None:
+            yield item, format_evaluation(item["question"], item["answer"], feedback)
+            continue
+        future = _executor.submit(grade_answer, ai_models, item["question"], item["answer"], item["reference"])
+        pending[future] = (key, item)
+
+    for future in as_completed(pending):
+        key, item = pending[future]
+        try:
+            feedback = future.result()
+        except Exception as e:
+            yield item, f"An error occurred while evaluating your answer: {e}"
+            continue
+        # Unavailable evaluation is not cached so a later attempt can succeed
+        if feedback is None:
+            yield item, EVALUATION_UNAVAILABLE
+            continue
+        _cache_put(key, feedback)
+        yield item, format_evaluation(item["question"], item["answer"], feedback)
@@ -6,14 +6,22 @@ This module provides functions to interact with the IBM Granite LLM.
 
 import requests
 import os
+import asyncio
+import threading
+import httpx
 import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from rate_limit import WeightedFairQueue, FEATURE_WEIGHTS
+from instrumentation import span
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 MODEL_ID = "ibm-granite/granite-3.3-2b-instruct"
-API_URL = f"https://api-inference.huggingface.co/models/{MODEL_ID}"
+# GRANITE_API_URL points the client elsewhere, e.g. at stub_inference.py for offline load tests
+API_URL = os.getenv("GRANITE_API_URL", f"https://api-inference.huggingface.co/models/{MODEL_ID}")
 HF_TOKEN = os.getenv("HF_TOKEN")
 
 if not HF_TOKEN:
@@ -23,39 +31,69 @@ if not HF_TOKEN:
 else:
     headers = {"Authorization": f"Bearer {HF_TOKEN}"}
 
+GRANITE_MAX_CONCURRENCY = int(os.getenv("GRANITE_MAX_CONCURRENCY", "4"))
+GRANITE_TIMEOUT = 30
+SESSION_WATCH_INTERVAL = 5.0
+
+# Every Granite call, sync or async, waits for a slot here
+request_queue = WeightedFairQueue(GRANITE_MAX_CONCURRENCY)
+
 def initialize_granite_model():
     if not HF_TOKEN:
         return None
     return {"api_url": API_URL, "headers": headers, "model_name": MODEL_ID}
 
-def generate_granite_response(granite_model, prompt, max_tokens=512):
-    if not granite_model or not granite_model.get("headers"):
-        return "Error: Hugging Face API token not configured. Please set HF_TOKEN in your .env file."
-        
-    payload = {
+def _payload(prompt, max_tokens):
+    return {
         "inputs": prompt,
         "parameters": {"max_new_tokens": max_tokens},
         "options": {"wait_for_model": True}
     }
+
+def _parse_result(result):
+    """Extract the generated text from an inference API response body"""
+    if isinstance(result, list) and len(result) > 0 and "generated_text" in result[0]:
+        return result[0]["generated_text"]
+    elif isinstance(result, dict) and "generated_text" in result:
+        return result["generated_text"]
+    elif isinstance(result, list) and len(result) > 0 and "generated_text" in result[0].get('generated_text', {}):
+        return result[0]['generated_text']
+    else:
+        return str(result)
+
+def current_user():
+    """Fair-queue flow of the caller: the session's user, or "background" outside a Streamlit script"""
+    if get_script_run_ctx() is None:
+        return "background"
+    return st.session_state.get("user_id", "anonymous")
+
+def generate_granite_response(granite_model, prompt, max_tokens=512, user=None, feature="default", on_wait=None):
+    """Call the Granite inference API, waiting for a slot in the shared fair queue
+
+    on_wait(position) is called while the request is queued, so pages can show
+    the user's place in line.
+    """
+    if not granite_model or not granite_model.get("headers"):
+        return "Error: Hugging Face API token not configured. Please set HF_TOKEN in your .env file."
+        
+    payload = _payload(prompt, max_tokens)
     
     try:
-        response = requests.post(
-            granite_model["api_url"],
-            headers=granite_model["headers"],
-            json=payload,
-            timeout=30  # Add timeout
-        )
+        with span("granite.queue_wait", kind="queue", feature=feature):
+            request_queue.acquire(user or current_user(), FEATURE_WEIGHTS.get(feature, 1.0), on_wait=on_wait)
+        try:
+            with span("granite.generate", kind="inference", feature=feature, max_tokens=max_tokens):
+                response = requests.post(
+                    granite_model["api_url"],
+                    headers=granite_model["headers"],
+                    json=payload,
+                    timeout=30  # Add timeout
+                )
+        finally:
+            request_queue.release()
         
         if response.status_code == 200:
-            result = response.json()
-            if isinstance(result, list) and len(result) > 0 and "generated_text" in result[0]:
-                return result[0]["generated_text"]
-            elif isinstance(result, dict) and "generated_text" in result:
-                return result["generated_text"]
-            elif isinstance(result, list) and len(result) > 0 and "generated_text" in result[0].get('generated_text', {}):
-                return result[0]['generated_text']
-            else:
-                return str(result)
+            return _parse_result(response.json())
         else:
             error_msg = f"Error: {response.status_code} - {response.text}"
             st.error(error_msg)
@@ -64,4 +102,121 @@ def generate_granite_response(granite_model, prompt, max_tokens=512):
     except requests.exceptions.RequestException as e:
         error_msg = f"Error connecting to Hugging Face API: {str(e)}"
         st.error(error_msg)
-        return error_msg
\ No newline at end of file
+        return error_msg
+
+# ---------------------------------------------------------------------------
+# Async client
+#
+# Streamlit scripts are synchronous, so the async client lives on one event
+# loop in a daemon thread shared by all sessions. Requests share a single
+# httpx connection pool and the same weighted fair queue as the sync client,
+# so one user's batch cannot starve everyone else. Work submitted from a
+# Streamlit session is cancelled once that session ends.
+# ---------------------------------------------------------------------------
+
+_loop = None
+_loop_lock = threading.Lock()
+_client = None
+_session_tasks = {}  # Streamlit session id -> set of concurrent futures
+_session_lock = threading.Lock()
+
+def _get_loop():
+    """Start the shared event loop thread on first use"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="granite-async", daemon=True).start()
+            asyncio.run_coroutine_threadsafe(_watch_sessions(), _loop)
+    return _loop
+
+def _current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else None
+
+async def _watch_sessions():
+    """Cancel in-flight work of sessions that have ended"""
+    while True:
+        await asyncio.sleep(SESSION_WATCH_INTERVAL)
+        if not Runtime.exists():
+            continue
+        runtime = Runtime.instance()
+        with _session_lock:
+            ended = [s for s in _session_tasks if not runtime.is_active_session(s)]
+        for session_id in ended:
+            cancel_session(session_id)
+
+def cancel_session(session_id):
+    """Cancel every pending Granite call submitted by a session"""
+    with _session_lock:
+        futures = _session_tasks.pop(session_id, set())
+    for future in futures:
+        future.cancel()
+
+async def agenerate_granite_response(granite_model, prompt, max_tokens=512, user=None, feature="default"):
+    """Async counterpart of generate_granite_response, for coroutines run with run_async
+
+    Errors are returned as strings starting with "Error", like the sync call.
+    """
+    global _client
+    if not granite_model or not granite_model.get("headers"):
+        return "Error: Hugging Face API token not configured. Please set HF_TOKEN in your .env file."
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=GRANITE_TIMEOUT,
+            limits=httpx.Limits(max_connections=GRANITE_MAX_CONCURRENCY)
+        )
+
+    with span("granite.queue_wait", kind="queue", feature=feature):
+        await request_queue.aacquire(user or "background", FEATURE_WEIGHTS.get(feature, 1.0))
+    try:
+        with span("granite.agenerate", kind="inference", feature=feature, max_tokens=max_tokens):
+            response = await _client.post(
+                granite_model["api_url"],
+                headers=granite_model["headers"],
+                json=_payload(prompt, max_tokens)
+            )
+        if response.status_code == 200:
+            return _parse_result(response.json())
+        return f"Error: {response.status_code} - {response.text}"
+    except httpx.HTTPError as e:
+        return f"Error connecting to Hugging Face API: {str(e)}"
+    finally:
+        request_queue.release()
+
+async def agenerate_many(granite_model, prompts, max_tokens=512, user=None, feature="default"):
+    """Run several prompts concurrently under the shared limit; results are in prompt order"""
+    return await asyncio.gather(*(
+        agenerate_granite_response(granite_model, prompt, max_tokens, user, feature) for prompt in prompts
+    ))
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the shared loop and wait for its result
+
+    The call is tied to the current Streamlit session, so it is cancelled if
+    the session ends, and it is cancelled on timeout (raising TimeoutError).
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    session_id = _current_session_id()
+    if session_id:
+        with _session_lock:
+            _session_tasks.setdefault(session_id, set()).add(future)
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+    finally:
+        if session_id:
+            with _session_lock:
+                tasks = _session_tasks.get(session_id)
+                if tasks is not None:
+                    tasks.discard(future)
+                    if not tasks:
+                        del _session_tasks[session_id]
+
+def generate_many(granite_model, prompts, max_tokens=512, user=None, timeout=None, feature="default"):
+    """Blocking helper for scripts: run prompts concurrently and return the responses in order"""
+    if user is None:
+        user = current_user()
+    return run_async(agenerate_many(granite_model, prompts, max_tokens, user, feature), timeout)
@@ -0,0 +1,328 @@
+"""
+Hot-path instrumentation for the SmartLearn Platform
+
+Spans time database operations, Granite calls, chart rendering and document
+parsing. Each span feeds a latency histogram keyed by kind and name, and spans
+recorded during a page rerun are rolled up into per-page rerun latency and
+query-count histograms. Database operations slower than SLOW_QUERY_MS are
+logged with the shape of their filter (values replaced by their types).
+
+Metrics are served in the Prometheus text format on METRICS_PORT, and spans
+are also forwarded to OpenTelemetry when opentelemetry-api is installed, so
+any configured OTel SDK exporter picks them up.
+
+Instrumentation is off unless INSTRUMENTATION=1. When it is off, span()
+returns a shared no-op context manager, traced() returns the function
+unchanged and instrument_db() returns the database unchanged, so the hot
+paths pay at most one attribute lookup.
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from functools import wraps
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENABLED = os.getenv("INSTRUMENTATION", "0").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Collection methods that hit the database
+DB_OPERATIONS = frozenset("""
+find find_one find_one_and_update find_one_and_replace find_one_and_delete count_documents
+estimated_document_count distinct aggregate insert_one insert_many update_one update_many
+replace_one delete_one delete_many bulk_write create_index
+""".split())
+NO_FILTER_OPERATIONS = frozenset(["insert_one", "insert_many", "bulk_write", "create_index", "aggregate"])
+CURSOR_CHAIN_METHODS = frozenset(["sort", "limit", "skip", "batch_size", "hint", "max_time_ms"])
+
+slow_query_log = logging.getLogger("smartlearn.slow_query")
+
+_NULL_SPAN = nullcontext()
+_current_rerun = contextvars.ContextVar("current_rerun", default=None)
+
+try:
+    from opentelemetry import trace as _otel_trace
+    _tracer = _otel_trace.get_tracer("smartlearn")
+except ImportError:
+    _tracer = None
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+_histograms = {}  # (metric, labels tuple) -> Histogram
+_metrics_lock = threading.Lock()
+_collectors = []
+
+def observe(metric, value, buckets=LATENCY_BUCKETS, **labels):
+    """Record a value in the histogram of a metric and label set"""
+    key = (metric, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+def span_count(kind=None):
+    """Number of spans recorded so far, optionally of one kind (e.g. "db")"""
+    with _metrics_lock:
+        return sum(
+            h.count for (metric, labels), h in _histograms.items()
+            if metric == "smartlearn_span_duration_seconds" and (kind is None or ("kind", kind) in labels)
+        )
+
+def filter_shape(value):
+    """Query filter with its values replaced by type names, safe to log"""
+    if isinstance(value, dict):
+        return {k: filter_shape(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [filter_shape(value[0])] if value else []
+    return type(value).__name__
+
+class _Span:
+    __slots__ = ("name", "kind", "attributes", "start")
+
+    def __init__(self, name, kind, attributes):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _record_span(self.name, self.kind, self.start, end, self.attributes, exc_type)
+        return False
+
+def _record_span(name, kind, start, end, attributes, error=None):
+    duration = end - start
+    observe("smartlearn_span_duration_seconds", duration, kind=kind, name=name)
+
+    rerun = _current_rerun.get()
+    if rerun is not None:
+        rerun["spans"] += 1
+        if kind == "db":
+            rerun["queries"] += 1
+
+    if kind == "db" and duration * 1000 >= SLOW_QUERY_MS:
+        slow_query_log.warning(
+            "slow %s on %s took %.1f ms, filter shape %s",
+            name, attributes.get("collection"), duration * 1000, attributes.get("filter_shape")
+        )
+
+    if _tracer is not None:
+        # Forward the finished span with its measured start and end times
+        offset = time.time_ns() - time.perf_counter_ns()
+        otel_span = _tracer.start_span(
+            name, start_time=int(start * 1e9) + offset,
+            attributes={"smartlearn.kind": kind, **{k: str(v) for k, v in attributes.items()}}
+        )
+        if error is not None:
+            otel_span.set_attribute("error.type", error.__name__)
+        otel_span.end(end_time=int(end * 1e9) + offset)
+
+def span(name, kind="internal", **attributes):
+    """Context manager timing a block as a span (a shared no-op when instrumentation is off)"""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, kind, attributes)
+
+def traced(name=None, kind="internal"):
+    """Decorator form of span; returns the function itself when instrumentation is off"""
+    def decorate(func):
+        if not ENABLED:
+            return func
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(span_name, kind, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextmanager
+def page_rerun(page):
+    """Record a page rerun's latency and the number of queries it issued"""
+    if not ENABLED:
+        yield
+        return
+    rerun = {"queries": 0, "spans": 0}
+    token = _current_rerun.set(rerun)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_rerun.reset(token)
+        observe("smartlearn_page_rerun_seconds", time.perf_counter() - start, page=page)
+        observe("smartlearn_page_rerun_queries", rerun["queries"], COUNT_BUCKETS, page=page)
+
+# ---------------------------------------------------------------------------
+# Database proxies
+# ---------------------------------------------------------------------------
+
+class TracedCursor:
+    """Cursor proxy that times iteration, where a find actually reads from the server"""
+
+    def __init__(self, cursor, attributes):
+        self._cursor = cursor
+        self._attributes = attributes
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if name in CURSOR_CHAIN_METHODS and callable(attribute):
+            @wraps(attribute)
+            def chained(*args, **kwargs):
+                return TracedCursor(attribute(*args, **kwargs), self._attributes)
+            return chained
+        return attribute
+
+    def __iter__(self):
+        start = time.perf_counter()
+        elapsed = 0.0
+        iterator = iter(self._cursor)
+        try:
+            while True:
+                step = time.perf_counter()
+                try:
+                    document = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - step
+                    return
+                elapsed += time.perf_counter() - step
+                yield document
+        finally:
+            _record_span("find", "db", start, start + elapsed, self._attributes)
+
+class TracedCollection:
+    """Collection proxy that records a span for every database operation"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in DB_OPERATIONS or not callable(attribute):
+            return attribute
+        collection_name = getattr(self._collection, "name", "?")
+
+        @wraps(attribute)
+        def operation(*args, **kwargs):
+            query = None
+            if name not in NO_FILTER_OPERATIONS:
+                query = args[0] if args and isinstance(args[0], dict) else kwargs.get("filter")
+            attributes = {"collection": collection_name, "filter_shape": filter_shape(query) if query else {}}
+            if name == "find":
+                return TracedCursor(attribute(*args, **kwargs), attributes)
+            with _Span(name, "db", attributes):
+                return attribute(*args, **kwargs)
+        return operation
+
+    def __getitem__(self, name):
+        return self._collection[name]
+
+class TracedDatabase:
+    """Database proxy handing out traced collections"""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getitem__(self, name):
+        return TracedCollection(self._db[name])
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+def instrument_db(db):
+    """Wrap a database so every collection operation is traced (returns db itself when off)"""
+    if not ENABLED or db is None or isinstance(db, TracedDatabase):
+        return db
+    return TracedDatabase(db)
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def register_collector(collector):
+    """Add a callable returning extra Prometheus text (e.g. rate-limit metrics) to the endpoint"""
+    if collector not in _collectors:
+        _collectors.append(collector)
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def prometheus_text():
+    """All histograms, plus registered collectors, in the Prometheus text exposition format"""
+    with _metrics_lock:
+        snapshot = [(key, list(h.counts), h.sum, h.count, h.buckets) for key, h in _histograms.items()]
+    lines = []
+    typed = set()
+    for (metric, labels), counts, total, count, buckets in sorted(snapshot, key=lambda item: item[0]):
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cumulative = 0
+        for bound, bucket_count in zip(list(buckets) + ["+Inf"], counts):
+            cumulative += bucket_count
+            lines.append(f"{metric}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+    text = "\n".join(lines) + "\n" if lines else ""
+    for collector in _collectors:
+        try:
+            text += collector()
+        except Exception as e:
+            text += f"# collector failed: {e}\n"
+    return text
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=METRICS_PORT):
+    """Serve /metrics on a daemon thread (once per process); no-op when port is 0"""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
@@ -1,9 +1,16 @@
 import streamlit as st
-import pandas as pd
-from database import save_user_assessment_result
-from ai_engine import evaluate_answer, generate_practice_questions
+from database import submit_assessment_result
+from question_bank import sample_practice_questions, get_questions, format_practice_questions
+from rate_limit import check_rate_limit
+from grading import grade_open_ended
+from assessment_analytics import score_attempt, question_ids, results_frame
+from adaptive import (
+    load_item_bank, next_item, new_adaptive_state, record_response,
+    ability_percentile, adaptive_assessment_id, ADAPTIVE_MAX_ITEMS, ADAPTIVE_TARGET_SE
+)
 from pages.utils import create_assessment_card
 from datetime import datetime
+import uuid
 
 def show_assessments(db, ai_models):
     """Display the assessments page"""
@@ -17,6 +24,10 @@ def show_assessments(db, ai_models):
         display_assessment(db, ai_models, user_id)
         return
     
+    if "adaptive_test" in st.session_state:
+        display_adaptive_assessment(db, user_id)
+        return
+    
     # Tabs for Available Assessments, Results, and Practice
     tab1, tab2, tab3 = st.tabs(["Available Assessments", "Results", "Practice Questions"])
     
@@ -53,6 +64,10 @@ def show_available_assessments(db, user_id):
             if course_assessments:
                 st.subheader(courses.get(course_id, "Unknown Course"))
                 
+                # Adaptive mode draws from every multiple choice question of the course
+                if load_item_bank(db, course_id)["ids"] and st.button("🎯 Take Adaptive Test", key=f"adaptive_{course_id}"):
+                    start_adaptive_assessment(course_id)
+                
                 for assessment in course_assessments:
                     create_assessment_card(assessment, start_assessment)
     else:
@@ -77,33 +92,30 @@ def show_assessment_results(db, user_id):
         courses_collection = db["courses"]
         courses = {c["_id"]: c["title"] for c in courses_collection.find({"_id": {"$in": course_ids}})}
         
-        # Display results in a table
-        result_data = []
+        # Adaptive attempts are stored under a per-course pseudo assessment
         for r in results:
-            assessment = assessments.get(r["assessment_id"], {})
-            course_id = assessment.get("course_id", "")
-            result_data.append({
-                "Assessment": assessment.get("title", "Unknown Assessment"),
-                "Course": courses.get(course_id, "Unknown Course"),
-                "Score": f"{r.get('score', 0)}%",
-                "Completed": r.get("completed_at", "Unknown")
-            })
+            assessment_id = str(r["assessment_id"])
+            if assessment_id.startswith("adaptive:"):
+                course_id = assessment_id.split(":", 1)[1]
+                assessments[assessment_id] = {"title": "Adaptive Test (ability percentile)", "course_id": course_id, "questions": []}
+                if course_id not in courses:
+                    course = courses_collection.find_one({"_id": course_id})
+                    courses[course_id] = course["title"] if course else "Unknown Course"
         
-        result_df = pd.DataFrame(result_data)
-        st.dataframe(result_df)
+        # Display results in a table, keeping scores numeric for formatting and charting
+        result_df = results_frame(results, assessments, courses)
+        st.dataframe(
+            result_df.drop(columns=["assessment_id"]),
+            column_config={"Score": st.column_config.NumberColumn("Score", format="%.1f%%")},
+            hide_index=True
+        )
         
         # Display a bar chart of scores
         st.subheader("Performance Summary")
-        
-        chart_data = pd.DataFrame({
-            "Assessment": [r["Assessment"] for r in result_data],
-            "Score": [float(r["Score"].strip("%")) for r in result_data]
-        })
-        
-        st.bar_chart(chart_data.set_index("Assessment"))
+        st.bar_chart(result_df.set_index("Assessment")["Score"])
         
         # Option to view detailed results
-        selected_assessment = st.selectbox("View Detailed Results", ["Select an assessment..."] + [r["Assessment"] for r in result_data])
+        selected_assessment = st.selectbox("View Detailed Results", ["Select an assessment..."] + result_df["Assessment"].tolist())
         
         if selected_assessment != "Select an assessment...":
             # Find the corresponding result
@@ -117,13 +129,15 @@ def show_assessment_results(db, user_id):
                 questions = assessment.get("questions", [])
                 
                 # Display each question and answer
-                for i, question in enumerate(questions):
+                answers = selected_result.get("answers", {})
+                _, correct_by_question = score_attempt(questions, answers)
+                for i, (question, question_id) in enumerate(zip(questions, question_ids(questions))):
                     st.markdown(f"**Question {i+1}:** {question.get('text', '')}")
                     
-                    answer = selected_result.get("answers", {}).get(question.get("question_id", ""), "No answer provided")
+                    answer = answers.get(question_id, "No answer provided")
                     
                     if question.get("type") == "multiple_choice":
-                        correct = answer == question.get("correct_answer", "")
+                        correct = correct_by_question.get(question_id, False)
                         st.markdown(f"Your answer: {answer} {'✅' if correct else '❌'}")
                         if not correct:
                             st.markdown(f"Correct answer: {question.get('correct_answer', '')}")
@@ -139,7 +153,7 @@ def show_practice_questions(db, ai_models, user_id):
     
     st.markdown("""
     Generate practice questions on any topic to test your knowledge.
-    These questions are AI-generated and adapt to your specified difficulty level.
+    Questions come from a shared bank that AI keeps growing for each topic and difficulty level.
     """)
     
     # Topic input
@@ -154,38 +168,38 @@ def show_practice_questions(db, ai_models, user_id):
     
     # Generate button
     if st.button("Generate Practice Questions"):
-        if topic:
+        if topic and check_rate_limit(db, user_id, "practice"):
             with st.spinner("Generating practice questions..."):
-                # Use the IBM Granite model if available
-                if "granite_model" in ai_models and ai_models["granite_model"]:
-                    st.info("Using advanced AI model to generate high-quality questions")
-                
-                questions = generate_practice_questions(ai_models, topic, difficulty, num_questions)
-                
-                # Display the generated questions
-                st.subheader(f"Practice Questions: {topic}")
-                st.markdown(questions)
-                
-                # Create a container for the save button
-                save_container = st.container()
-                
-                # Option to save these questions
-                if save_container.button("Save to My Practice Questions"):
-                    # Save the questions to the database
-                    practice_collection = db["practice_questions"]
-                    practice = {
-                        "user_id": user_id,
-                        "topic": topic,
-                        "difficulty": difficulty,
-                        "questions": questions,
-                        "created_at": datetime.now()
-                    }
-                    practice_collection.insert_one(practice)
-                    st.success("Practice questions saved to your collection!")
-                    # We don't need a rerun here since we're not clearing form fields
-        else:
+                # Served from the question bank; Granite tops the bank up in the background
+                questions = sample_practice_questions(db, ai_models, topic, difficulty, num_questions)
+                st.session_state.practice_set = {
+                    "topic": topic,
+                    "difficulty": difficulty,
+                    "questions": questions
+                }
+        elif not topic:
             st.warning("Please enter a topic.")
     
+    # Display the current practice set (kept in session so the save button works after a rerun)
+    practice_set = st.session_state.get("practice_set")
+    if practice_set:
+        st.subheader(f"Practice Questions: {practice_set['topic']}")
+        st.markdown(format_practice_questions(practice_set["topic"], practice_set["difficulty"], practice_set["questions"]))
+        
+        # Option to save these questions (only bank questions can be referenced by id)
+        banked_ids = [q["_id"] for q in practice_set["questions"] if q.get("source") != "template"]
+        if banked_ids and st.button("Save to My Practice Questions"):
+            practice_collection = db["practice_questions"]
+            practice = {
+                "user_id": user_id,
+                "topic": practice_set["topic"],
+                "difficulty": practice_set["difficulty"],
+                "question_ids": banked_ids,
+                "created_at": datetime.now()
+            }
+            practice_collection.insert_one(practice)
+            st.success("Practice questions saved to your collection!")
+    
     # Display saved practice questions
     st.subheader("My Saved Practice Questions")
     
@@ -195,8 +209,14 @@ def show_practice_questions(db, ai_models, user_id):
     
     if saved_practice:
         for practice in saved_practice:
-            with st.expander(f"{practice['topic']} ({practice['difficulty']})"):
-                st.write(practice["questions"])
+            topic_label = practice.get("topic") or practice.get("course_title", "Course")
+            with st.expander(f"{topic_label} ({practice.get('difficulty', 'course')})"):
+                if "question_ids" in practice:
+                    questions = get_questions(db, practice["question_ids"])
+                    st.markdown(format_practice_questions(topic_label, practice.get("difficulty", ""), questions))
+                else:
+                    # Older sets were saved as rendered markdown
+                    st.write(practice.get("questions", "No questions generated for this course yet."))
                 
                 # Option to delete these questions
                 if st.button("Delete", key=f"delete_practice_{practice.get('_id', 'unknown')}"):
@@ -211,8 +231,72 @@ def start_assessment(assessment_id):
     st.session_state.current_assessment = assessment_id
     st.session_state.current_question = 0
     st.session_state.answers = {}
+    # Idempotency key for this attempt, so reruns never save it twice
+    st.session_state.submission_id = uuid.uuid4().hex
+    st.session_state.pop("assessment_submission", None)
+    st.rerun()
+
+def start_adaptive_assessment(course_id):
+    """Start an adaptive test for a course"""
+    st.session_state.adaptive_test = new_adaptive_state(course_id)
+    st.session_state.submission_id = uuid.uuid4().hex
+    st.session_state.pop("assessment_submission", None)
     st.rerun()
 
+def display_adaptive_assessment(db, user_id):
+    """Display an adaptive test, choosing each question from the course's item bank"""
+    state = st.session_state.adaptive_test
+    bank = load_item_bank(db, state["course_id"])
+    
+    st.header("Adaptive Test")
+    st.markdown(
+        f"Questions adapt to your answers. The test ends once your level is measured to within "
+        f"±{ADAPTIVE_TARGET_SE:.1f}, or after at most {ADAPTIVE_MAX_ITEMS} questions."
+    )
+    
+    position = None if state["finished"] else next_item(bank, state["theta"], state["asked"])
+    
+    if position is not None:
+        item = bank["ids"][position]
+        question = bank["questions"][item]
+        
+        st.progress(min(1.0, len(state["asked"]) / ADAPTIVE_MAX_ITEMS))
+        st.markdown(f"Question {len(state['asked']) + 1}")
+        st.subheader(question["text"])
+        answer = st.radio("Select your answer:", question.get("options", []), key=f"adaptive_answer_{item}")
+        
+        if st.button("Next"):
+            record_response(state, bank, position, answer)
+            st.rerun()
+    elif not state["asked"]:
+        # Nothing was asked, so there is no attempt to score or save
+        st.info("This course has no multiple choice questions for an adaptive test yet.")
+        if st.button("Return to Assessments"):
+            st.session_state.pop("adaptive_test", None)
+            st.session_state.pop("submission_id", None)
+            st.rerun()
+    else:
+        st.success("Adaptive test completed!")
+        
+        score = ability_percentile(state["theta"])
+        st.markdown(f"Estimated proficiency: **{score:.1f}** (percentile)")
+        st.caption(f"{len(state['asked'])} questions answered • measurement error ±{state['se']:.2f}")
+        
+        # Persist once per attempt, like regular assessments
+        if st.session_state.get("assessment_submission") is None:
+            pseudo_assessment = {"_id": adaptive_assessment_id(state["course_id"]), "course_id": state["course_id"]}
+            st.session_state.assessment_submission = submit_assessment_result(
+                db, user_id, pseudo_assessment, score, dict(state["answers"]),
+                st.session_state.setdefault("submission_id", uuid.uuid4().hex),
+                progress_field="ability_scores"  # a percentile, not percent correct
+            )
+        
+        if st.button("Return to Assessments"):
+            st.session_state.pop("adaptive_test", None)
+            st.session_state.pop("submission_id", None)
+            st.session_state.pop("assessment_submission", None)
+            st.rerun()
+
 def display_assessment(db, ai_models, user_id):
     """Display the assessment in progress"""
     # Get the assessment from the database
@@ -280,60 +364,83 @@ def display_assessment(db, ai_models, user_id):
         # Assessment completed
         st.success("Assessment completed!")
         
-        # Calculate the score for multiple choice questions
-        score = 0
-        total_mc_questions = 0
-        
-        for q in questions:
-            if q["type"] == "multiple_choice":
-                question_id = q.get("question_id", f"q{questions.index(q) + 1}")
-                if st.session_state.answers.get(question_id) == q.get("correct_answer"):
-                    score += 1
-                total_mc_questions += 1
-        
-        # Calculate percentage score
-        if total_mc_questions > 0:
-            percentage_score = (score / total_mc_questions) * 100
+        # Grade and persist once per attempt; later reruns render the stored result
+        submission = st.session_state.get("assessment_submission")
+        if submission is None:
+            st.session_state.assessment_submission = grade_and_submit(db, ai_models, user_id, assessment, questions)
         else:
-            percentage_score = 0
-        
-        st.markdown(f"Your score for multiple choice questions: **{percentage_score:.1f}%**")
-        
-        # For open-ended questions, provide feedback using AI
-        open_ended_feedback = []
-        
-        for q in questions:
-            if q["type"] == "open_ended":
-                question_id = q.get("question_id", f"q{questions.index(q) + 1}")
-                student_answer = st.session_state.answers.get(question_id, "")
-                
-                if student_answer:
-                    reference_answer = q.get("sample_answer", "")
-                    feedback = evaluate_answer(ai_models, q["text"], student_answer, reference_answer)
-                    
-                    open_ended_feedback.append({
-                        "question": q["text"],
-                        "answer": student_answer,
-                        "feedback": feedback
-                    })
-        
-        # Display feedback for open-ended questions
-        if open_ended_feedback:
-            st.subheader("Feedback on Open-Ended Questions")
-            
-            for item in open_ended_feedback:
-                with st.expander(item["question"]):
-                    st.write("Your answer:")
-                    st.write(item["answer"])
-                    st.write("Feedback:")
-                    st.write(item["feedback"])
-        
-        # Save the assessment result to the database
-        save_user_assessment_result(db, user_id, assessment["_id"], percentage_score, st.session_state.answers)
+            show_submission(submission, questions)
         
         # Button to return to assessments
         if st.button("Return to Assessments"):
             st.session_state.pop("current_assessment", None)
             st.session_state.pop("current_question", None)
             st.session_state.pop("answers", None)
+            st.session_state.pop("submission_id", None)
+            st.session_state.pop("assessment_submission", None)
             st.rerun()
+
+def grade_and_submit(db, ai_models, user_id, assessment, questions):
+    """Score the attempt, stream open-ended feedback and persist the result once"""
+    # Score the multiple choice questions against the answer key in one pass
+    percentage_score, _ = score_attempt(questions, st.session_state.answers)
+    
+    st.markdown(f"Your score for multiple choice questions: **{percentage_score:.1f}%**")
+    
+    # For open-ended questions, provide feedback using AI
+    open_ended_items = []
+    
+    for i, q in enumerate(questions):
+        if q["type"] == "open_ended":
+            question_id = q.get("question_id", f"q{i + 1}")
+            student_answer = st.session_state.answers.get(question_id, "")
+            
+            if student_answer:
+                open_ended_items.append({
+                    "question_id": question_id,
+                    "question": q["text"],
+                    "answer": student_answer,
+                    "reference": q.get("sample_answer", "")
+                })
+    
+    # Display feedback for open-ended questions as each one is graded
+    feedback_by_question = {}
+    if open_ended_items:
+        st.subheader("Feedback on Open-Ended Questions")
+        
+        placeholders = {}
+        for item in open_ended_items:
+            with st.expander(item["question"], expanded=True):
+                st.write("Your answer:")
+                st.write(item["answer"])
+                st.write("Feedback:")
+                placeholders[item["question_id"]] = st.empty()
+                placeholders[item["question_id"]].info("Grading your answer...")
+        
+        for item, feedback in grade_open_ended(ai_models, assessment["_id"], open_ended_items):
+            placeholders[item["question_id"]].write(feedback)
+            feedback_by_question[item["question_id"]] = feedback
+    
+    # Save the assessment result to the database, keyed by this attempt's submission id
+    submission_id = st.session_state.setdefault("submission_id", uuid.uuid4().hex)
+    return submit_assessment_result(
+        db, user_id, assessment, percentage_score, dict(st.session_state.answers),
+        submission_id, feedback=feedback_by_question
+    )
+
+def show_submission(submission, questions):
+    """Render the completion screen from a stored assessment result"""
+    st.markdown(f"Your score for multiple choice questions: **{submission['score']:.1f}%**")
+    
+    feedback = submission.get("feedback", {})
+    if feedback:
+        st.subheader("Feedback on Open-Ended Questions")
+        
+        for i, q in enumerate(questions):
+            question_id = q.get("question_id", f"q{i + 1}")
+            if question_id in feedback:
+                with st.expander(q["text"]):
+                    st.write("Your answer:")
+                    st.write(submission["answers"].get(question_id, ""))
+                    st.write("Feedback:")
+                    st.write(feedback[question_id])
@@ -1,10 +1,14 @@
 import streamlit as st
-from database import get_user_courses, enroll_in_course, unenroll_from_course, update_user_material
+from database import get_user_courses, enroll_in_course, unenroll_from_course, update_user_material, delete_material
+from retrieval import index_user_material
 from pages.utils import create_course_card
 from ai_engine import generate_content, summarize_learning_material
+from rate_limit import check_rate_limit
+from instrumentation import span
+from session_memory import compact_material
+from uploads import edit_images, load_image, save_images, stage_uploads
 from datetime import datetime
 import webbrowser
-import base64
 import docx
 from docx.shared import Inches
 from io import BytesIO
@@ -26,7 +30,7 @@ def show_courses(db, ai_models):
         show_explore_courses(db, user_id)
     
     with tab3:
-        show_add_your_material(db, user_id)
+        show_add_your_material(db, ai_models, user_id)
 
 def show_my_courses(db, user_id):
     """Show courses that the user is enrolled in"""
@@ -83,7 +87,7 @@ def show_my_courses(db, user_id):
                             if material_type == "pdf" or material_type == "url":
                                 webbrowser.open(material_url)
                             elif material_type == "text":
-                                st.session_state.current_material = last_material
+                                st.session_state.current_material = compact_material(last_material)
                                 st.rerun()
                     
                     # Unenroll button
@@ -188,7 +192,7 @@ def show_explore_courses(db, user_id):
     else:
         st.info("No courses found matching your criteria.")
 
-def show_add_your_material(db, user_id):
+def show_add_your_material(db, ai_models, user_id):
     """Show interface for adding user's own learning materials"""
     st.header("Add Your Material")
     
@@ -276,13 +280,8 @@ def show_add_your_material(db, user_id):
             )
             
             if uploaded_images:
-                for image in uploaded_images:
-                    image_bytes = image.read()
-                    image_b64 = base64.b64encode(image_bytes).decode()
-                    st.session_state.material_form_state["images"].append({
-                        "name": image.name,
-                        "data": image_b64
-                    })
+                # The uploader returns the same files on every rerun; only new images are read and staged
+                stage_uploads(st.session_state.material_form_state["images"], uploaded_images)
             
             st.session_state.material_form_state["text_content"] = content
             
@@ -327,8 +326,9 @@ def show_add_your_material(db, user_id):
                     if file_name.endswith('.txt'):
                         file_content = file_bytes.decode('utf-8')
                     elif file_name.endswith('.docx'):
-                        doc = docx.Document(BytesIO(file_bytes))
-                        file_content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
+                        with span("docx.parse", kind="parse", size=len(file_bytes)):
+                            doc = docx.Document(BytesIO(file_bytes))
+                            file_content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
                     else:
                         file_content = f"Uploaded file: {file_name}"
                         
@@ -336,7 +336,12 @@ def show_add_your_material(db, user_id):
                 except Exception as e:
                     st.toast(f"Error processing file: {str(e)}", icon="⚠️")
             
-            if valid_submission:
+            # Each distinct image is stored once in material_blobs; the material keeps references
+            images = save_images(db, st.session_state.material_form_state["images"]) if valid_submission else []
+            
+            if images is None:
+                st.warning("Some images are no longer available and were removed. Add them again, then save.")
+            elif valid_submission:
                 # Save the material to the database
                 materials_collection = db["user_materials"]
                 
@@ -351,11 +356,12 @@ def show_add_your_material(db, user_id):
                     "difficulty": difficulty,
                     "created_at": datetime.now(),
                     "highlights": st.session_state.material_form_state["highlights"],
-                    "images": st.session_state.material_form_state["images"],
+                    "images": images,
                     "last_edited": datetime.now()
                 }
                 
                 materials_collection.insert_one(material)
+                index_user_material(material)
                 st.toast("Material added successfully!", icon="✅")
                 
                 # Reset the form
@@ -386,6 +392,7 @@ def show_add_your_material(db, user_id):
                 # Display material content
                 if material["source_type"] == "Text Note":
                     st.write(material["content"])
+                    show_material_summary(db, ai_models, user_id, material)
                     
                     # Display highlights
                     if material.get("highlights"):
@@ -397,7 +404,9 @@ def show_add_your_material(db, user_id):
                     if material.get("images"):
                         st.write("Images:")
                         for image in material["images"]:
-                            st.image(base64.b64decode(image["data"]), caption=image["name"])
+                            data = load_image(db, image)
+                            if data is not None:
+                                st.image(data, caption=image["name"])
                     
                     # Edit and Delete buttons
                     col1, col2 = st.columns(2)
@@ -410,13 +419,13 @@ def show_add_your_material(db, user_id):
                                 "category": material["category"],
                                 "difficulty": material["difficulty"],
                                 "highlights": material.get("highlights", []),
-                                "images": material.get("images", [])
+                                "images": edit_images(material)
                             }
                             st.rerun()
                     with col2:
                         if st.button("Delete Material", key=f"delete_{material['_id']}"):
                             if st.button("Confirm Delete", key=f"confirm_delete_{material['_id']}"):
-                                materials_collection.delete_one({"_id": material["_id"]})
+                                delete_material(db, material["_id"])
                                 st.success("Material deleted successfully!")
                                 st.rerun()
                 elif material["source_type"] == "URL":
@@ -428,11 +437,12 @@ def show_add_your_material(db, user_id):
                     with col2:
                         if st.button("Delete Material", key=f"delete_{material['_id']}"):
                             if st.button("Confirm Delete", key=f"confirm_delete_{material['_id']}"):
-                                materials_collection.delete_one({"_id": material["_id"]})
+                                delete_material(db, material["_id"])
                                 st.success("Material deleted successfully!")
                                 st.rerun()
                 else:
                     st.write(f"File: {material['file_name']}")
+                    show_material_summary(db, ai_models, user_id, material)
                     col1, col2 = st.columns(2)
                     with col1:
                         if st.button("Download File", key=f"download_{material['_id']}"):
@@ -441,8 +451,16 @@ def show_add_your_material(db, user_id):
                     with col2:
                         if st.button("Delete Material", key=f"delete_{material['_id']}"):
                             if st.button("Confirm Delete", key=f"confirm_delete_{material['_id']}"):
-                                materials_collection.delete_one({"_id": material["_id"]})
+                                delete_material(db, material["_id"])
                                 st.success("Material deleted successfully!")
                                 st.rerun()
     else:
         st.info("You haven't added any materials yet.")
+
+def show_material_summary(db, ai_models, user_id, material):
+    """Summarize a saved material on request; repeat requests are served from the summary cache"""
+    if material.get("content") and st.button("Summarize", key=f"summarize_{material['_id']}"):
+        if not check_rate_limit(db, user_id, "summary"):
+            return
+        with st.spinner("Summarizing..."):
+            st.markdown(summarize_learning_material(ai_models, material["content"]))
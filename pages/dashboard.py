@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from pages.utils import display_progress_chart, display_score_chart, display_summary_metrics, display_radar_chart
+from datetime import datetime, timedelta
+from pages.utils import display_progress_chart, display_score_chart, display_summary_metrics, display_radar_chart, fragment, rerun_fragment
 from database import get_learning_stats, get_course_recommendations, enroll_in_course
+from ai_engine import get_recommendation_plan
+from tasks import complete_task, day_start, get_tasks_in_range
 
-def show_dashboard(db):
+def show_dashboard(db, ai_models=None):
     """Display the dashboard page with learning statistics and recommendations"""
     st.title("📊 Dashboard")
     
@@ -42,21 +45,6 @@ def show_dashboard(db):
             
             st.divider()
     
-    # Get today's tasks for display on dashboard
-    tasks_today = []
-    tasks_collection = None
-    try:
-        from datetime import datetime
-        today = datetime.now().strftime("%Y-%m-%d")
-        tasks_collection = db["user_tasks"]
-        tasks_today = list(tasks_collection.find({
-            "user_id": user_id,
-            "date": today,
-            "completed": False
-        }))
-    except Exception as e:
-        st.warning("Task information could not be loaded")
-        
     # Get learning statistics for the current user
     stats = get_learning_stats(db, user_id)
     
@@ -86,6 +74,19 @@ def show_dashboard(db):
                             st.error("Failed to enroll in the course. Please try again.")
         else:
             st.info("Complete more courses to get personalized recommendations.")
+        
+        # Granite learning plan, served from cache and refreshed in the background
+        plan, refreshing = get_recommendation_plan(db, ai_models, user_id, stats)
+        if plan:
+            with st.expander("🧭 Your Learning Plan", expanded=False):
+                for i, item in enumerate(plan, 1):
+                    st.markdown(f"**{i}. {item['title']}**")
+                    if item["reason"]:
+                        st.caption(item["reason"])
+                if refreshing:
+                    st.caption("Updating your plan with your latest progress...")
+        elif refreshing:
+            st.caption("🧭 Your personalized learning plan is being prepared. Check back in a moment.")
     
     with tab2:
         # Display progress charts in a cleaner format
@@ -207,60 +208,73 @@ def show_dashboard(db):
                 st.caption(f"{level}% Proficiency")
     
     # Add tasks section to the right sidebar
-    st.sidebar.subheader("Today's Tasks")
+    with st.sidebar:
+        tasks_today = show_todays_tasks(db, user_id)
+    if not tasks_today:
+        # Display upcoming deadlines
+        st.subheader("Upcoming Deadlines")
+        
+        # Sample deadlines (in a real implementation, this would come from the database)
+        deadlines = [
+            {"title": "Python Basics Quiz", "due_date": "May 20, 2025", "course": "Python Programming Basics"},
+            {"title": "Data Analysis Project", "due_date": "May 25, 2025", "course": "Introduction to Data Science"}
+        ]
+        
+        if deadlines:
+            for deadline in deadlines:
+                st.markdown(f"**{deadline['title']}** - {deadline['due_date']}")
+                st.caption(f"Course: {deadline['course']}")
+        else:
+            st.info("No upcoming deadlines.")
+    
+    # Already moved personalized recommendations to the Overview tab
+
+@fragment
+def show_todays_tasks(db, user_id):
+    """Today's open tasks in the sidebar; completing one reruns only this fragment, not the charts"""
+    st.subheader("Today's Tasks")
+    
+    # Get today's tasks for display on dashboard
+    tasks_today = []
+    try:
+        today = day_start(datetime.now())
+        tasks_today = get_tasks_in_range(db, user_id, today, today + timedelta(days=1), completed=False)
+    except Exception as e:
+        st.warning("Task information could not be loaded")
+    
     if tasks_today:
         for i, task in enumerate(tasks_today):
-            with st.sidebar.container():
+            with st.container():
                 priority_color = {
                     "Low": "blue",
                     "Medium": "orange",
                     "High": "red"
                 }.get(task.get("priority", "Medium"), "gray")
                 
-                st.sidebar.markdown(
+                st.markdown(
                     f"<div style='display:flex;align-items:center;'>"
                     f"<span style='color:{priority_color};font-weight:bold;margin-right:10px;'>●</span>"
                     f"<span style='font-weight:bold;'>{task.get('name', 'Untitled Task')}</span>"
                     f"</div>",
                     unsafe_allow_html=True
                 )
-                st.sidebar.caption(f"{task.get('task_type', 'Task')} • {task.get('time_estimate', 0)} mins")
+                st.caption(f"{task.get('task_type', 'Task')} • {task.get('time_estimate', 0)} mins")
                 
                 # Quick complete button
-                if st.sidebar.button("✓ Complete", key=f"quick_complete_{i}"):
+                if st.button("✓ Complete", key=f"quick_complete_{i}"):
                     try:
-                        db["user_tasks"].update_one(
-                            {"_id": task["_id"]},
-                            {"$set": {"completed": True}}
-                        )
+                        complete_task(db, task["_id"])
                         st.toast("Task completed!", icon="✅")
-                        st.rerun()
+                        rerun_fragment()
                     except Exception as e:
                         st.toast("Could not update task status", icon="⚠️")
                 
-                st.sidebar.divider()
+                st.divider()
         
-        st.sidebar.markdown("[View All Tasks](/?selection=Task+Planner)")
+        st.markdown("[View All Tasks](/?selection=Task+Planner)")
     else:
-        st.sidebar.info("No tasks scheduled for today")
-        if st.sidebar.button("+ Add Tasks"):
+        st.info("No tasks scheduled for today")
+        if st.button("+ Add Tasks"):
             st.session_state["nav_selection"] = "Task Planner"
             st.rerun()
-        
-        # Display upcoming deadlines
-        st.subheader("Upcoming Deadlines")
-        
-        # Sample deadlines (in a real implementation, this would come from the database)
-        deadlines = [
-            {"title": "Python Basics Quiz", "due_date": "May 20, 2025", "course": "Python Programming Basics"},
-            {"title": "Data Analysis Project", "due_date": "May 25, 2025", "course": "Introduction to Data Science"}
-        ]
-        
-        if deadlines:
-            for deadline in deadlines:
-                st.markdown(f"**{deadline['title']}** - {deadline['due_date']}")
-                st.caption(f"Course: {deadline['course']}")
-        else:
-            st.info("No upcoming deadlines.")
-    
-    # Already moved personalized recommendations to the Overview tab
+    return tasks_today
@@ -4,7 +4,9 @@ import requests
 from database import add_qa_question, update_qa_answer
 from ai_engine import answer_question
 from pages.utils import create_qa_card
-from granite_model import generate_granite_response
+from prompts import complete
+from rate_limit import check_rate_limit
+from retrieval import retrieve_context, format_context
 from datetime import datetime
 
 def load_lottie_url(url):
@@ -117,32 +119,35 @@ def ask_question(db, ai_models, user_id, username):
     
     # Submit button
     if st.button("Submit Question"):
-        if question_text and topic:
+        if question_text and topic and check_rate_limit(db, user_id, "qa"):
             with st.spinner("Processing your question..."):
                 try:
                     # Add the question to the database
                     question_id = add_qa_question(db, user_id, username, question_text, question_text, topic)
                     
-                    # Generate AI answer using IBM Granite model
-                    prompt = f"""
-You are an expert tutor. Answer the following question in a clear, concise, and accurate manner.
-
-Question: {question_text}
-Topic: {topic}
-
-Instructions:
-- Provide a direct answer first.
-- If the question is ambiguous, state your assumptions.
-- Use examples, code, or references if helpful.
-- Keep the explanation relevant to the question and avoid generic information.
-
-Answer:
-"""
-                    answer_content = generate_granite_response(
+                    # Ground the answer in the student's own notes and course content
+                    passages = retrieve_context(db, f"{topic}: {question_text}", user_id)
+                    context = format_context(passages)
+                    context_section = f"""
+Relevant excerpts from the student's study materials:
+{context}
+""" if context else ""
+                    
+                    # Generate AI answer using IBM Granite model, fitted to the context budget
+                    # Show the user's place in line while the request waits for a model slot
+                    queue_status = st.empty()
+                    answer_content, usage = complete(
                         ai_models["granite_model"],
-                        prompt,
-                        max_tokens=1000
+                        "qa",
+                        user=user_id,
+                        on_wait=lambda position: queue_status.info(f"⏳ Waiting for the AI model — you are #{position} in the queue"),
+                        context_section=context_section,
+                        question=question_text,
+                        topic=topic
                     )
+                    queue_status.empty()
+                    if "question" in usage["truncated"]:
+                        st.info("Your question was very long, so only its beginning and end were sent to the AI model.")
                     
                     if answer_content and not answer_content.startswith("Error:"):
                         ai_answer = f"""## Answer to: {question_text}\n\n{answer_content}\n\n---\n*This answer was generated using IBM's Granite model, trained on a diverse dataset of educational content.*"""
@@ -1,5 +1,10 @@
 import streamlit as st
 from datetime import datetime, timedelta
+from tasks import (REPEAT_PRESETS, TREND_WEEKS, add_rule, add_task, complete_task, complete_tasks, copy_tasks, day_start,
+                   delete_rule, delete_task, delete_tasks, get_rules, get_task_stats, get_tasks_in_range, group_by_day,
+                   recent_completed_tasks, type_breakdown, weekly_trend)
+from study_planner import (apply_plan, auto_schedule_enabled, get_study_minutes, plan_tasks, rebalance_tasks,
+                           set_auto_schedule, set_study_minutes)
 
 def show_todo(db):
     """Display the todo list page"""
@@ -25,7 +30,7 @@ def show_daily_tasks(db, user_id):
     st.header("Today's Tasks")
     
     # Get today's date and format it
-    today = datetime.now().strftime("%Y-%m-%d")
+    today = day_start(datetime.now())
     st.subheader(f"Date: {datetime.now().strftime('%A, %B %d, %Y')}")
     
     # Add a new task form
@@ -49,8 +54,6 @@ def show_daily_tasks(db, user_id):
     if submitted:
         if task_name:
             # Add task to database
-            tasks_collection = db["user_tasks"]
-            
             new_task = {
                 "user_id": user_id,
                 "name": task_name,
@@ -58,23 +61,20 @@ def show_daily_tasks(db, user_id):
                 "time_estimate": time_estimate,
                 "task_type": task_type,
                 "notes": notes,
-                "date": today,
+                "day": today,
                 "completed": False,
                 "created_at": datetime.now()
             }
             
-            tasks_collection.insert_one(new_task)
+            add_task(db, new_task)
             st.toast(f"Task '{task_name}' added for today", icon="✅")
+            rebalance_plan(db, user_id)
             st.rerun()
         else:
             st.toast("Please enter a task name", icon="⚠️")
     
     # Display today's tasks
-    tasks_collection = db["user_tasks"]
-    today_tasks = list(tasks_collection.find({
-        "user_id": user_id,
-        "date": today
-    }))
+    today_tasks = get_tasks_in_range(db, user_id, today, today + timedelta(days=1))
     
     if today_tasks:
         # Group tasks by completion status
@@ -90,11 +90,9 @@ def show_daily_tasks(db, user_id):
                 with col1:
                     if st.checkbox("", key=f"check_{task.get('_id', i)}", value=False):
                         # Mark as completed
-                        tasks_collection.update_one(
-                            {"_id": task["_id"]},
-                            {"$set": {"completed": True}}
-                        )
+                        complete_task(db, task["_id"])
                         st.toast(f"Task '{task['name']}' completed!", icon="🎉")
+                        rebalance_plan(db, user_id)
                         st.rerun()
                 
                 with col2:
@@ -111,18 +109,36 @@ def show_daily_tasks(db, user_id):
                         f"</div>",
                         unsafe_allow_html=True
                     )
-                    st.caption(f"{task['task_type']} • {task['time_estimate']} mins")
+                    st.caption(f"{task['task_type']} • {task['time_estimate']} mins" + (" • 🔁 Recurring" if task.get("rule_id") else ""))
                     if task.get("notes"):
                         with st.expander("Notes"):
                             st.write(task["notes"])
                 
                 with col3:
                     if st.button("🗑️", key=f"delete_{task.get('_id', i)}"):
-                        tasks_collection.delete_one({"_id": task["_id"]})
+                        delete_task(db, task["_id"])
                         st.toast("Task deleted", icon="🗑️")
                         st.rerun()
                 
                 st.divider()
+            
+            # Complete or delete several tasks with a single write
+            if len(pending_tasks) > 1:
+                with st.expander("Bulk Actions"):
+                    names = {t["_id"]: t["name"] for t in pending_tasks}
+                    selected = st.multiselect("Select tasks", options=list(names), format_func=names.get, key="bulk_select_today")
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        if st.button("✓ Complete Selected", key="bulk_complete_today", disabled=not selected):
+                            count = complete_tasks(db, selected)
+                            st.toast(f"{count} tasks completed!", icon="🎉")
+                            rebalance_plan(db, user_id)
+                            st.rerun()
+                    with col2:
+                        if st.button("🗑️ Delete Selected", key="bulk_delete_today", disabled=not selected):
+                            count = delete_tasks(db, selected)
+                            st.toast(f"{count} tasks deleted", icon="🗑️")
+                            st.rerun()
         
         # Show completed tasks in an expander
         if completed_tasks:
@@ -157,12 +173,11 @@ def show_weekly_planner(db, user_id):
     st.header("Weekly Planner")
     
     # Get the start of the current week (Monday)
-    today = datetime.now()
+    today = day_start(datetime.now())
     start_of_week = today - timedelta(days=today.weekday())
     
     # Create date objects for the week
     week_dates = [start_of_week + timedelta(days=i) for i in range(7)]
-    week_date_strs = [d.strftime("%Y-%m-%d") for d in week_dates]
     
     # Display the week dates and allow user to select a day
     st.subheader(f"Week of {start_of_week.strftime('%B %d, %Y')}")
@@ -175,7 +190,6 @@ def show_weekly_planner(db, user_id):
     )
     
     selected_date = week_dates[selected_day_idx]
-    selected_date_str = selected_date.strftime("%Y-%m-%d")
     
     # Form to add a task for the selected day
     with st.form(f"plan_task_form_{selected_day_idx}"):
@@ -195,13 +209,19 @@ def show_weekly_planner(db, user_id):
         )
         
         notes = st.text_area("Notes (Optional)", placeholder="Add any additional notes here...")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            repeat = st.selectbox("Repeat", ["Does not repeat"] + list(REPEAT_PRESETS) + ["Custom (RRULE)"])
+            custom_rule = st.text_input("Custom rule", placeholder="FREQ=WEEKLY;BYDAY=TU,TH")
+        with col2:
+            repeat_until = st.date_input("Repeat until (optional)", value=None, min_value=selected_date)
+            deadline = st.date_input("Deadline (optional)", value=None, min_value=selected_date)
         submitted = st.form_submit_button("Add to Planner")
     
     if submitted:
         if task_name:
             # Add task to database
-            tasks_collection = db["user_tasks"]
-            
             new_task = {
                 "user_id": user_id,
                 "name": task_name,
@@ -209,41 +229,47 @@ def show_weekly_planner(db, user_id):
                 "time_estimate": time_estimate,
                 "task_type": task_type,
                 "notes": notes,
-                "date": selected_date_str,
+                "day": selected_date,
                 "completed": False,
                 "created_at": datetime.now()
             }
+            if deadline:
+                new_task["deadline"] = day_start(deadline)
             
-            tasks_collection.insert_one(new_task)
-            st.toast(f"Task '{task_name}' added for {day_names[selected_day_idx]}", icon="✅")
-            st.rerun()
+            if repeat == "Does not repeat":
+                add_task(db, new_task)
+                st.toast(f"Task '{task_name}' added for {day_names[selected_day_idx]}", icon="✅")
+                rebalance_plan(db, user_id)
+                st.rerun()
+            else:
+                # Recurring tasks are stored as one rule and expanded per viewed range
+                rule = custom_rule if repeat == "Custom (RRULE)" else REPEAT_PRESETS[repeat]
+                try:
+                    add_rule(db, user_id, new_task, rule, selected_date, repeat_until)
+                except ValueError as e:
+                    st.toast(str(e), icon="⚠️")
+                else:
+                    st.toast(f"Recurring task '{task_name}' added from {day_names[selected_day_idx]}", icon="🔁")
+                    st.rerun()
         else:
             st.toast("Please enter a task name", icon="⚠️")
     
     # Display weekly overview
     st.subheader("Weekly Overview")
     
-    # Get all tasks for the week
-    tasks_collection = db["user_tasks"]
-    week_tasks = list(tasks_collection.find({
-        "user_id": user_id,
-        "date": {"$in": week_date_strs}
-    }))
-    
-    # Group tasks by day
-    tasks_by_day = {day_str: [] for day_str in week_date_strs}
-    for task in week_tasks:
-        tasks_by_day[task["date"]].append(task)
+    # Get all tasks for the week in one range query and group them by day
+    week_tasks = get_tasks_in_range(db, user_id, start_of_week, start_of_week + timedelta(days=7))
+    tasks_by_day = group_by_day(week_tasks, start_of_week, 7)
     
     # Create columns for each day
     cols = st.columns(7)
     
-    for i, (col, date, date_str) in enumerate(zip(cols, week_dates, week_date_strs)):
+    for i, (col, date) in enumerate(zip(cols, week_dates)):
         with col:
             st.markdown(f"**{day_names[i][:3]}**")
             st.caption(date.strftime("%m/%d"))
             
-            day_tasks = tasks_by_day[date_str]
+            day_tasks = tasks_by_day[date]
             completed = sum(1 for t in day_tasks if t.get("completed", False))
             total = len(day_tasks)
             
@@ -253,49 +279,118 @@ def show_weekly_planner(db, user_id):
                 st.progress((completed/total) if total > 0 else 0)
             else:
                 st.markdown("No tasks")
+    
+    # Copy a day or the whole week in one write
+    with st.expander("Copy Tasks"):
+        col1, col2 = st.columns(2)
+        with col1:
+            target_date = st.date_input("Copy to", value=selected_date + timedelta(days=7), key="copy_day_target")
+            if st.button(f"Copy {day_names[selected_day_idx]}'s Tasks", key="copy_day"):
+                count = copy_tasks(db, user_id, selected_date, 1, target_date)
+                st.toast(f"Copied {count} tasks to {target_date.strftime('%b %d')}", icon="📋")
+                st.rerun()
+        with col2:
+            st.caption("Copies every task planned this week to the same days next week")
+            if st.button("Copy Week to Next Week", key="copy_week"):
+                count = copy_tasks(db, user_id, start_of_week, 7, start_of_week + timedelta(days=7))
+                st.toast(f"Copied {count} tasks to next week", icon="📋")
+                st.rerun()
+    
+    # Automatic scheduling within the time the user has each day
+    with st.expander("🗓️ Auto-Schedule"):
+        st.caption("Minutes available for study on each day")
+        study_minutes = get_study_minutes(db, user_id)
+        minute_cols = st.columns(7)
+        new_minutes = [
+            minute_cols[i].number_input(day_names[i][:3], min_value=0, max_value=960, value=study_minutes[i], step=15, key=f"study_minutes_{i}")
+            for i in range(7)
+        ]
+        if new_minutes != study_minutes:
+            set_study_minutes(db, user_id, new_minutes)
+        
+        auto_schedule = auto_schedule_enabled(db, user_id)
+        if st.toggle("Rebalance automatically when tasks are added or completed", value=auto_schedule) != auto_schedule:
+            set_auto_schedule(db, user_id, not auto_schedule)
+        exact = st.checkbox("Use the exact optimizer (slower, small plans only)")
+        
+        if st.button("Plan My Next 7 Days", key="plan_week"):
+            plan, planned_tasks = plan_tasks(db, user_id, exact=exact)
+            moved = apply_plan(db, plan, planned_tasks)
+            st.toast(f"Planned {len(plan['assignments'])} tasks, moved {moved}", icon="🗓️")
+            if plan["unscheduled"]:
+                st.toast(f"{len(plan['unscheduled'])} tasks don't fit before their deadline", icon="⚠️")
+            st.rerun()
+    
+    # Recurring task rules
+    rules = get_rules(db, user_id)
+    if rules:
+        with st.expander(f"Recurring Tasks ({len(rules)})"):
+            for rule in rules:
+                col1, col2 = st.columns([0.8, 0.2])
+                with col1:
+                    st.markdown(f"**{rule['name']}**")
+                    until = f" until {rule['until'].strftime('%b %d, %Y')}" if rule.get("until") else ""
+                    st.caption(f"{rule['rule']} • from {rule['start'].strftime('%b %d, %Y')}{until}")
+                with col2:
+                    if st.button("Stop", key=f"stop_rule_{rule['_id']}"):
+                        delete_rule(db, rule["_id"])
+                        st.toast(f"Stopped repeating '{rule['name']}'", icon="🛑")
+                        st.rerun()
+
+def rebalance_plan(db, user_id):
+    """Rebalance the user's plan after a change, if they turned automatic scheduling on"""
+    moved = rebalance_tasks(db, user_id)
+    if moved:
+        st.toast(f"Plan rebalanced: {moved} tasks moved", icon="🗓️")
 
 def show_task_history(db, user_id):
     """Show completed tasks history and analytics"""
     st.header("Task History & Analytics")
     
-    # Get all tasks for the user
-    tasks_collection = db["user_tasks"]
-    all_tasks = list(tasks_collection.find({"user_id": user_id}))
+    # Totals come from the user's task rollup rather than from every task they ever created
+    stats = get_task_stats(db, user_id)
     
-    if not all_tasks:
+    if not stats.get("total"):
         st.info("No task history available. Start adding tasks to see analytics.")
         return
     
-    # Filter for completed tasks
-    completed_tasks = [t for t in all_tasks if t.get("completed", False)]
+    total_completed = stats.get("completed", 0)
     
     # Basic statistics
     st.subheader("Task Completion Stats")
     
     col1, col2, col3 = st.columns(3)
     with col1:
-        total_completed = len(completed_tasks)
         st.metric("Total Completed", total_completed)
     
     with col2:
-        completion_rate = (len(completed_tasks) / len(all_tasks)) * 100 if len(all_tasks) > 0 else 0
+        completion_rate = (total_completed / stats["total"]) * 100
         st.metric("Completion Rate", f"{completion_rate:.1f}%")
     
     with col3:
-        if completed_tasks:
-            avg_time = sum(t.get("time_estimate", 0) for t in completed_tasks) / len(completed_tasks)
+        if total_completed:
+            avg_time = stats.get("completed_minutes", 0) / total_completed
             st.metric("Avg. Task Time", f"{avg_time:.0f} mins")
         else:
             st.metric("Avg. Task Time", "N/A")
     
+    # Weekly and per-type trends
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader(f"Completed per Week (last {TREND_WEEKS})")
+        st.bar_chart(weekly_trend(stats).set_index("week")["completed"])
+    
+    with col2:
+        st.subheader("By Task Type")
+        st.dataframe(type_breakdown(stats), hide_index=True, use_container_width=True)
+    
     # Display recent completed tasks
     st.subheader("Recently Completed Tasks")
     
-    # Sort by completion time (we'll use the _id as a proxy for time if needed)
-    sorted_completed = sorted(completed_tasks, key=lambda x: x.get("_id", ""), reverse=True)[:10]
+    recent = recent_completed_tasks(db, user_id)
     
-    if sorted_completed:
-        for task in sorted_completed:
+    if recent:
+        for task in recent:
             with st.container():
                 col1, col2 = st.columns([0.7, 0.3])
                 with col1:
@@ -303,9 +398,10 @@ def show_task_history(db, user_id):
                     st.caption(f"{task['task_type']} • {task['time_estimate']} mins • {task['priority']} Priority")
                 
                 with col2:
-                    task_date = datetime.strptime(task["date"], "%Y-%m-%d").strftime("%b %d")
+                    # Tasks completed before completion times were recorded show their planned day
+                    task_date = (task.get("completed_at") or task["day"]).strftime("%b %d")
                     st.markdown(f"**{task_date}**")
                 
                 st.divider()
     else:
-        st.info("No completed tasks yet.")
\ No newline at end of file
+        st.info("No completed tasks yet.")
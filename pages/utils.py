@@ -1,15 +1,72 @@
+import hashlib
+import threading
+from collections import OrderedDict
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from datetime import datetime
+from instrumentation import traced
 
-def display_progress_chart(progress_data):
-    """Display a bar chart of course progress"""
-    if progress_data.empty:
-        st.warning("No progress data available.")
-        return
-    
+CHART_CACHE_SIZE = 128
+MAX_BARS = 30         # bar charts with more categories keep the largest ones and fold the rest into "Other"
+MAX_RADAR_AXES = 12
+
+# Serialized figures keyed by chart kind and a content hash of their data.
+# Each render gets its own Figure from the JSON, so sessions share no mutable state.
+_figure_cache = OrderedDict()
+_figure_lock = threading.Lock()
+
+# st.fragment is Streamlit 1.37+ (st.experimental_fragment before that); without either, charts render inline
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+def rerun_fragment():
+    """Rerun only the enclosing fragment where supported, otherwise the whole page"""
+    try:
+        st.rerun(scope="fragment")
+    except TypeError:
+        st.rerun()
+
+def frame_hash(frame):
+    """Content hash of a DataFrame (values and column names)"""
+    digest = hashlib.sha1(",".join(map(str, frame.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(frame, index=False).values.tobytes())
+    return digest.hexdigest()
+
+def cached_figure_json(kind, frame, build):
+    """JSON of the figure build(frame) returns, built and serialized once while the frame's content is unchanged"""
+    key = (kind, frame_hash(frame))
+    with _figure_lock:
+        spec = _figure_cache.get(key)
+        if spec is not None:
+            _figure_cache.move_to_end(key)
+            return spec
+    spec = build(frame).to_json()
+    with _figure_lock:
+        _figure_cache[key] = spec
+        while len(_figure_cache) > CHART_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    return spec
+
+def aggregate_bars(frame, label, value, limit=MAX_BARS):
+    """At most limit bars: repeated labels are averaged and the smallest bars folded into an Other bar"""
+    if len(frame) <= limit:
+        return frame
+    grouped = frame.groupby(label, as_index=False, sort=False)[value].mean()
+    if len(grouped) <= limit:
+        return grouped
+    top = grouped.nlargest(limit - 1, value)
+    rest = grouped.drop(top.index)
+    other = pd.DataFrame({label: [f"Other ({len(rest)})"], value: [rest[value].mean()]})
+    return pd.concat([top, other], ignore_index=True)
+
+@fragment
+def _plotly_fragment(kind, frame, build):
+    # A fresh Figure per render; loading the cached JSON is far cheaper than building with plotly express
+    st.plotly_chart(pio.from_json(cached_figure_json(kind, frame, build), skip_invalid=True), use_container_width=True)
+
+def _progress_figure(progress_data):
     fig = px.bar(
         progress_data,
         x="course",
@@ -27,15 +84,17 @@ def display_progress_chart(progress_data):
         yaxis_range=[0, 100],
         height=400
     )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-def display_score_chart(quiz_data):
-    """Display a bar chart of quiz scores"""
-    if quiz_data.empty:
-        st.warning("No quiz data available.")
+@traced("render.progress_chart", kind="render")
+def display_progress_chart(progress_data):
+    """Display a bar chart of course progress"""
+    if progress_data.empty:
+        st.warning("No progress data available.")
         return
-    
+    _plotly_fragment("progress", aggregate_bars(progress_data, "course", "progress"), _progress_figure)
+
+def _score_figure(quiz_data):
     fig = px.bar(
         quiz_data,
         x="course",
@@ -53,8 +112,15 @@ def display_score_chart(quiz_data):
         yaxis_range=[0, 100],
         height=400
     )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+@traced("render.score_chart", kind="render")
+def display_score_chart(quiz_data):
+    """Display a bar chart of quiz scores"""
+    if quiz_data.empty:
+        st.warning("No quiz data available.")
+        return
+    _plotly_fragment("score", aggregate_bars(quiz_data, "course", "score"), _score_figure)
 
 def display_summary_metrics(stats):
     """Display summary metrics in a multi-column layout"""
@@ -78,8 +144,7 @@ def display_summary_metrics(stats):
             value=f"{stats['avg_score']:.1f}%"
         )
 
-def display_radar_chart(skills_data):
-    """Display a radar chart of skill levels"""
+def _radar_figure(skills_data):
     fig = go.Figure()
     
     fig.add_trace(go.Scatterpolar(
@@ -99,8 +164,14 @@ def display_radar_chart(skills_data):
         title="Skill Assessment",
         height=400
     )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+@traced("render.radar_chart", kind="render")
+def display_radar_chart(skills_data):
+    """Display a radar chart of skill levels"""
+    if len(skills_data) > MAX_RADAR_AXES:
+        skills_data = skills_data.nlargest(MAX_RADAR_AXES, "level")
+    _plotly_fragment("radar", skills_data, _radar_figure)
 
 def format_timestamp(timestamp):
     """Format a timestamp to a readable date string"""
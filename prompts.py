@@ -0,0 +1,290 @@
+"""
+Prompt construction for Granite calls
+
+Tasks (qa, grading, practice, summary, recommendation) register a template
+once. Templates are compiled into literal and field segments, and the token
+count of the literal part is cached, so building a prompt only measures the
+variable fields. When the fields do not fit the model's context budget, the
+lowest-priority compressible fields are cut first, and max_new_tokens is
+chosen from what is left of the budget. Every call returns its token
+accounting, and running totals per task are kept for monitoring.
+"""
+
+import os
+import re
+import string
+import threading
+from functools import lru_cache
+import streamlit as st
+from granite_model import MODEL_ID, agenerate_granite_response, generate_granite_response
+
+GRANITE_CONTEXT_TOKENS = int(os.getenv("GRANITE_CONTEXT_TOKENS", "8192"))
+TRUNCATION_MARKER = " [...] "
+
+# ~1 token per short word piece, digit group or punctuation mark, close to BPE counts for English
+_PIECE_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|[^\sA-Za-z\d]")
+
+class HeuristicTokenCounter:
+    """Regex approximation of the model tokenizer, used when the real one is unavailable"""
+
+    name = "heuristic"
+
+    def spans(self, text):
+        return [m.span() for m in _PIECE_RE.finditer(text)]
+
+    def count(self, text):
+        return sum(1 for _ in _PIECE_RE.finditer(text))
+
+class HFTokenCounter:
+    """The model's own fast tokenizer (requires the tokenizers package and the tokenizer files)"""
+
+    def __init__(self, model_name=MODEL_ID):
+        from tokenizers import Tokenizer
+        self.tokenizer = Tokenizer.from_pretrained(model_name)
+        self.name = model_name
+
+    def spans(self, text):
+        return list(self.tokenizer.encode(text, add_special_tokens=False).offsets)
+
+    def count(self, text):
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+@st.cache_resource(show_spinner=False)
+def load_token_counter():
+    """Load the model tokenizer, falling back to the heuristic counter if it is unavailable"""
+    try:
+        return HFTokenCounter()
+    except Exception:
+        return HeuristicTokenCounter()
+
+def count_tokens(text):
+    """Estimated token count of text"""
+    return load_token_counter().count(text or "")
+
+def truncate_tokens(text, max_tokens, keep="head"):
+    """Cut text to at most max_tokens tokens
+
+    keep="head" keeps the beginning, "tail" the end, and "middle" keeps both
+    ends around a marker (useful for long pasted questions whose ask is at the
+    end).
+    """
+    if max_tokens <= 0:
+        return ""
+    spans = load_token_counter().spans(text)
+    if len(spans) <= max_tokens:
+        return text
+    if keep == "tail":
+        return "..." + text[spans[-max_tokens][0]:]
+    if keep == "middle" and max_tokens >= 8:
+        head = max_tokens // 2
+        tail = max_tokens - head
+        return text[:spans[head - 1][1]] + TRUNCATION_MARKER + text[spans[-tail][0]:]
+    return text[:spans[max_tokens - 1][1]] + "..."
+
+# ---------------------------------------------------------------------------
+# Template registry
+# ---------------------------------------------------------------------------
+
+_templates = {}
+
+def register_template(task, text, max_new_tokens=512, min_new_tokens=64, compress=None, limits=None):
+    """Register the prompt template of a task
+
+    compress maps field names to (priority, keep) pairs; fields with the
+    lowest priority are shortened first when the prompt is over budget, and
+    fields not listed are never shortened. limits caps compressible fields at a
+    token count whatever the budget, so a huge paste cannot crowd out the rest.
+    """
+    _templates[task] = {
+        "text": text,
+        "max_new_tokens": max_new_tokens,
+        "min_new_tokens": min_new_tokens,
+        "compress": compress or {},
+        "limits": limits or {}
+    }
+
+@lru_cache(maxsize=64)
+def _compile(text, counter_name):
+    """Split a template into literal segments and field names, with the literal token count"""
+    segments = []
+    literal_tokens = 0
+    for literal, field, _, _ in string.Formatter().parse(text):
+        if literal:
+            segments.append((literal, None))
+            literal_tokens += count_tokens(literal)
+        if field is not None:
+            segments.append((None, field))
+    return tuple(segments), literal_tokens
+
+def build_prompt(task, budget=GRANITE_CONTEXT_TOKENS, max_new_tokens=None, **fields):
+    """Render a task's prompt within a token budget
+
+    Returns (prompt, accounting). accounting holds prompt_tokens,
+    max_new_tokens, the budget, per-field token counts and the fields that were
+    truncated. max_new_tokens caps the template's own output limit.
+    """
+    template = _templates[task]
+    segments, literal_tokens = _compile(template["text"], load_token_counter().name)
+    output_cap = min(max_new_tokens or template["max_new_tokens"], template["max_new_tokens"])
+    reserve = min(template["min_new_tokens"], output_cap)
+
+    values = {name: str(fields.get(name, "")) for _, name in segments if name}
+    field_tokens = {name: count_tokens(value) for name, value in values.items()}
+    overflow = literal_tokens + sum(field_tokens.values()) + reserve - budget
+
+    truncated = []
+    for name, limit in template["limits"].items():
+        if field_tokens.get(name, 0) > limit:
+            values[name] = truncate_tokens(values[name], limit, template["compress"].get(name, (0, "head"))[1])
+            overflow -= field_tokens[name] - count_tokens(values[name])
+            field_tokens[name] = count_tokens(values[name])
+            truncated.append(name)
+
+    for name, (_, keep) in sorted(template["compress"].items(), key=lambda item: item[1][0]):
+        if overflow <= 0:
+            break
+        if not field_tokens.get(name):
+            continue
+        target = max(0, field_tokens[name] - overflow)
+        values[name] = truncate_tokens(values[name], target, keep)
+        new_tokens = count_tokens(values[name])
+        overflow -= field_tokens[name] - new_tokens
+        field_tokens[name] = new_tokens
+        if name not in truncated:
+            truncated.append(name)
+
+    prompt = "".join(literal if literal is not None else values[name] for literal, name in segments)
+    prompt_tokens = literal_tokens + sum(field_tokens.values())
+    return prompt, {
+        "task": task,
+        "budget": budget,
+        "prompt_tokens": prompt_tokens,
+        "max_new_tokens": max(1, min(output_cap, budget - prompt_tokens)),
+        "field_tokens": field_tokens,
+        "truncated": truncated
+    }
+
+# ---------------------------------------------------------------------------
+# Token accounting
+# ---------------------------------------------------------------------------
+
+_usage = {}
+_usage_lock = threading.Lock()
+
+def record_usage(accounting, completion=""):
+    """Add a call's token counts to the per-task totals; returns the accounting with completion_tokens"""
+    accounting["completion_tokens"] = count_tokens(completion) if completion else 0
+    with _usage_lock:
+        totals = _usage.setdefault(accounting["task"], {
+            "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "truncated_calls": 0
+        })
+        totals["calls"] += 1
+        totals["prompt_tokens"] += accounting["prompt_tokens"]
+        totals["completion_tokens"] += accounting["completion_tokens"]
+        totals["truncated_calls"] += bool(accounting["truncated"])
+    return accounting
+
+def usage_totals():
+    """Copy of the running token totals per task"""
+    with _usage_lock:
+        return {task: dict(totals) for task, totals in _usage.items()}
+
+def complete(granite_model, task, budget=GRANITE_CONTEXT_TOKENS, max_new_tokens=None, user=None, on_wait=None, **fields):
+    """Build a task's prompt within budget, call Granite and record the usage
+
+    Returns (response, accounting). Like generate_granite_response, failures
+    come back as strings starting with "Error". The task doubles as the fair
+    queue feature; on_wait receives the queue position while waiting.
+    """
+    prompt, accounting = build_prompt(task, budget, max_new_tokens, **fields)
+    response = generate_granite_response(
+        granite_model, prompt, max_tokens=accounting["max_new_tokens"], user=user, feature=task, on_wait=on_wait
+    )
+    if response and response.startswith(prompt):
+        response = response[len(prompt):]
+    failed = not response or response.startswith("Error")
+    return response, record_usage(accounting, "" if failed else response)
+
+async def acomplete(granite_model, task, budget=GRANITE_CONTEXT_TOKENS, max_new_tokens=None, user=None, **fields):
+    """Coroutine form of complete, for work run on the shared loop with run_async
+
+    Cancelling it withdraws the request from the fair queue or aborts the
+    HTTP call, so abandoned work stops holding a Granite slot.
+    """
+    prompt, accounting = build_prompt(task, budget, max_new_tokens, **fields)
+    response = await agenerate_granite_response(
+        granite_model, prompt, max_tokens=accounting["max_new_tokens"], user=user, feature=task
+    )
+    if response and response.startswith(prompt):
+        response = response[len(prompt):]
+    failed = not response or response.startswith("Error")
+    return response, record_usage(accounting, "" if failed else response)
+
+# ---------------------------------------------------------------------------
+# Templates
+# ---------------------------------------------------------------------------
+
+register_template("qa", """
+You are an expert tutor. Answer the following question in a clear, concise, and accurate manner.
+{context_section}
+Question: {question}
+Topic: {topic}
+
+Instructions:
+- Provide a direct answer first.
+- If the question is ambiguous, state your assumptions.
+- Where the excerpts above are relevant, base your answer on them and cite them as [1], [2], ...
+- Use examples, code, or references if helpful.
+- Keep the explanation relevant to the question and avoid generic information.
+
+Answer:
+""", max_new_tokens=1000, min_new_tokens=200, compress={"context_section": (0, "head"), "question": (1, "middle")}, limits={"question": 1024})
+
+register_template("grading", """
+You are grading a student's answer to an assessment question.
+
+Question: {question}
+Reference answer: {reference}
+Student answer: {answer}
+
+Give short, constructive feedback: what is correct, what is missing and one suggestion to improve.
+
+Feedback:
+""", max_new_tokens=300, min_new_tokens=100, compress={"answer": (0, "middle"), "reference": (1, "head")}, limits={"answer": 1024})
+
+register_template("practice", """
+Write {count} {difficulty}-level multiple-choice practice questions about {topic}.
+Return only a JSON array. Each element must have the keys "question" (string),
+"options" (list of 4 strings without letter prefixes), "correct_answer" (index
+of the correct option, 0-3) and "explanation" (string).
+
+JSON:
+""", max_new_tokens=1024, min_new_tokens=256)
+
+register_template("summary", """
+Summarize the following learning material in at most {max_length} characters.
+Keep the key concepts, definitions and examples a student needs to revise.
+
+Material:
+{text}
+
+Summary:
+""", max_new_tokens=1024, min_new_tokens=64, compress={"text": (0, "head")})
+
+register_template("recommendation", """
+You are an academic advisor. Recommend the next courses for a student.
+
+Student interests: {interests}
+Learning style: {learning_style}
+Recent performance: {performance}
+Enrolled courses: {enrolled}
+
+Candidate courses (id: title):
+{candidates}
+
+Pick up to {count} candidates, best first, and give one sentence for each explaining why it fits.
+Return only a JSON array. Each element must have the keys "course_id" (one of the ids above)
+and "reason" (string).
+
+JSON:
+""", max_new_tokens=400, min_new_tokens=100, compress={"candidates": (0, "head"), "enrolled": (1, "head")})
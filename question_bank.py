@@ -0,0 +1,332 @@
+"""
+Practice question bank for the SmartLearn Platform
+
+Practice questions are stored once as typed records in the question_bank
+collection, keyed by a hash of their normalized text (so duplicates collapse)
+and indexed by (topic, difficulty). Each (topic, difficulty) bucket is loaded
+into memory on first use, so a request is served by sampling the bucket
+instead of generating questions on demand. Buckets below their target size
+are topped up with Granite on a background thread. Saved practice sets store
+question ids rather than copies of the text.
+"""
+
+import random
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import pymongo
+import streamlit as st
+from ai_engine import generate_practice_questions
+from grading import normalize_answer
+
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+BANK_TARGET_PER_BUCKET = 30
+GENERATION_BATCH_SIZE = 5
+GENERATION_MAX_ATTEMPTS = 4
+
+# Synonyms that share one bucket
+TOPIC_ALIASES = {
+    "programming": "python", "coding": "python",
+    "machine learning": "data science", "ai": "data science",
+    "math": "mathematics", "algebra": "mathematics", "calculus": "mathematics"
+}
+
+SEED_QUESTIONS = {
+    "python": [
+        {
+            "question": "What is the output of the following Python code?\n\nx = [1, 2, 3]\ny = x\ny.append(4)\nprint(x)",
+            "options": ["[1, 2, 3]", "[1, 2, 3, 4]", "[4, 1, 2, 3]", "Error"],
+            "correct_answer": 1,
+            "explanation": "In Python, assignment operations create references to the same object, not copies. When we modify y by appending 4, we're also modifying x since they reference the same list object."
+        },
+        {
+            "question": "Which of the following is NOT a valid way to create a dictionary in Python?",
+            "options": ["dict(a=1, b=2)", "{'a': 1, 'b': 2}", "dict([('a', 1), ('b', 2)])", "{a=1, b=2}"],
+            "correct_answer": 3,
+            "explanation": "Option D is invalid syntax for dictionary creation in Python. The correct syntax would be {'a': 1, 'b': 2} or dict(a=1, b=2) or dict([('a', 1), ('b', 2)])."
+        },
+        {
+            "question": "What is the primary purpose of the __init__ method in Python classes?",
+            "options": [
+                "To initialize class variables",
+                "To initialize instance variables when an object is created",
+                "To define class methods",
+                "To end the execution of a program"
+            ],
+            "correct_answer": 1,
+            "explanation": "The __init__ method in Python is used to initialize instance variables when an object is created. It's called automatically when you create a new instance of a class."
+        }
+    ],
+    "data science": [
+        {
+            "question": "Which of the following is NOT a supervised learning algorithm?",
+            "options": ["Linear Regression", "K-means Clustering", "Support Vector Machines", "Logistic Regression"],
+            "correct_answer": 1,
+            "explanation": "K-means Clustering is an unsupervised learning algorithm used for finding clusters in data. Linear Regression, Support Vector Machines, and Logistic Regression are all supervised learning algorithms."
+        },
+        {
+            "question": "What is the purpose of regularization in machine learning?",
+            "options": [
+                "To increase model complexity",
+                "To decrease training time",
+                "To prevent overfitting",
+                "To improve model interpretability"
+            ],
+            "correct_answer": 2,
+            "explanation": "Regularization is used to prevent overfitting by adding a penalty term to the loss function, which discourages the model from learning overly complex patterns that may not generalize well to new data."
+        },
+        {
+            "question": "Which of the following metrics is most appropriate for evaluating a classification model on an imbalanced dataset?",
+            "options": ["Accuracy", "F1 Score", "Mean Squared Error", "R-squared"],
+            "correct_answer": 1,
+            "explanation": "The F1 Score is a good metric for imbalanced datasets as it combines precision and recall. Accuracy can be misleading on imbalanced datasets, while MSE and R-squared are typically used for regression problems."
+        }
+    ],
+    "mathematics": [
+        {
+            "question": "What is the derivative of f(x) = x³ + 2x² - 5x + 3?",
+            "options": ["3x² + 4x - 5", "3x² + 4x + 5", "x² + 4x - 5", "3x² - 4x - 5"],
+            "correct_answer": 0,
+            "explanation": "The derivative of x³ is 3x², the derivative of 2x² is 4x, the derivative of -5x is -5, and the derivative of the constant 3 is 0. Adding these together gives 3x² + 4x - 5."
+        },
+        {
+            "question": "Solve the equation: 2x² - 5x - 3 = 0",
+            "options": ["x = 3 or x = -0.5", "x = 3 or x = 0.5", "x = -3 or x = 0.5", "x = -3 or x = -0.5"],
+            "correct_answer": 0,
+            "explanation": "Using the quadratic formula x = (-b ± √(b²-4ac))/(2a) with a=2, b=-5, c=-3, we get x = (5 ± √(25+24))/4 = (5 ± √49)/4 = (5 ± 7)/4, which gives x = 3 or x = -0.5."
+        },
+        {
+            "question": "What is the value of ∫(2x + 3) dx?",
+            "options": ["x² + 3x", "x² + 3x + C", "2x + 3 + C", "2(x² + 3x)"],
+            "correct_answer": 1,
+            "explanation": "The integral of 2x is x², the integral of 3 is 3x, and we need to add a constant of integration C. So ∫(2x + 3) dx = x² + 3x + C."
+        }
+    ]
+}
+
+# Topic-agnostic questions used only while a new topic's bucket is still empty
+GENERIC_TEMPLATES = [
+    {
+        "question": "What is a key principle of {topic}?",
+        "options": [
+            "{topic} is primarily focused on theoretical concepts without practical applications",
+            "{topic} integrates multiple disciplines to solve complex problems",
+            "{topic} was developed primarily in the 21st century",
+            "{topic} is mainly used in academic research but rarely in industry"
+        ],
+        "correct_answer": 1,
+        "explanation": "{topic} is known for its interdisciplinary approach, integrating knowledge from various fields to address complex problems effectively."
+    },
+    {
+        "question": "Which statement best describes the relationship between {topic} and critical thinking?",
+        "options": [
+            "{topic} replaces the need for critical thinking with algorithmic procedures",
+            "{topic} and critical thinking are unrelated disciplines",
+            "{topic} enhances critical thinking by providing analytical frameworks",
+            "Critical thinking is only relevant to theoretical aspects of {topic}"
+        ],
+        "correct_answer": 2,
+        "explanation": "{topic} provides structured frameworks that enhance critical thinking by encouraging systematic analysis, evaluation of evidence, and logical reasoning."
+    },
+    {
+        "question": "Which of the following best represents an application of {topic}?",
+        "options": [
+            "Developing theoretical models without practical implementation",
+            "Applying established principles to solve novel problems",
+            "Memorizing facts and procedures",
+            "Working exclusively with qualitative data"
+        ],
+        "correct_answer": 1,
+        "explanation": "A key application of {topic} involves applying established principles and methodologies to address new and emerging problems, demonstrating its practical value."
+    }
+]
+
+def normalize_topic(topic):
+    """Bucket name of a topic (lower-cased, with synonyms merged)"""
+    topic = " ".join((topic or "").lower().split())
+    return TOPIC_ALIASES.get(topic, topic)
+
+def question_id(text):
+    """Deduplication key of a question: hash of its normalized text"""
+    return hashlib.sha1(normalize_answer(text).encode("utf-8")).hexdigest()
+
+def make_record(question, topic, difficulty, source):
+    """Typed question_bank document for a generated or seeded question"""
+    return {
+        "_id": question_id(question["question"]),
+        "topic": normalize_topic(topic),
+        "difficulty": difficulty,
+        "type": "multiple_choice",
+        "question": question["question"],
+        "options": list(question["options"]),
+        "correct_answer": int(question["correct_answer"]),
+        "explanation": question.get("explanation", ""),
+        "source": source,
+        "created_at": datetime.now()
+    }
+
+class QuestionBank:
+    """In-memory (topic, difficulty) buckets over the question_bank collection"""
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db["question_bank"]
+        self._buckets = {}
+        self._known = set()
+        self._lock = threading.Lock()
+        self._filling = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-bank")
+
+    def bucket(self, topic, difficulty):
+        """Questions of one bucket, loaded from the database on first use"""
+        key = (normalize_topic(topic), difficulty)
+        with self._lock:
+            if key in self._buckets:
+                return self._buckets[key]
+        questions = list(self.collection.find({"topic": key[0], "difficulty": difficulty}))
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = questions
+                self._known.update(q["_id"] for q in questions)
+            return self._buckets[key]
+
+    def add(self, records):
+        """Insert records, skipping questions already in the bank; returns the number added"""
+        if not records:
+            return 0
+        result = self.collection.bulk_write(
+            [pymongo.UpdateOne({"_id": r["_id"]}, {"$setOnInsert": r}, upsert=True) for r in records],
+            ordered=False
+        )
+        # Re-read the stored versions, since a duplicate keeps its original bucket
+        for stored in self.collection.find({"_id": {"$in": [r["_id"] for r in records]}}):
+            bucket = self.bucket(stored["topic"], stored["difficulty"])
+            with self._lock:
+                if stored["_id"] not in self._known:
+                    bucket.append(stored)
+                    self._known.add(stored["_id"])
+        return result.upserted_count
+
+    def seed(self):
+        """Load the built-in questions into the bank (no-op for questions already stored)"""
+        records = [
+            make_record(q, topic, "intermediate", "seed")
+            for topic, questions in SEED_QUESTIONS.items() for q in questions
+        ]
+        return self.add(records)
+
+    def sample(self, topic, difficulty, count, rng=random):
+        """Up to count random questions, widening to neighbouring difficulties if the bucket is short"""
+        level = DIFFICULTIES.index(difficulty) if difficulty in DIFFICULTIES else 1
+        by_distance = sorted(DIFFICULTIES, key=lambda d: abs(DIFFICULTIES.index(d) - level))
+        chosen = []
+        for d in by_distance:
+            bucket = self.bucket(topic, d)
+            with self._lock:
+                picked = rng.sample(bucket, min(count - len(chosen), len(bucket)))
+            chosen.extend(picked)
+            if len(chosen) >= count:
+                break
+        return chosen
+
+    def fill(self, ai_models, topic, difficulty, target=BANK_TARGET_PER_BUCKET):
+        """Top a bucket up to target with Granite-generated questions; returns the number added"""
+        added = 0
+        for _ in range(GENERATION_MAX_ATTEMPTS):
+            missing = target - len(self.bucket(topic, difficulty))
+            if missing <= 0:
+                break
+            generated = generate_practice_questions(
+                ai_models, topic, difficulty, min(GENERATION_BATCH_SIZE, missing), user="background", feature="background"
+            )
+            if not generated:
+                break
+            added += self.add([make_record(q, topic, difficulty, "granite") for q in generated])
+        return added
+
+    def request_fill(self, ai_models, topic, difficulty):
+        """Schedule a background top-up of a bucket unless one is already running"""
+        key = (normalize_topic(topic), difficulty)
+        if not (ai_models and ai_models.get("granite_model")):
+            return
+        with self._lock:
+            if key in self._filling:
+                return
+            self._filling.add(key)
+
+        def run():
+            try:
+                self.fill(ai_models, *key)
+            finally:
+                with self._lock:
+                    self._filling.discard(key)
+        self._executor.submit(run)
+
+@st.cache_resource(show_spinner=False)
+def get_question_bank(_db):
+    """Shared question bank, seeded with the built-in questions"""
+    bank = QuestionBank(_db)
+    bank.seed()
+    return bank
+
+def generic_questions(topic, count):
+    """Topic-agnostic filler questions, used only when the bank has nothing for a topic yet"""
+    questions = []
+    for template in GENERIC_TEMPLATES[:count]:
+        question = {
+            "question": template["question"].format(topic=topic),
+            "options": [o.format(topic=topic) for o in template["options"]],
+            "correct_answer": template["correct_answer"],
+            "explanation": template["explanation"].format(topic=topic)
+        }
+        questions.append(dict(question, _id=question_id(question["question"]), source="template"))
+    return questions
+
+def sample_practice_questions(db, ai_models, topic, difficulty="intermediate", count=3):
+    """Practice questions for a request, served from the bank
+
+    Schedules a background top-up when the bucket is below its target size, and
+    falls back to generic questions only if the topic has no questions at all.
+    """
+    bank = get_question_bank(db)
+    if len(bank.bucket(topic, difficulty)) < BANK_TARGET_PER_BUCKET:
+        bank.request_fill(ai_models, topic, difficulty)
+    questions = bank.sample(topic, difficulty, count)
+    return questions or generic_questions(topic, count)
+
+def get_questions(db, ids):
+    """Bank questions by id, in the given order (missing ids are skipped)"""
+    found = {q["_id"]: q for q in db["question_bank"].find({"_id": {"$in": list(ids)}})}
+    return [found[i] for i in ids if i in found]
+
+def format_practice_questions(topic, difficulty, questions):
+    """Markdown rendering of a practice set"""
+    parts = [f"# Practice Questions on {topic} ({difficulty} level)\n"]
+    for i, q in enumerate(questions):
+        letters = [chr(ord("A") + n) for n in range(len(q["options"]))]
+        options = "\n".join(f"{letter}) {option}" for letter, option in zip(letters, q["options"]))
+        parts.append(
+            f"## Question {i + 1}\n{q['question']}\n\n**Options:**\n{options}\n\n"
+            f"**Correct Answer:** {letters[q['correct_answer']]}\n\n"
+            f"**Explanation:** {q['explanation']}\n"
+        )
+    return "\n".join(parts)
+
+if __name__ == "__main__":
+    import argparse
+    from ai_engine import load_ai_models
+    from database import initialize_db
+
+    parser = argparse.ArgumentParser(description="Pre-generate practice questions into the question bank")
+    parser.add_argument("topics", nargs="+", help="topics to fill, e.g. python \"data science\"")
+    parser.add_argument("--target", type=int, default=BANK_TARGET_PER_BUCKET, help="questions per topic and difficulty")
+    args = parser.parse_args()
+
+    _, db = initialize_db()
+    bank = QuestionBank(db)
+    bank.seed()
+    ai_models = load_ai_models()
+    for topic in args.topics:
+        for difficulty in DIFFICULTIES:
+            print(f"{normalize_topic(topic)} / {difficulty}: added {bank.fill(ai_models, topic, difficulty, args.target)}")
@@ -0,0 +1,326 @@
+"""
+Rate limiting and fair scheduling for AI features
+
+Each AI feature (qa, practice, summary, ...) has a token bucket per user and
+one shared by all users, so a single user cannot spam a feature and one
+classroom cannot exhaust the inference quota for everyone. Buckets live in
+process by default; set RATE_LIMIT_BACKEND=mongo to share them between app
+instances through the rate_limits collection.
+
+Calls that pass the limits wait in a weighted fair queue in front of the
+Granite API: each user is a flow, interactive features weigh more than
+background work, and free slots go to the request with the smallest virtual
+finish time, so heavy users are served in proportion to their weight rather
+than by arrival order.
+
+Limits are configured with RATE_LIMITS_PER_USER and RATE_LIMITS_GLOBAL, as
+comma-separated feature=requests/seconds entries, e.g. "qa=5/60,practice=3/60".
+"""
+
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager
+import streamlit as st
+
+DEFAULT_PER_USER_LIMITS = "qa=5/60,practice=5/60,summary=10/60"
+DEFAULT_GLOBAL_LIMITS = "qa=120/60,practice=60/60,summary=120/60"
+FEATURE_WEIGHTS = {"qa": 2.0, "practice": 1.0, "summary": 1.0, "background": 0.5}
+STORE_MAX_RETRIES = 5
+
+def parse_limits(spec):
+    """{feature: (capacity, refill per second)} from "feature=requests/seconds" entries"""
+    limits = {}
+    for entry in (spec or "").split(","):
+        if "=" not in entry:
+            continue
+        feature, rate = entry.split("=", 1)
+        count, _, seconds = rate.partition("/")
+        capacity = float(count)
+        limits[feature.strip()] = (capacity, capacity / float(seconds or 1))
+    return limits
+
+PER_USER_LIMITS = parse_limits(os.getenv("RATE_LIMITS_PER_USER", DEFAULT_PER_USER_LIMITS))
+GLOBAL_LIMITS = parse_limits(os.getenv("RATE_LIMITS_GLOBAL", DEFAULT_GLOBAL_LIMITS))
+
+class MemoryBucketStore:
+    """Token buckets in process memory"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now=None):
+        """Take one token; returns (allowed, seconds until a token is available)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return False, (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return True, 0.0
+
+    def give(self, key, capacity):
+        """Return a token taken by a request that was rejected by another bucket"""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + 1), updated)
+
+class MongoBucketStore:
+    """Token buckets shared through a collection, updated with compare-and-set"""
+
+    def __init__(self, db):
+        self.collection = db["rate_limits"]
+
+    def take(self, key, capacity, rate, now=None):
+        now = time.time() if now is None else now
+        for _ in range(STORE_MAX_RETRIES):
+            doc = self.collection.find_one({"_id": key})
+            if doc is None:
+                result = self.collection.update_one(
+                    {"_id": key}, {"$setOnInsert": {"tokens": capacity - 1, "updated": now}}, upsert=True
+                )
+                if result.upserted_id is not None:
+                    return True, 0.0
+                continue
+            tokens = min(capacity, doc["tokens"] + (now - doc["updated"]) * rate)
+            if tokens < 1:
+                return False, (1 - tokens) / rate
+            result = self.collection.update_one(
+                {"_id": key, "tokens": doc["tokens"], "updated": doc["updated"]},
+                {"$set": {"tokens": tokens - 1, "updated": now}}
+            )
+            if result.modified_count:
+                return True, 0.0
+        # Heavy contention on one key: treat as limited rather than spin
+        return False, 1.0 / rate
+
+    def give(self, key, capacity):
+        self.collection.update_one({"_id": key, "tokens": {"$lte": capacity - 1}}, {"$inc": {"tokens": 1}})
+
+class RateLimiter:
+    """Per-user and global token buckets per feature, with allow/deny counters"""
+
+    def __init__(self, store, per_user=PER_USER_LIMITS, global_limits=GLOBAL_LIMITS):
+        self.store = store
+        self.per_user = per_user
+        self.global_limits = global_limits
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def allow(self, user_id, feature):
+        """Consume one request of a feature for a user; returns (allowed, retry_after_seconds)"""
+        buckets = []
+        if feature in self.per_user:
+            buckets.append((f"{feature}:user:{user_id}", *self.per_user[feature]))
+        if feature in self.global_limits:
+            buckets.append((f"{feature}:global", *self.global_limits[feature]))
+
+        taken = []
+        allowed, retry_after = True, 0.0
+        for key, capacity, rate in buckets:
+            ok, wait = self.store.take(key, capacity, rate)
+            if not ok:
+                allowed, retry_after = False, wait
+                break
+            taken.append((key, capacity))
+        if not allowed:
+            for key, capacity in taken:
+                self.store.give(key, capacity)
+
+        with self._lock:
+            counts = self.counters.setdefault(feature, {"allowed": 0, "denied": 0})
+            counts["allowed" if allowed else "denied"] += 1
+        return allowed, retry_after
+
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter(_db):
+    """Shared rate limiter, backed by the store selected with RATE_LIMIT_BACKEND"""
+    if os.getenv("RATE_LIMIT_BACKEND", "memory") == "mongo":
+        return RateLimiter(MongoBucketStore(_db))
+    return RateLimiter(MemoryBucketStore())
+
+def check_rate_limit(db, user_id, feature):
+    """Apply a feature's limits for a page action, warning the user if it is rejected"""
+    allowed, retry_after = get_rate_limiter(db).allow(user_id, feature)
+    if not allowed:
+        st.warning(f"You're sending requests too quickly. Please try again in {max(1, round(retry_after))} seconds.")
+    return allowed
+
+# ---------------------------------------------------------------------------
+# Weighted fair queue
+# ---------------------------------------------------------------------------
+
+class WeightedFairQueue:
+    """Concurrency limit that admits waiting requests in weighted fair order (start-time fair queuing)
+
+    A request from user u with weight w gets a finish tag of
+    max(virtual time, u's last finish tag) + cost / w, and a free slot goes to
+    the smallest tag. Both threads (acquire/slot) and coroutines (aacquire) can
+    wait on the same queue.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.active = 0
+        self._heap = []
+        self._lock = threading.Lock()
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self.stats = {"granted": 0, "queued": 0, "cancelled": 0, "wait_seconds": 0.0}
+
+    def _enqueue(self, user, weight, cost, grant):
+        """Take a slot immediately if one is free, else queue a ticket that calls grant when admitted"""
+        with self._lock:
+            start = max(self._virtual_time, self._last_finish.get(user, 0.0))
+            finish = start + cost / max(weight, 1e-6)
+            self._last_finish[user] = finish
+            if self.active < self.capacity and not self._heap:
+                self.active += 1
+                self.stats["granted"] += 1
+                return None
+            ticket = {"finish": finish, "start": start, "state": "waiting", "grant": grant, "queued_at": time.monotonic()}
+            heapq.heappush(self._heap, (finish, next(self._sequence), ticket))
+            self.stats["queued"] += 1
+            return ticket
+
+    def release(self):
+        """Free a slot, handing it to the next waiting request if there is one"""
+        with self._lock:
+            while self._heap:
+                _, _, ticket = heapq.heappop(self._heap)
+                if ticket["state"] != "waiting":
+                    continue
+                ticket["state"] = "granted"
+                self._virtual_time = ticket["start"]
+                self.stats["granted"] += 1
+                self.stats["wait_seconds"] += time.monotonic() - ticket["queued_at"]
+                break
+            else:
+                self.active -= 1
+                # An idle queue restarts virtual time so old finish tags do not penalize anyone
+                if not self.active:
+                    self._last_finish.clear()
+                    self._virtual_time = 0.0
+                return
+        ticket["grant"]()
+
+    def _cancel(self, ticket):
+        """Withdraw a waiting ticket; returns False if it was already granted"""
+        with self._lock:
+            if ticket["state"] == "waiting":
+                ticket["state"] = "cancelled"
+                self.stats["cancelled"] += 1
+                return True
+            return False
+
+    def position(self, ticket):
+        """1-based position of a waiting ticket in the queue"""
+        with self._lock:
+            key = ticket["finish"]
+            return 1 + sum(1 for finish, _, t in self._heap if t["state"] == "waiting" and finish < key)
+
+    def depth(self):
+        with self._lock:
+            return sum(1 for _, _, t in self._heap if t["state"] == "waiting")
+
+    def acquire(self, user, weight=1.0, cost=1.0, on_wait=None, poll_interval=0.5):
+        """Block until admitted; on_wait(position) is called while waiting, e.g. to show it in the UI"""
+        admitted = threading.Event()
+        ticket = self._enqueue(user, weight, cost, admitted.set)
+        if ticket is None:
+            return
+        try:
+            while not admitted.wait(poll_interval):
+                if on_wait:
+                    on_wait(self.position(ticket))
+        except BaseException:
+            if not self._cancel(ticket):
+                self.release()
+            raise
+
+    async def aacquire(self, user, weight=1.0, cost=1.0):
+        """Coroutine form of acquire"""
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: admitted.done() or admitted.set_result(None))
+        ticket = self._enqueue(user, weight, cost, grant)
+        if ticket is None:
+            return
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            if not self._cancel(ticket):
+                self.release()
+            raise
+
+    @contextmanager
+    def slot(self, user, weight=1.0, cost=1.0, on_wait=None):
+        self.acquire(user, weight, cost, on_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+def metrics(limiter=None, queue=None):
+    """Configured limits, allow/deny counters and queue statistics as a dict"""
+    per_user = limiter.per_user if limiter is not None else PER_USER_LIMITS
+    global_limits = limiter.global_limits if limiter is not None else GLOBAL_LIMITS
+    result = {
+        "limits": {
+            "per_user": {f: {"capacity": c, "per_second": r} for f, (c, r) in per_user.items()},
+            "global": {f: {"capacity": c, "per_second": r} for f, (c, r) in global_limits.items()}
+        }
+    }
+    if limiter is not None:
+        with limiter._lock:
+            result["requests"] = {f: dict(c) for f, c in limiter.counters.items()}
+    if queue is not None:
+        with queue._lock:
+            result["queue"] = dict(queue.stats, active=queue.active, capacity=queue.capacity)
+        result["queue"]["depth"] = queue.depth()
+    return result
+
+def prometheus_metrics(limiter=None, queue=None):
+    """metrics() in the Prometheus text exposition format"""
+    data = metrics(limiter, queue)
+    lines = [
+        "# TYPE smartlearn_rate_limit_capacity gauge",
+        "# TYPE smartlearn_rate_limit_refill_per_second gauge"
+    ]
+    for scope, limits in data["limits"].items():
+        for feature, limit in limits.items():
+            labels = f'feature="{feature}",scope="{scope}"'
+            lines.append(f"smartlearn_rate_limit_capacity{{{labels}}} {limit['capacity']}")
+            lines.append(f"smartlearn_rate_limit_refill_per_second{{{labels}}} {limit['per_second']}")
+    if "requests" in data:
+        lines.append("# TYPE smartlearn_rate_limit_requests_total counter")
+        for feature, counts in data["requests"].items():
+            for outcome, value in counts.items():
+                lines.append(f'smartlearn_rate_limit_requests_total{{feature="{feature}",outcome="{outcome}"}} {value}')
+    if "queue" in data:
+        queue_stats = data["queue"]
+        lines += [
+            "# TYPE smartlearn_granite_queue_depth gauge",
+            f"smartlearn_granite_queue_depth {queue_stats['depth']}",
+            "# TYPE smartlearn_granite_active_requests gauge",
+            f"smartlearn_granite_active_requests {queue_stats['active']}",
+            "# TYPE smartlearn_granite_queued_total counter",
+            f"smartlearn_granite_queued_total {queue_stats['queued']}",
+            "# TYPE smartlearn_granite_queue_wait_seconds_total counter",
+            f"smartlearn_granite_queue_wait_seconds_total {queue_stats['wait_seconds']:.6f}"
+        ]
+    return "\n".join(lines) + "\n"
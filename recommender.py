@@ -0,0 +1,392 @@
+"""
+Course recommendation engine for the SmartLearn Platform
+
+The course catalog is turned into an L2-normalized TF-IDF matrix once (and
+rebuilt every CATALOG_TTL seconds to pick up new courses). A student's
+profile is a vector in the same space, built from their stated interests and
+from the courses they are enrolled in, weighted by progress and quiz scores.
+Candidates are scored with one matrix-vector product, enrolled courses are
+masked out and the top results are cached per user until their enrollments
+change.
+
+Content scores are blended with "students who took X also took Y" scores from
+a course-course co-occurrence model. A batch job (python recommender.py)
+builds it from the progress collection as a sparse matrix product and stores
+the top NEIGHBOR_COUNT neighbours of each course in course_neighbors;
+enrollments and unenrollments then update the affected rows incrementally.
+Each progress document keeps the weight it was counted with (cf_weight), so
+an unenrollment takes out exactly what was added even if the student's
+progress changed since.
+A request only looks up the neighbours of the user's own courses.
+
+Usage:
+    python recommender.py --mongo-uri mongodb://localhost:27017 [--db edututor_ai]
+"""
+
+import os
+import re
+import time
+import heapq
+import argparse
+import threading
+from datetime import datetime
+from collections import OrderedDict
+import numpy as np
+import pymongo
+import scipy.sparse as sp
+import streamlit as st
+
+CATALOG_TTL = int(os.getenv("RECOMMENDER_CATALOG_TTL", "300"))
+RECOMMENDATION_CACHE_SIZE = 4096
+CACHED_TOP_K = 10
+
+INTEREST_WEIGHT = 1.0
+ENROLLED_WEIGHT = 0.5
+
+NEIGHBOR_COUNT = 20
+WEIGHT_WRITE_BATCH = 10000  # cf_weight updates per bulk write during a build
+CF_WEIGHT = float(os.getenv("RECOMMENDER_CF_WEIGHT", "0.3"))  # share of the co-occurrence score in the blend
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be by for from how in into is it its of on or that the this to with your you learn
+""".split())
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+def course_text(course):
+    """Text a course is matched on; the title and category count twice"""
+    title = course.get("title", "")
+    category = course.get("category", "")
+    topics = " ".join(course.get("topics", []))
+    return f"{title} {title} {category} {category} {topics} {course.get('description', '')}"
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class CourseIndex:
+    """TF-IDF vectors of the course catalog, one row per course"""
+
+    def __init__(self, courses):
+        self.courses = courses
+        self.ids = [c["_id"] for c in courses]
+        self.rows = {course_id: row for row, course_id in enumerate(self.ids)}
+
+        documents = [tokenize(course_text(c)) for c in courses]
+        self.vocabulary = {}
+        for tokens in documents:
+            for token in tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+
+        counts = np.zeros((len(courses), len(self.vocabulary)), dtype=np.float32)
+        for row, tokens in enumerate(documents):
+            np.add.at(counts[row], [self.vocabulary[t] for t in tokens], 1.0)
+        document_frequency = (counts > 0).sum(axis=0)
+        # Smoothed IDF and sublinear TF, as in the usual TF-IDF weighting
+        self.idf = (np.log((1 + len(courses)) / (1 + document_frequency)) + 1).astype(np.float32)
+        tf = np.zeros_like(counts)
+        np.log1p(counts, out=tf, where=counts > 0)
+        self.matrix = _normalize(tf * self.idf)
+
+    def vectorize(self, text):
+        """TF-IDF vector of free text in the catalog's vocabulary (zero if nothing matches)"""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        columns = [self.vocabulary[t] for t in tokenize(text) if t in self.vocabulary]
+        if columns:
+            np.add.at(vector, columns, 1.0)
+            np.log1p(vector, out=vector)
+            vector = _normalize(vector * self.idf)
+        return vector
+
+def enrollment_weight(progress):
+    """How strongly an enrollment says the student likes the course: engagement times quiz performance"""
+    scores = [q.get("score", 0) for q in progress.get("quiz_scores", [])]
+    performance = np.mean(scores) / 100 if scores else 0.75
+    engagement = 0.5 + progress.get("progress_percentage", 0) / 200
+    return float(engagement * performance)
+
+def counted_weight(progress):
+    """The weight an enrollment was folded into the co-occurrence model with"""
+    weight = progress.get("cf_weight")
+    return enrollment_weight(progress) if weight is None else float(weight)
+
+class CooccurrenceModel:
+    """Course-course co-occurrence weights and the top neighbours of each course
+
+    The co-occurrence of courses a and b is the sum over students of the
+    product of their enrollment weights, and the similarity is its cosine
+    normalization. Rows built from the progress collection are complete;
+    rows loaded from course_neighbors hold the stored top neighbours only, so
+    incremental updates are approximate until the next batch build.
+    """
+
+    def __init__(self):
+        self.weights = {}  # course_id -> {neighbour course_id: co-occurrence}
+        self.norms = {}  # course_id -> sum of squared enrollment weights
+        self.neighbors = {}  # course_id -> [(neighbour course_id, similarity)], best first
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, progress_docs, db=None):
+        """Compute the model from enrollment documents with one sparse matrix product
+
+        With db, each document's cf_weight is updated to the weight it was
+        counted with, where that changed.
+        """
+        model = cls()
+        users, courses, values = [], [], []
+        recounted = []
+        for p in progress_docs:
+            if p.get("user_id") is not None and p.get("course_id") is not None:
+                users.append(p["user_id"])
+                courses.append(p["course_id"])
+                values.append(enrollment_weight(p))
+                if p.get("cf_weight") != values[-1]:
+                    recounted.append(pymongo.UpdateOne({"_id": p["_id"]}, {"$set": {"cf_weight": values[-1]}}))
+        if db is not None:
+            for i in range(0, len(recounted), WEIGHT_WRITE_BATCH):
+                db["progress"].bulk_write(recounted[i:i + WEIGHT_WRITE_BATCH], ordered=False)
+        if not values:
+            return model
+
+        course_ids, course_codes = np.unique(np.asarray(courses, dtype=object).astype(str), return_inverse=True)
+        _, user_codes = np.unique(np.asarray(users, dtype=object).astype(str), return_inverse=True)
+        enrollments = sp.csr_matrix(
+            (np.asarray(values, dtype=np.float64), (user_codes, course_codes)),
+            shape=(user_codes.max() + 1, len(course_ids))
+        )
+        cooccurrence = (enrollments.T @ enrollments).tocsr()
+        norms = cooccurrence.diagonal()
+        cooccurrence.setdiag(0)
+        cooccurrence.eliminate_zeros()
+
+        course_ids = course_ids.tolist()
+        for row, course_id in enumerate(course_ids):
+            start, end = cooccurrence.indptr[row], cooccurrence.indptr[row + 1]
+            model.norms[course_id] = float(norms[row])
+            model.weights[course_id] = {
+                course_ids[col]: float(value)
+                for col, value in zip(cooccurrence.indices[start:end], cooccurrence.data[start:end])
+            }
+        for course_id in course_ids:
+            model._refresh(course_id)
+        return model
+
+    @classmethod
+    def load(cls, db):
+        """Load the stored neighbour rows"""
+        model = cls()
+        for doc in db["course_neighbors"].find():
+            model.norms[doc["_id"]] = doc.get("norm", 0.0)
+            model.weights[doc["_id"]] = {n["course_id"]: n["weight"] for n in doc.get("neighbors", [])}
+        for course_id in model.weights:
+            model._refresh(course_id)
+        return model
+
+    def _refresh(self, course_id):
+        """Recompute a course's top neighbours by cosine similarity"""
+        norm = self.norms.get(course_id, 0.0)
+        row = self.weights.get(course_id, {})
+        if norm <= 0 or not row:
+            self.neighbors[course_id] = []
+            return
+        similarities = (
+            (other, weight / float(np.sqrt(norm * self.norms[other])))
+            for other, weight in row.items() if self.norms.get(other, 0.0) > 0
+        )
+        self.neighbors[course_id] = heapq.nlargest(NEIGHBOR_COUNT, similarities, key=lambda item: item[1])
+
+    def update(self, enrollment, others, removed=False):
+        """Add (or remove) one enrollment given the student's other enrollments; returns the changed courses"""
+        course_id = enrollment["course_id"]
+        weight = counted_weight(enrollment)
+        sign = -1.0 if removed else 1.0
+        changed = {course_id}
+        with self._lock:
+            self.norms[course_id] = max(0.0, self.norms.get(course_id, 0.0) + sign * weight * weight)
+            for other in others:
+                other_id = other.get("course_id")
+                if other_id is None or other_id == course_id:
+                    continue
+                delta = sign * weight * counted_weight(other)
+                for a, b in ((course_id, other_id), (other_id, course_id)):
+                    row = self.weights.setdefault(a, {})
+                    row[b] = row.get(b, 0.0) + delta
+                    # Removing a pair subtracts exactly what was added; drop the rounding residue
+                    if row[b] <= 1e-9:
+                        del row[b]
+                changed.add(other_id)
+            for changed_id in changed:
+                self._refresh(changed_id)
+        return changed
+
+    def documents(self, course_ids=None):
+        """course_neighbors documents for some (or all) courses, holding their top neighbours' raw weights"""
+        now = datetime.now()
+        for course_id in (course_ids if course_ids is not None else list(self.weights)):
+            row = self.weights.get(course_id, {})
+            top = [other for other, _ in self.neighbors.get(course_id, [])]
+            yield {
+                "_id": course_id,
+                "norm": self.norms.get(course_id, 0.0),
+                "neighbors": [{"course_id": other, "weight": row[other]} for other in top if other in row],
+                "updated_at": now
+            }
+
+    def save(self, db, course_ids=None):
+        """Upsert the neighbour rows of some (or all) courses"""
+        requests = [
+            pymongo.ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in self.documents(course_ids)
+        ]
+        if requests:
+            db["course_neighbors"].bulk_write(requests, ordered=False)
+
+    def scores(self, enrollments):
+        """Neighbour scores of courses for a student's enrollments, O(enrollments x NEIGHBOR_COUNT)"""
+        scores = {}
+        for enrollment in enrollments:
+            weight = enrollment_weight(enrollment)
+            for other, similarity in self.neighbors.get(enrollment.get("course_id"), []):
+                scores[other] = scores.get(other, 0.0) + weight * similarity
+        return scores
+
+class Recommender:
+    """Scores courses against user profiles and caches each user's top courses"""
+
+    def __init__(self, db):
+        self.db = db
+        self._index = None
+        self._built_at = 0.0
+        self._version = 0
+        self._index_lock = threading.Lock()
+        self._cache = OrderedDict()  # user_id -> (catalog version, ranked course ids)
+        self._cache_lock = threading.Lock()
+        self._cooccurrence = None
+
+    def index(self):
+        """The catalog index, rebuilt once it is older than CATALOG_TTL"""
+        if self._index is None or time.monotonic() - self._built_at > CATALOG_TTL:
+            with self._index_lock:
+                if self._index is None or time.monotonic() - self._built_at > CATALOG_TTL:
+                    self._index = CourseIndex(list(self.db["courses"].find()))
+                    self._built_at = time.monotonic()
+                    self._version += 1
+        return self._index
+
+    def cooccurrence(self):
+        """The co-occurrence model, loaded from course_neighbors (or built if nothing is stored yet)"""
+        return self._load_cooccurrence()[0]
+
+    def _load_cooccurrence(self):
+        """The co-occurrence model and whether this call built it from the progress collection"""
+        built = False
+        if self._cooccurrence is None:
+            with self._index_lock:
+                if self._cooccurrence is None:
+                    model = CooccurrenceModel.load(self.db)
+                    if not model.weights:
+                        model = CooccurrenceModel.build(self.db["progress"].find(), db=self.db)
+                        model.save(self.db)
+                        built = True
+                    self._cooccurrence = model
+        return self._cooccurrence, built
+
+    def profile(self, index, user, progress):
+        """Unit vector of a user's interests plus their enrolled courses"""
+        interests = (user or {}).get("preferences", {}).get("interests", [])
+        profile = index.vectorize(" ".join(interests)) * INTEREST_WEIGHT
+
+        rows, weights = [], []
+        for p in progress:
+            row = index.rows.get(p.get("course_id"))
+            if row is None:
+                continue
+            rows.append(row)
+            weights.append(ENROLLED_WEIGHT * enrollment_weight(p))
+        if rows:
+            profile = profile + np.asarray(weights, dtype=np.float32) @ index.matrix[rows]
+        return _normalize(profile)
+
+    def rank(self, user_id):
+        """Ids of the best unenrolled courses for a user, best first"""
+        index = self.index()
+        if not index.ids:
+            return []
+        user = self.db["users"].find_one({"_id": user_id})
+        progress = list(self.db["progress"].find({"user_id": user_id}))
+        enrolled = {p.get("course_id") for p in progress}
+
+        scores = index.matrix @ self.profile(index, user, progress)
+        neighbor_scores = self.cooccurrence().scores(progress)
+        if neighbor_scores:
+            # Scale the neighbour scores to [0, 1] like the cosine content scores before blending
+            top = max(neighbor_scores.values())
+            collaborative = np.zeros_like(scores)
+            for course_id, score in neighbor_scores.items():
+                if course_id in index.rows:
+                    collaborative[index.rows[course_id]] = score / top
+            scores = (1 - CF_WEIGHT) * scores + CF_WEIGHT * collaborative
+        scores[[index.rows[c] for c in enrolled if c in index.rows]] = -np.inf
+        # Stable sort so courses without any match keep catalog order
+        order = np.argsort(-scores, kind="stable")[:CACHED_TOP_K]
+        return [index.ids[row] for row in order if np.isfinite(scores[row])]
+
+    def recommend(self, user_id, k=3):
+        """Top k unenrolled course documents for a user"""
+        index = self.index()
+        with self._cache_lock:
+            cached = self._cache.get(user_id)
+            if cached is not None and cached[0] == self._version:
+                self._cache.move_to_end(user_id)
+                ranked = cached[1]
+            else:
+                ranked = None
+        if ranked is None:
+            ranked = self.rank(user_id)
+            with self._cache_lock:
+                self._cache[user_id] = (self._version, ranked)
+                while len(self._cache) > RECOMMENDATION_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return [dict(index.courses[index.rows[c]]) for c in ranked[:k] if c in index.rows]
+
+    def invalidate(self, user_id):
+        """Forget a user's cached recommendations, e.g. after an enrollment change"""
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+
+    def record_enrollment(self, user_id, enrollment, removed=False):
+        """Fold an enrollment (or unenrollment) into the co-occurrence model and drop the user's cache"""
+        self.invalidate(user_id)
+        model, built = self._load_cooccurrence()
+        if built:
+            # Just built from the progress collection, which already reflects this change
+            return
+        others = [p for p in self.db["progress"].find({"user_id": user_id}) if p.get("course_id") != enrollment["course_id"]]
+        model.save(self.db, model.update(enrollment, others, removed))
+
+@st.cache_resource(show_spinner=False)
+def get_recommender(_db):
+    """Shared recommender for the app's database"""
+    return Recommender(_db)
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the course co-occurrence neighbours from the progress collection")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"), required=not os.getenv("MONGO_URI"))
+    parser.add_argument("--db", default="edututor_ai")
+    args = parser.parse_args()
+
+    db = pymongo.MongoClient(args.mongo_uri)[args.db]
+    start = time.perf_counter()
+    model = CooccurrenceModel.build(
+        db["progress"].find({}, {"user_id": 1, "course_id": 1, "progress_percentage": 1, "quiz_scores": 1, "cf_weight": 1}),
+        db=db
+    )
+    model.save(db)
+    print(f"Stored neighbours of {len(model.weights)} courses in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+Retrieval subsystem for the SmartLearn Platform
+
+Chunks user materials and course content, embeds the chunks with a local CPU
+embedding model and keeps them in a flat, memory-mapped vector index on disk.
+The Q&A page retrieves the top-k passages for a question and injects them into
+the Granite prompt so answers are grounded in what the student actually has.
+
+Index layout (all files live in INDEX_DIR):
+- vectors.f32   raw float32 matrix, one row per chunk, append-only
+- offsets.i64   byte offset of each chunk's record in chunks.jsonl, append-only
+- chunks.jsonl  one JSON record per chunk (document key and text), append-only
+- manifest.json embedder info plus, per document, its content hash and row range
+- manifest.log  one JSON line per document change since manifest.json was written
+
+Updating a document appends its new chunks and one manifest.log line that
+repoints the document at them, and the cached per-owner row masks are patched
+for that document's rows only, so the cost of an update depends on the size of
+that document only. The log is folded into manifest.json every
+MANIFEST_CHECKPOINT_ENTRIES changes and on compaction, which also drops rows
+that are no longer referenced.
+"""
+
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+import numpy as np
+import streamlit as st
+
+INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".retrieval_index"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASHING_DIM = 384
+CHUNK_SIZE = 800      # characters per chunk
+CHUNK_OVERLAP = 150   # characters shared between neighbouring chunks
+SEARCH_BLOCK_ROWS = 65536
+MANIFEST_CHECKPOINT_ENTRIES = 1000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split text into overlapping chunks, preferring sentence boundaries"""
+    text = (text or "").strip()
+    if not text:
+        return []
+    if len(text) <= chunk_size:
+        return [text]
+
+    sentences = [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        # Hard-split sentences that are longer than a whole chunk
+        while len(sentence) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:chunk_size])
+            sentence = sentence[chunk_size - overlap:]
+
+        if current and len(current) + 1 + len(sentence) > chunk_size:
+            chunks.append(current)
+            # Carry the tail of the previous chunk over for context, starting on a word boundary
+            tail = current[-overlap:].split(" ", 1)[-1] if overlap else ""
+            current = f"{tail} {sentence}" if tail else sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+class HashingEmbedder:
+    """Dependency-free CPU embedder using signed feature hashing of word unigrams and bigrams"""
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = _TOKEN_RE.findall(text.lower())
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+            signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], hashes % self.dim, signs)
+        return _normalize(vectors)
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model pinned to the CPU"""
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def encode(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=32, normalize_embeddings=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype=np.float32)
+
+def load_embedder():
+    """Load the local embedding model, falling back to feature hashing if it is unavailable"""
+    try:
+        return SentenceTransformerEmbedder()
+    except Exception:
+        return HashingEmbedder()
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class VectorIndex:
+    """Append-only flat vector index, memory-mapped from disk"""
+
+    def __init__(self, embedder, index_dir=INDEX_DIR):
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self.index_dir = index_dir
+        self._lock = threading.RLock()
+        self._vectors = None
+        self._offsets = None
+        self._masks = {}
+        os.makedirs(index_dir, exist_ok=True)
+        self._load_manifest()
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def _load_manifest(self):
+        manifest = None
+        if os.path.exists(self._path("manifest.json")):
+            with open(self._path("manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+
+        # A different embedding model makes every stored vector useless
+        if not manifest or manifest.get("embedder") != self.embedder.name or manifest.get("dim") != self.dim:
+            for name in ("vectors.f32", "offsets.i64", "chunks.jsonl", "manifest.log"):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            manifest = {"embedder": self.embedder.name, "dim": self.dim, "rows": 0, "docs": {}}
+
+        self.manifest = manifest
+        self._log_entries = self._replay_log()
+        self._save_manifest()
+
+    def _replay_log(self):
+        """Apply the changes logged since manifest.json was written; returns how many there were"""
+        if not os.path.exists(self._path("manifest.log")):
+            return 0
+        entries = 0
+        with open(self._path("manifest.log"), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break  # a torn last line from an interrupted write
+                if change["entry"] is None:
+                    self.manifest["docs"].pop(change["doc"], None)
+                else:
+                    self.manifest["docs"][change["doc"]] = change["entry"]
+                self.manifest["rows"] = change["rows"]
+                entries += 1
+        return entries
+
+    def _save_manifest(self):
+        """Write the whole manifest and start a new change log"""
+        tmp_path = self._path("manifest.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, self._path("manifest.json"))
+        if os.path.exists(self._path("manifest.log")):
+            os.remove(self._path("manifest.log"))
+        self._log_entries = 0
+        self._vectors = None
+        self._offsets = None
+        self._masks = {}
+
+    def _log_change(self, doc_key, entry):
+        """Record one document change in the manifest and its log, and patch the cached masks"""
+        old = self.manifest["docs"].get(doc_key)
+        if entry is None:
+            self.manifest["docs"].pop(doc_key, None)
+        else:
+            self.manifest["docs"][doc_key] = entry
+        with open(self._path("manifest.log"), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"doc": doc_key, "entry": entry, "rows": self.rows}) + "\n")
+        self._log_entries += 1
+        # New rows need a fresh memory map; the cached masks only change over this document's rows
+        self._vectors = None
+        self._offsets = None
+        for owner, mask in list(self._masks.items()):
+            if len(mask) < self.rows:
+                mask = np.concatenate([mask, np.zeros(max(self.rows, 2 * len(mask)) - len(mask), dtype=bool)])
+                self._masks[owner] = mask
+            if old:
+                mask[old["start"]:old["end"]] = False
+            if entry and entry["owner"] in ("", owner):
+                mask[entry["start"]:entry["end"]] = True
+        if self._log_entries >= MANIFEST_CHECKPOINT_ENTRIES:
+            self._save_manifest()
+
+    @property
+    def rows(self):
+        return self.manifest["rows"]
+
+    def _mapped(self):
+        if self._vectors is None and self.rows:
+            self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r", shape=(self.rows, self.dim))
+            self._offsets = np.memmap(self._path("offsets.i64"), dtype=np.int64, mode="r", shape=(self.rows,))
+        return self._vectors, self._offsets
+
+    def content_hash(self, doc_key):
+        doc = self.manifest["docs"].get(doc_key)
+        return doc["hash"] if doc else None
+
+    def upsert(self, doc_key, text, owner=""):
+        """Index a document's text, re-embedding only if its content changed"""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if self.content_hash(doc_key) == digest:
+            return False
+
+        chunks = chunk_text(text)
+        vectors = self.embedder.encode(chunks) if chunks else np.zeros((0, self.dim), dtype=np.float32)
+
+        with self._lock:
+            start = self.rows
+            with open(self._path("chunks.jsonl"), "ab") as f:
+                offsets = []
+                for chunk in chunks:
+                    offsets.append(f.tell())
+                    f.write(json.dumps({"doc": doc_key, "text": chunk}).encode("utf-8") + b"\n")
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            with open(self._path("offsets.i64"), "ab") as f:
+                f.write(np.asarray(offsets, dtype=np.int64).tobytes())
+
+            self.manifest["rows"] = start + len(chunks)
+            self._log_change(doc_key, {"hash": digest, "owner": owner, "start": start, "end": start + len(chunks)})
+            self._maybe_compact()
+        return True
+
+    def remove(self, doc_key):
+        """Drop a document from the index; its rows are reclaimed on the next compaction"""
+        with self._lock:
+            if doc_key in self.manifest["docs"]:
+                self._log_change(doc_key, None)
+                self._maybe_compact()
+
+    def _live_rows(self):
+        return sum(d["end"] - d["start"] for d in self.manifest["docs"].values())
+
+    def _maybe_compact(self):
+        dead_rows = self.rows - self._live_rows()
+        if dead_rows > 1000 and dead_rows > self._live_rows():
+            self.compact()
+
+    def compact(self):
+        """Rewrite the index files keeping only rows that are still referenced"""
+        with self._lock:
+            vectors, offsets = self._mapped()
+            docs = self.manifest["docs"]
+            new_docs = {}
+            row = 0
+            with open(self._path("chunks.jsonl"), "rb") as src, \
+                    open(self._path("chunks.jsonl.tmp"), "wb") as chunks_out, \
+                    open(self._path("vectors.f32.tmp"), "wb") as vectors_out, \
+                    open(self._path("offsets.i64.tmp"), "wb") as offsets_out:
+                for doc_key, doc in docs.items():
+                    count = doc["end"] - doc["start"]
+                    new_offsets = []
+                    for i in range(doc["start"], doc["end"]):
+                        src.seek(int(offsets[i]))
+                        new_offsets.append(chunks_out.tell())
+                        chunks_out.write(src.readline())
+                    if count:
+                        vectors_out.write(np.ascontiguousarray(vectors[doc["start"]:doc["end"]]).tobytes())
+                    offsets_out.write(np.asarray(new_offsets, dtype=np.int64).tobytes())
+                    new_docs[doc_key] = dict(doc, start=row, end=row + count)
+                    row += count
+
+            self._vectors = None
+            self._offsets = None
+            for name in ("chunks.jsonl", "vectors.f32", "offsets.i64"):
+                os.replace(self._path(name + ".tmp"), self._path(name))
+            self.manifest["docs"] = new_docs
+            self.manifest["rows"] = row
+            self._save_manifest()
+
+    def _allowed_mask(self, owner):
+        """Boolean mask of live rows that are shared (course content) or belong to the owner"""
+        mask = self._masks.get(owner)
+        if mask is None:
+            mask = np.zeros(self.rows, dtype=bool)
+            for doc in self.manifest["docs"].values():
+                if doc["owner"] in ("", owner):
+                    mask[doc["start"]:doc["end"]] = True
+            self._masks[owner] = mask
+        # Masks are grown ahead of the row count by _log_change
+        return mask[:self.rows]
+
+    def _chunk_record(self, offset):
+        with open(self._path("chunks.jsonl"), "rb") as f:
+            f.seek(int(offset))
+            return json.loads(f.readline())
+
+    def search(self, query, owner="", k=4, min_score=0.2):
+        """Return the top-k chunks most similar to the query"""
+        with self._lock:
+            vectors, offsets = self._mapped()
+            if vectors is None:
+                return []
+            mask = self._allowed_mask(owner)
+            if not mask.any():
+                return []
+
+            query_vector = self.embedder.encode([query])[0]
+            scores = np.empty(self.rows, dtype=np.float32)
+            # Score in blocks so large indexes are streamed from the memory map
+            for start in range(0, self.rows, SEARCH_BLOCK_ROWS):
+                end = min(start + SEARCH_BLOCK_ROWS, self.rows)
+                scores[start:end] = vectors[start:end] @ query_vector
+            scores[~mask] = -np.inf
+
+            k = min(k, int(mask.sum()))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            for row in top:
+                if scores[row] < min_score:
+                    break
+                record = self._chunk_record(offsets[row])
+                results.append({"doc": record["doc"], "text": record["text"], "score": float(scores[row])})
+            return results
+
+@st.cache_resource
+def get_index():
+    """Shared vector index for all sessions in this process"""
+    return VectorIndex(load_embedder())
+
+def material_text(material):
+    """Text used to index a user material"""
+    parts = [material.get("title", ""), material.get("content") or ""]
+    parts.extend(material.get("highlights", []) or [])
+    return "\n\n".join(p for p in parts if p)
+
+def course_text(course):
+    """Text used to index a course"""
+    parts = [course.get("title", ""), course.get("description", "")]
+    if course.get("topics"):
+        parts.append("Topics: " + ", ".join(course["topics"]))
+    for material in course.get("materials", []):
+        parts.append(material.get("title", ""))
+        if material.get("content"):
+            parts.append(material["content"])
+    return "\n\n".join(p for p in parts if p)
+
+def index_user_material(material):
+    """Add or refresh a user material in the retrieval index"""
+    text = material_text(material)
+    return get_index().upsert(f"material:{material['_id']}", text, owner=str(material.get("user_id", "")))
+
+def index_course(course):
+    """Add or refresh a course in the retrieval index"""
+    return get_index().upsert(f"course:{course['_id']}", course_text(course))
+
+def remove_user_material(material_id):
+    """Remove a deleted user material from the retrieval index"""
+    get_index().remove(f"material:{material_id}")
+
+def sync_index(db, user_id):
+    """Make sure the courses and the user's materials are indexed; unchanged documents are skipped"""
+    for course in db["courses"].find({}):
+        index_course(course)
+    for material in db["user_materials"].find({"user_id": user_id}):
+        index_user_material(material)
+
+def retrieve_context(db, query, user_id, k=4):
+    """Retrieve the passages most relevant to a query from course content and the user's materials"""
+    try:
+        # Catch documents written before the index existed, once per session
+        if not st.session_state.get("retrieval_synced"):
+            sync_index(db, user_id)
+            st.session_state["retrieval_synced"] = True
+        return get_index().search(query, owner=str(user_id), k=k)
+    except Exception as e:
+        st.warning(f"Could not search your study materials: {e}")
+        return []
+
+def format_context(passages, max_chars=3000):
+    """Format retrieved passages for inclusion in a prompt"""
+    blocks = []
+    used = 0
+    for i, passage in enumerate(passages, start=1):
+        block = f"[{i}] {passage['text']}"
+        if used + len(block) > max_chars:
+            break
+        blocks.append(block)
+        used += len(block)
+    return "\n\n".join(blocks)
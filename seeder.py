@@ -0,0 +1,668 @@
+"""
+Demo data and synthetic data generation for the SmartLearn Platform
+
+seed_demo_data() inserts the small hand-written demo dataset the app starts
+with. seed() generates a production-shaped dataset on top of it: users whose
+activity follows a power law (a few very active students, a long tail of
+occasional ones), topics and courses whose popularity follows a Zipf law, and
+the progress, tasks, assessment results, posts and questions those users
+produce. (user, course) enrollments and (user, assessment) results are unique,
+as the app writes them.
+
+Columns are drawn up front with numpy from one seeded generator, so a given
+seed always produces the same data. Documents are then built and loaded in
+batches with unordered insert_many on a thread pool; the in-memory fallback
+database is loaded on one thread.
+
+Usage:
+    python seeder.py --mongo-uri mongodb://localhost:27017 --db edututor_ai_bench --total 1000000 --drop
+"""
+
+import os
+import time
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pymongo
+
+DEMO_USER_ID = "demo_student_id"
+
+# Share of the synthetic documents per collection; courses and assessments are sized separately
+COLLECTION_SHARES = {
+    "users": 0.05,
+    "progress": 0.1,
+    "user_tasks": 0.35,
+    "assessment_results": 0.2,
+    "community_posts": 0.1,
+    "qa_questions": 0.15
+}
+LOAD_ORDER = ["users", "courses", "assessments"] + [c for c in COLLECTION_SHARES if c != "users"]
+
+# Topics per course category, in a fixed order; the seed shuffles their popularity ranks
+CATALOG = {
+    "Computer Science": ["Python", "Algorithms", "Data Structures", "Web Development", "Databases", "Operating Systems", "Networking", "JavaScript"],
+    "Data Science": ["Statistics", "Machine Learning", "Data Visualization", "Pandas", "Deep Learning", "SQL"],
+    "Mathematics": ["Calculus", "Linear Algebra", "Probability", "Discrete Mathematics"],
+    "Science": ["Physics", "Chemistry", "Biology"],
+    "Language Learning": ["English Grammar", "Spanish", "French"]
+}
+COMMUNITY_TOPICS = ["General", "Computer Science", "Data Science", "Mathematics", "Science", "Language Learning", "Study Tips"]
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+LEARNING_STYLES = ["visual", "auditory", "reading", "kinesthetic"]
+TASK_TYPES = ["Study", "Assignment", "Reading", "Practice", "Project", "Exam Preparation", "Other"]
+PRIORITIES = ["Low", "Medium", "High"]
+TIME_ESTIMATES = [15, 30, 45, 60, 90, 120]
+
+def demo_documents():
+    """The hand-written demo dataset, keyed by collection"""
+    now = datetime.now()
+    return {
+        "users": [
+            {
+                "_id": DEMO_USER_ID,
+                "username": "Demo Student",
+                "email": "demo@example.com",
+                "role": "student",
+                "created_at": now,
+                "preferences": {
+                    "learning_style": "visual",
+                    "difficulty_level": "intermediate",
+                    "interests": ["programming", "data science", "mathematics"]
+                }
+            }
+        ],
+        "courses": [
+            {
+                "_id": "course_python_basics",
+                "title": "Python Programming Basics",
+                "description": "An introduction to Python programming language fundamentals with practical examples and exercises.",
+                "category": "Computer Science",
+                "difficulty": "beginner",
+                "topics": ["variables", "data types", "control flow", "functions"],
+                "materials": [
+                    {
+                        "id": "python_w3schools",
+                        "title": "Python Tutorial - W3Schools",
+                        "type": "url",
+                        "url": "https://www.w3schools.com/python/"
+                    },
+                    {
+                        "id": "python_docs",
+                        "title": "Python Official Documentation",
+                        "type": "url",
+                        "url": "https://docs.python.org/3/tutorial/"
+                    }
+                ],
+                "created_at": now
+            },
+            {
+                "_id": "course_data_science_intro",
+                "title": "Introduction to Data Science",
+                "description": "Learn the fundamentals of data science with Python, including data analysis, visualization, and basic machine learning.",
+                "category": "Data Science",
+                "difficulty": "intermediate",
+                "topics": ["data analysis", "visualization", "statistics", "machine learning basics"],
+                "materials": [
+                    {
+                        "id": "data_science_coursera",
+                        "title": "Data Science Specialization - Coursera",
+                        "type": "url",
+                        "url": "https://www.coursera.org/specializations/jhu-data-science"
+                    },
+                    {
+                        "id": "pandas_docs",
+                        "title": "Pandas Documentation",
+                        "type": "url",
+                        "url": "https://pandas.pydata.org/docs/"
+                    }
+                ],
+                "created_at": now
+            },
+            {
+                "_id": "course_web_dev",
+                "title": "Web Development Fundamentals",
+                "description": "Master the basics of web development including HTML, CSS, and JavaScript.",
+                "category": "Computer Science",
+                "difficulty": "beginner",
+                "topics": ["HTML", "CSS", "JavaScript", "Web Design"],
+                "materials": [
+                    {
+                        "id": "mdn_web",
+                        "title": "MDN Web Docs",
+                        "type": "url",
+                        "url": "https://developer.mozilla.org/en-US/docs/Learn"
+                    },
+                    {
+                        "id": "freecodecamp",
+                        "title": "FreeCodeCamp Web Development",
+                        "type": "url",
+                        "url": "https://www.freecodecamp.org/learn/responsive-web-design/"
+                    }
+                ],
+                "created_at": now
+            },
+            {
+                "_id": "course_machine_learning",
+                "title": "Machine Learning Fundamentals",
+                "description": "Learn the core concepts of machine learning and implement them using Python.",
+                "category": "Data Science",
+                "difficulty": "advanced",
+                "topics": ["supervised learning", "unsupervised learning", "neural networks", "deep learning"],
+                "materials": [
+                    {
+                        "id": "ml_coursera",
+                        "title": "Machine Learning by Andrew Ng",
+                        "type": "url",
+                        "url": "https://www.coursera.org/learn/machine-learning"
+                    },
+                    {
+                        "id": "scikit_learn",
+                        "title": "Scikit-learn Documentation",
+                        "type": "url",
+                        "url": "https://scikit-learn.org/stable/"
+                    }
+                ],
+                "created_at": now
+            }
+        ],
+        "assessments": [
+            {
+                "_id": "assessment_python_basics",
+                "title": "Python Basics Quiz",
+                "course_id": "course_python_basics",
+                "description": "Test your knowledge of Python fundamentals",
+                "questions": [
+                    {
+                        "question_id": "q1",
+                        "text": "What is the correct way to create a variable in Python?",
+                        "type": "multiple_choice",
+                        "options": ["var x = 5", "x = 5", "x := 5", "set x = 5"],
+                        "correct_answer": "x = 5"
+                    },
+                    {
+                        "question_id": "q2",
+                        "text": "What is the output of: print(2 + 2 * 2)",
+                        "type": "multiple_choice",
+                        "options": ["6", "8", "4", "Error"],
+                        "correct_answer": "6"
+                    },
+                    {
+                        "question_id": "q3",
+                        "text": "Explain how functions help with code reusability in Python.",
+                        "type": "open_ended",
+                        "sample_answer": "Functions allow code to be defined once and executed multiple times, promoting reusability and reducing redundancy. They can accept parameters and return values, making them versatile for different contexts."
+                    }
+                ],
+                "created_at": now
+            },
+            {
+                "_id": "assessment_data_science",
+                "title": "Data Science Concepts",
+                "course_id": "course_data_science_intro",
+                "description": "Evaluate your understanding of data science principles",
+                "questions": [
+                    {
+                        "question_id": "q1",
+                        "text": "Which Python library is most commonly used for data manipulation?",
+                        "type": "multiple_choice",
+                        "options": ["NumPy", "Pandas", "Matplotlib", "Scikit-learn"],
+                        "correct_answer": "Pandas"
+                    },
+                    {
+                        "question_id": "q2",
+                        "text": "What does EDA stand for in data science?",
+                        "type": "multiple_choice",
+                        "options": ["External Data Analysis", "Exploratory Data Analysis", "Extended Data Architecture", "Efficient Data Algorithms"],
+                        "correct_answer": "Exploratory Data Analysis"
+                    }
+                ],
+                "created_at": now
+            }
+        ],
+        "progress": [
+            {
+                "user_id": DEMO_USER_ID,
+                "course_id": "course_python_basics",
+                "completed_topics": ["variables", "data types"],
+                "progress_percentage": 50,
+                "quiz_scores": [
+                    {"quiz_id": "quiz_variables", "score": 85},
+                    {"quiz_id": "quiz_data_types", "score": 90}
+                ],
+                "last_updated": now
+            },
+            {
+                "user_id": DEMO_USER_ID,
+                "course_id": "course_data_science_intro",
+                "completed_topics": ["data analysis"],
+                "progress_percentage": 25,
+                "quiz_scores": [
+                    {"quiz_id": "quiz_data_analysis", "score": 75}
+                ],
+                "last_updated": now
+            }
+        ],
+        "community_posts": [
+            {
+                "user_id": "system",
+                "username": "System",
+                "title": "Welcome to the EduTutor AI Community!",
+                "content": "This is a space for students to connect, collaborate, and learn together. Feel free to share your questions, insights, and resources with others!",
+                "topic": "General",
+                "likes": 5,
+                "comments": [],
+                "created_at": now
+            },
+            {
+                "user_id": DEMO_USER_ID,
+                "username": "Demo Student",
+                "title": "Looking for study partners in Data Science",
+                "content": "I'm currently taking the Introduction to Data Science course and would love to connect with others who are learning similar topics. Anyone interested in forming a study group?",
+                "topic": "Data Science",
+                "likes": 2,
+                "comments": [
+                    {
+                        "user_id": "system",
+                        "username": "System",
+                        "content": "Great idea! You can also check out the resources section for additional study materials.",
+                        "created_at": now
+                    }
+                ],
+                "created_at": now
+            }
+        ],
+        "qa_questions": [
+            {
+                "user_id": DEMO_USER_ID,
+                "username": "Demo Student",
+                "title": "How do list comprehensions work in Python?",
+                "content": "I'm confused about the syntax of list comprehensions. Can someone explain with examples?",
+                "topic": "Python",
+                "answered": True,
+                "ai_answer": "List comprehensions provide a concise way to create lists based on existing lists. The basic syntax is: [expression for item in iterable if condition]. For example, to create a list of squares: squares = [x**2 for x in range(10)]. This is equivalent to using a for loop but more concise and often faster.",
+                "likes": 3,
+                "created_at": now
+            },
+            {
+                "user_id": DEMO_USER_ID,
+                "username": "Demo Student",
+                "title": "What's the difference between mean, median, and mode?",
+                "content": "I'm studying statistics and getting confused about when to use each of these measures of central tendency.",
+                "topic": "Statistics",
+                "answered": True,
+                "ai_answer": "Mean is the average of all values (sum divided by count). Median is the middle value when data is sorted. Mode is the most frequently occurring value. Mean is sensitive to outliers, while median is more robust. Use mean for normally distributed data, median for skewed data, and mode for categorical data or when you need the most common value.",
+                "likes": 2,
+                "created_at": now
+            }
+        ]
+    }
+
+def seed_demo_data(db):
+    """Insert the demo dataset into every collection that does not exist yet"""
+    existing = set(db.list_collection_names())
+    for collection, documents in demo_documents().items():
+        if collection not in existing:
+            db[collection].insert_many(documents, ordered=False)
+
+# ---------------------------------------------------------------------------
+# Synthetic columns
+# ---------------------------------------------------------------------------
+
+def _zipf_cdf(n, exponent):
+    """Cumulative Zipf probabilities over ranks 1..n"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    cdf = np.cumsum(weights / weights.sum())
+    cdf[-1] = 1.0
+    return cdf
+
+def _draw(rng, cdf, size):
+    """Sample indices from a cumulative distribution"""
+    return np.searchsorted(cdf, rng.random(size), side="right")
+
+def _timestamps(rng, now, size, span_days):
+    """Creation times skewed towards the recent past, as datetime objects"""
+    ages = np.minimum(rng.exponential(span_days / 3.0, size), span_days) * 86400
+    return (np.datetime64(now, "s") - ages.astype("timedelta64[s]")).astype("datetime64[us]")
+
+def _unique_pairs(rng, first_cdf, second_cdf, second_count, size):
+    """Up to size distinct (first, second) index pairs, each drawn from its distribution"""
+    draws = int(size * 1.5) + 16
+    keys = _draw(rng, first_cdf, draws).astype(np.int64) * second_count + _draw(rng, second_cdf, draws)
+    _, first_seen = np.unique(keys, return_index=True)
+    keys = keys[np.sort(first_seen)][:size]
+    return keys // second_count, keys % second_count
+
+def build_columns(total, seed=0, activity_alpha=1.2, topic_zipf=1.1, span_days=365, now=None):
+    """Draw every random value of a synthetic dataset of about total documents
+
+    activity_alpha is the Pareto exponent of per-user activity (lower means a
+    heavier tail) and topic_zipf the Zipf exponent of topic and course
+    popularity. The demo user is the most active one.
+    """
+    rng = np.random.default_rng(seed)
+    now = now or datetime.now()
+    counts = {collection: int(total * share) for collection, share in COLLECTION_SHARES.items()}
+    n_users = max(2, counts["users"])
+    n_courses = max(20, min(500, total // 2000))
+
+    topics = [(topic, category) for category, names in CATALOG.items() for topic in names]
+    topic_order = rng.permutation(len(topics))
+    topics = [topics[i] for i in topic_order]
+    topic_cdf = _zipf_cdf(len(topics), topic_zipf)
+    course_cdf = _zipf_cdf(n_courses, topic_zipf)
+    community_cdf = _zipf_cdf(len(COMMUNITY_TOPICS), topic_zipf)
+
+    activity = np.sort(rng.pareto(activity_alpha, n_users) + 1.0)[::-1]
+    activity_cdf = np.cumsum(activity / activity.sum())
+    activity_cdf[-1] = 1.0
+
+    columns = {"now": now, "topics": topics, "n_users": n_users, "n_courses": n_courses}
+
+    # Index 0 is the demo user, whose user document comes from the demo data
+    users = n_users - 1
+    columns["users"] = {
+        "count": users,
+        "style": rng.integers(len(LEARNING_STYLES), size=users),
+        "level": rng.integers(len(DIFFICULTIES), size=users),
+        "interests": _draw(rng, topic_cdf, (users, 3)),
+        "interest_count": rng.integers(1, 4, size=users),
+        "created_at": _timestamps(rng, now, users, span_days)
+    }
+
+    course_topics = _draw(rng, topic_cdf, n_courses)
+    columns["courses"] = {
+        "count": n_courses,
+        "topic": course_topics,
+        "level": rng.integers(len(DIFFICULTIES), size=n_courses),
+        "created_at": _timestamps(rng, now, n_courses, span_days)
+    }
+    columns["assessments"] = {"count": n_courses, "topic": course_topics, "created_at": columns["courses"]["created_at"]}
+
+    user, course = _unique_pairs(rng, activity_cdf, course_cdf, n_courses, counts["progress"])
+    count = len(user)
+    columns["progress"] = {
+        "count": count, "user": user, "course": course,
+        "percentage": rng.integers(0, 101, size=count),
+        "quiz_count": rng.integers(0, 4, size=count),
+        "quiz_scores": np.clip(rng.normal(72, 15, size=(count, 3)), 0, 100).round(),
+        "last_updated": _timestamps(rng, now, count, span_days)
+    }
+
+    user, assessment = _unique_pairs(rng, activity_cdf, course_cdf, n_courses, counts["assessment_results"])
+    count = len(user)
+    columns["assessment_results"] = {
+        "count": count, "user": user, "assessment": assessment,
+        "score": np.clip(rng.normal(72, 15, size=count), 0, 100).round(1),
+        "completed_at": _timestamps(rng, now, count, span_days)
+    }
+
+    count = counts["user_tasks"]
+    created_at = _timestamps(rng, now, count, span_days)
+    # Tasks are planned up to a week after they are created
+    planned = created_at + rng.integers(0, 8, size=count).astype("timedelta64[D]")
+    columns["user_tasks"] = {
+        "count": count,
+        "user": _draw(rng, activity_cdf, count),
+        "topic": _draw(rng, topic_cdf, count),
+        "type": rng.integers(len(TASK_TYPES), size=count),
+        "priority": rng.integers(len(PRIORITIES), size=count),
+        "time_estimate": rng.integers(len(TIME_ESTIMATES), size=count),
+        "completed": (rng.random(count) < np.where(planned < np.datetime64(now), 0.8, 0.2)),
+        "day": planned.astype("datetime64[D]").astype("datetime64[us]"),
+        "created_at": created_at,
+        # Completed during the planned day, but never in the future
+        "completed_at": np.minimum(
+            planned.astype("datetime64[D]") + rng.integers(8 * 3600, 22 * 3600, size=count).astype("timedelta64[s]"),
+            np.datetime64(now, "s")
+        ).astype("datetime64[us]")
+    }
+
+    count = counts["community_posts"]
+    columns["community_posts"] = {
+        "count": count,
+        "user": _draw(rng, activity_cdf, count),
+        "topic": _draw(rng, community_cdf, count),
+        "likes": np.minimum(rng.zipf(2.0, size=count) - 1, 10_000),
+        "comment_count": np.minimum(rng.poisson(1.0, size=count), 5),
+        "commenter": _draw(rng, activity_cdf, (count, 5)),
+        "created_at": _timestamps(rng, now, count, span_days)
+    }
+
+    count = counts["qa_questions"]
+    columns["qa_questions"] = {
+        "count": count,
+        "user": _draw(rng, activity_cdf, count),
+        "topic": _draw(rng, topic_cdf, count),
+        "answered": rng.random(count) < 0.7,
+        "likes": np.minimum(rng.zipf(2.2, size=count) - 1, 10_000),
+        "created_at": _timestamps(rng, now, count, span_days)
+    }
+    return columns
+
+# ---------------------------------------------------------------------------
+# Documents
+# ---------------------------------------------------------------------------
+
+def _user_id(index):
+    return DEMO_USER_ID if index == 0 else f"user_{index}"
+
+def _username(index):
+    return "Demo Student" if index == 0 else f"Student {index}"
+
+def build_documents(collection, columns, start, end):
+    """Documents start..end of a collection, as plain Python values ready for BSON"""
+    c = {k: v[start:end].tolist() if isinstance(v, np.ndarray) else v for k, v in columns[collection].items()}
+    topics = columns["topics"]
+    documents = []
+
+    if collection == "users":
+        for i in range(end - start):
+            index = start + i + 1
+            documents.append({
+                "_id": _user_id(index),
+                "username": _username(index),
+                "email": f"student{index}@example.com",
+                "role": "student",
+                "created_at": c["created_at"][i],
+                "preferences": {
+                    "learning_style": LEARNING_STYLES[c["style"][i]],
+                    "difficulty_level": DIFFICULTIES[c["level"][i]],
+                    "interests": list(dict.fromkeys(topics[t][0].lower() for t in c["interests"][i][:c["interest_count"][i]]))
+                }
+            })
+
+    elif collection == "courses":
+        for i in range(end - start):
+            index = start + i
+            topic, category = topics[c["topic"][i]]
+            difficulty = DIFFICULTIES[c["level"][i]]
+            documents.append({
+                "_id": f"course_gen_{index}",
+                "title": f"{topic} {['Foundations', 'in Practice', 'Advanced Topics'][c['level'][i]]} {index}",
+                "description": f"{'An' if difficulty[0] in 'aeiou' else 'A'} {difficulty} course on {topic} covering core concepts, worked examples and exercises.",
+                "category": category,
+                "difficulty": difficulty,
+                "topics": [f"{topic} part {n}" for n in range(1, 5)],
+                "materials": [],
+                "created_at": c["created_at"][i]
+            })
+
+    elif collection == "assessments":
+        for i in range(end - start):
+            index = start + i
+            topic = topics[c["topic"][i]][0]
+            documents.append({
+                "_id": f"assessment_gen_{index}",
+                "title": f"{topic} Quiz {index}",
+                "course_id": f"course_gen_{index}",
+                "description": f"Check your understanding of {topic}",
+                "questions": [{
+                    "question_id": f"q{n}",
+                    "text": f"Which statement about {topic} part {n} is correct?",
+                    "type": "multiple_choice",
+                    "options": [f"Statement {letter}" for letter in "ABCD"],
+                    "correct_answer": f"Statement {'ABCD'[n % 4]}"
+                } for n in range(1, 4)],
+                "created_at": c["created_at"][i]
+            })
+
+    elif collection == "progress":
+        for i in range(end - start):
+            course = c["course"][i]
+            documents.append({
+                "user_id": _user_id(c["user"][i]),
+                "course_id": f"course_gen_{course}",
+                "completed_topics": [f"{topics[columns['courses']['topic'][course]][0]} part {n}" for n in range(1, 1 + c["percentage"][i] // 25)],
+                "progress_percentage": c["percentage"][i],
+                "quiz_scores": [
+                    {"quiz_id": f"assessment_gen_{course}" if n == 0 else f"quiz_{course}_{n}", "score": c["quiz_scores"][i][n]}
+                    for n in range(c["quiz_count"][i])
+                ],
+                "last_updated": c["last_updated"][i]
+            })
+
+    elif collection == "assessment_results":
+        for i in range(end - start):
+            documents.append({
+                "user_id": _user_id(c["user"][i]),
+                "assessment_id": f"assessment_gen_{c['assessment'][i]}",
+                "submission_id": f"seed_{start + i}",
+                "score": c["score"][i],
+                "answers": {},
+                "feedback": {},
+                "completed_at": c["completed_at"][i]
+            })
+
+    elif collection == "user_tasks":
+        for i in range(end - start):
+            task_type = TASK_TYPES[c["type"][i]]
+            documents.append({
+                "user_id": _user_id(c["user"][i]),
+                "name": f"{task_type}: {topics[c['topic'][i]][0]}",
+                "priority": PRIORITIES[c["priority"][i]],
+                "time_estimate": TIME_ESTIMATES[c["time_estimate"][i]],
+                "task_type": task_type,
+                "notes": "",
+                "day": c["day"][i],
+                "completed": c["completed"][i],
+                "created_at": c["created_at"][i]
+            })
+            if c["completed"][i]:
+                documents[-1]["completed_at"] = c["completed_at"][i]
+
+    elif collection == "community_posts":
+        for i in range(end - start):
+            topic = COMMUNITY_TOPICS[c["topic"][i]]
+            created_at = c["created_at"][i]
+            documents.append({
+                "user_id": _user_id(c["user"][i]),
+                "username": _username(c["user"][i]),
+                "title": f"Discussion on {topic} #{start + i}",
+                "content": f"Sharing some notes and questions about {topic}. Has anyone found good resources for this?",
+                "topic": topic,
+                "likes": c["likes"][i],
+                "comments": [{
+                    "user_id": _user_id(commenter),
+                    "username": _username(commenter),
+                    "content": "Thanks for sharing, this helped me too.",
+                    "created_at": created_at
+                } for commenter in c["commenter"][i][:c["comment_count"][i]]],
+                "created_at": created_at
+            })
+
+    elif collection == "qa_questions":
+        for i in range(end - start):
+            topic = topics[c["topic"][i]][0]
+            answered = c["answered"][i]
+            documents.append({
+                "user_id": _user_id(c["user"][i]),
+                "username": _username(c["user"][i]),
+                "title": f"How does this work in {topic}? (#{start + i})",
+                "content": f"I'm studying {topic} and I'm stuck on one of the exercises. Can someone explain the idea?",
+                "topic": topic,
+                "answered": answered,
+                "ai_answer": f"Here is an explanation of the key idea in {topic}, with an example." if answered else "",
+                "likes": c["likes"][i],
+                "created_at": c["created_at"][i]
+            })
+
+    return documents
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+def _insert_batch(db, collection, columns, start, end):
+    documents = build_documents(collection, columns, start, end)
+    try:
+        return len(db[collection].insert_many(documents, ordered=False).inserted_ids)
+    except pymongo.errors.BulkWriteError as e:
+        # Unordered inserts keep going past duplicates (e.g. reseeding without drop)
+        return e.details.get("nInserted", 0)
+
+def seed(db, total, seed=0, workers=None, batch_size=5000, drop=False, demo=True, **distribution):
+    """Load the demo data plus about total synthetic documents; returns the inserted count per collection
+
+    distribution is passed to build_columns (activity_alpha, topic_zipf,
+    span_days). With drop the seeded collections are emptied first.
+    """
+    # The in-memory fallback database is not thread-safe
+    parallel = getattr(db, "client", None) is not None
+    workers = (workers or min(8, os.cpu_count() or 1)) if parallel else 1
+
+    if drop:
+        for collection in LOAD_ORDER:
+            if parallel:
+                db.drop_collection(collection)
+            else:
+                db[collection].delete_many({})
+    if demo:
+        seed_demo_data(db)
+
+    columns = build_columns(total, seed, **distribution)
+    inserted = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            collection: [
+                executor.submit(_insert_batch, db, collection, columns, start, min(start + batch_size, columns[collection]["count"]))
+                for start in range(0, columns[collection]["count"], batch_size)
+            ]
+            for collection in LOAD_ORDER
+        }
+        for collection, batches in futures.items():
+            inserted[collection] = sum(batch.result() for batch in batches)
+    # Bulk-loaded tasks bypass the task rollups; drop them so they are rebuilt on first read
+    db["task_stats"].delete_many({})
+    return inserted
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI"), required=not os.getenv("MONGO_URI"))
+    parser.add_argument("--db", default="edututor_ai_seed", help="database to seed")
+    parser.add_argument("--total", type=int, default=100_000, help="approximate number of synthetic documents")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop", action="store_true", help="empty the seeded collections first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--activity-alpha", type=float, default=1.2, help="Pareto exponent of user activity")
+    parser.add_argument("--topic-zipf", type=float, default=1.1, help="Zipf exponent of topic and course popularity")
+    parser.add_argument("--span-days", type=int, default=365)
+    args = parser.parse_args()
+
+    from database import ensure_indexes
+    db = pymongo.MongoClient(args.mongo_uri)[args.db]
+    start = time.perf_counter()
+    inserted = seed(
+        db, args.total, args.seed, args.workers, args.batch_size, args.drop,
+        activity_alpha=args.activity_alpha, topic_zipf=args.topic_zipf, span_days=args.span_days
+    )
+    ensure_indexes(db)
+    elapsed = time.perf_counter() - start
+    for collection, count in inserted.items():
+        print(f"{collection:>20} {count:>10,}")
+    total = sum(inserted.values())
+    print(f"Inserted {total:,} documents into {args.db} in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f}/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Session-state memory accounting for the SmartLearn Platform
+
+Every Streamlit session keeps its own st.session_state for as long as the
+browser tab is open, so large values there add up across thousands of
+sessions. This module keeps that in check in three ways:
+
+- Accounting: track_session(), called at the start of each rerun, records
+  the approximate size of the session's state per key, and memory_report()
+  sums it up for this worker (also exported as Prometheus gauges).
+- Blob deduplication: uploaded files are stored once per worker in a
+  content-addressed blob store and sessions hold a BlobRef (the SHA-256 of
+  the content) instead of the bytes or a base64 copy. Blobs added as streams
+  (put_stream) are written to temporary files in BLOB_SPILL_DIR rather than
+  kept in memory.
+- Idle eviction: sessions idle for longer than SESSION_IDLE_TTL seconds have
+  their heavy keys dropped (or compacted), and blobs no session refers to any
+  more are released after BLOB_TTL seconds.
+
+Sessions are tracked by session id and hold the session's long-lived
+SessionState. A session is forgotten once the Streamlit runtime no longer
+reports it as active, so a closed session is not kept alive by the registry.
+"""
+
+import os
+import sys
+import time
+import hashlib
+import resource
+import tempfile
+import threading
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+BLOB_TTL = float(os.getenv("SESSION_BLOB_TTL", "600"))
+SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+BLOB_SPILL_DIR = os.getenv("SESSION_BLOB_DIR") or os.path.join(tempfile.gettempdir(), "smartlearn_blobs")
+BLOB_CHUNK_SIZE = 1 << 20
+REPORT_TOP_SESSIONS = 10
+METRIC_TOP_KEYS = 20           # per-key gauges exported; the rest are summed as key="other"
+MAX_MATERIAL_CONTENT = 4000    # characters of current_material content kept in session state
+
+# Keys dropped from idle sessions; they only hold in-progress UI state
+EVICTABLE_KEYS = ("material_form_state", "user_reactions", "answers", "current_question", "current_assessment")
+MATERIAL_FIELDS = ("_id", "title", "category", "source", "url", "type", "content")
+
+class BlobRef(str):
+    """Reference to a blob in the worker's blob store (the hex SHA-256 of its content)"""
+
+class _SpilledBlob:
+    """A blob kept in a temporary file"""
+    __slots__ = ("path", "size")
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+class BlobStore:
+    """Content-addressed bytes shared by all sessions of this worker"""
+
+    def __init__(self, spill_dir=BLOB_SPILL_DIR):
+        self._blobs = {}       # ref -> bytes or _SpilledBlob
+        self._used = {}        # ref -> last put/get time
+        self._puts = 0
+        self._put_bytes = 0
+        self._spill_dir = spill_dir
+        self._lock = threading.Lock()
+
+    def put(self, data):
+        """Store data (once per distinct content) and return its BlobRef"""
+        ref = BlobRef(hashlib.sha256(data).hexdigest())
+        with self._lock:
+            self._blobs.setdefault(ref, bytes(data))
+            self._used[ref] = time.time()
+            self._puts += 1
+            self._put_bytes += len(data)
+        return ref
+
+    def put_stream(self, stream, chunk_size=BLOB_CHUNK_SIZE):
+        """Store a file-like object's content without holding it in memory; returns (BlobRef, size)"""
+        os.makedirs(self._spill_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.NamedTemporaryFile(dir=self._spill_dir, delete=False) as spill:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                digest.update(chunk)
+                spill.write(chunk)
+                size += len(chunk)
+        ref = BlobRef(digest.hexdigest())
+        with self._lock:
+            if ref in self._blobs:
+                os.remove(spill.name)
+            else:
+                self._blobs[ref] = _SpilledBlob(spill.name, size)
+            self._used[ref] = time.time()
+            self._puts += 1
+            self._put_bytes += size
+        return ref, size
+
+    def get(self, ref):
+        """The bytes behind a BlobRef, or None if it has been released"""
+        with self._lock:
+            data = self._blobs.get(ref)
+            if data is None:
+                return None
+            self._used[ref] = time.time()
+        return data.read() if isinstance(data, _SpilledBlob) else data
+
+    def __contains__(self, ref):
+        with self._lock:
+            return ref in self._blobs
+
+    def release_unreferenced(self, referenced, ttl=BLOB_TTL, now=None):
+        """Drop blobs outside referenced that have not been used for ttl seconds; returns bytes freed"""
+        now = time.time() if now is None else now
+        freed = 0
+        with self._lock:
+            for ref in [r for r, used in self._used.items() if r not in referenced and now - used > ttl]:
+                blob = self._blobs.pop(ref)
+                del self._used[ref]
+                freed += len(blob)
+                if isinstance(blob, _SpilledBlob):
+                    blob.remove()
+        return freed
+
+    def stats(self):
+        with self._lock:
+            spilled = sum(len(b) for b in self._blobs.values() if isinstance(b, _SpilledBlob))
+            stored = sum(len(b) for b in self._blobs.values()) - spilled
+            return {"count": len(self._blobs), "bytes": stored, "spilled_bytes": spilled, "puts": self._puts, "put_bytes": self._put_bytes}
+
+blob_store = BlobStore()
+
+def put_blob(data):
+    """Store bytes in this worker's blob store and return their BlobRef"""
+    return blob_store.put(data)
+
+def get_blob(ref):
+    """The bytes behind a BlobRef, or None if they have been released"""
+    return blob_store.get(ref)
+
+# ---------------------------------------------------------------------------
+# Sizing
+# ---------------------------------------------------------------------------
+
+def deep_size(value, refs=None, seen=None):
+    """Approximate bytes held by a value and everything it contains
+
+    BlobRefs found along the way are added to refs; the blobs themselves
+    are accounted once, in the blob store.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, BlobRef) and refs is not None:
+        refs.add(value)
+
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return size
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):  # DataFrame
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "nbytes"):  # numpy arrays
+        return size + int(value.nbytes)
+    if isinstance(value, dict):
+        return size + sum(deep_size(k, refs, seen) + deep_size(v, refs, seen) for k, v in list(value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(deep_size(v, refs, seen) for v in list(value))
+    if hasattr(value, "__dict__"):
+        return size + deep_size(vars(value), refs, seen)
+    return size
+
+def compact_material(material):
+    """The part of a material document the "Currently Learning" views need"""
+    if not material:
+        return material
+    compact = {k: material[k] for k in MATERIAL_FIELDS if k in material}
+    content = compact.get("content")
+    if isinstance(content, str) and len(content) > MAX_MATERIAL_CONTENT:
+        compact["content"] = content[:MAX_MATERIAL_CONTENT] + "…"
+    return compact
+
+# ---------------------------------------------------------------------------
+# Session registry
+# ---------------------------------------------------------------------------
+
+class _SessionRecord:
+    __slots__ = ("state", "last_seen", "sizes", "refs")
+
+    def __init__(self, state):
+        self.state = state
+        self.last_seen = time.time()
+        self.sizes = {}
+        self.refs = set()
+
+_sessions = {}              # session id -> _SessionRecord
+_sessions_lock = threading.Lock()
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+_evicted = {"sessions": 0, "keys": 0, "blob_bytes": 0}
+
+def _current_session():
+    """(session id, session state) of the running script, or (None, None) outside Streamlit"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return None, None
+    # ctx.session_state is a per-run wrapper; keep the SessionState it wraps, which lives as long as the session
+    return ctx.session_id, getattr(ctx.session_state, "_state", ctx.session_state)
+
+def track_session():
+    """Record the current session's activity and state size per key; sweeps idle sessions now and then"""
+    session_id, state = _current_session()
+    if session_id is None:
+        return
+    refs = set()
+    sizes = {}
+    for key, value in state.filtered_state.items():
+        sizes[key] = deep_size(value, refs)
+
+    with _sessions_lock:
+        record = _sessions.get(session_id)
+        if record is None or record.state is not state:
+            record = _sessions[session_id] = _SessionRecord(state)
+        record.last_seen = time.time()
+        record.sizes = sizes
+        record.refs = refs
+
+    if time.time() - _last_sweep > SWEEP_INTERVAL:
+        sweep()
+
+def _evict(state):
+    """Drop or compact the heavy keys of an idle session's state; returns the number of keys changed"""
+    changed = 0
+    for key in EVICTABLE_KEYS:
+        if key in state:
+            del state[key]
+            changed += 1
+    if "current_material" in state:
+        material = state["current_material"]
+        compact = compact_material(material)
+        if compact != material:
+            state["current_material"] = compact
+            changed += 1
+    return changed
+
+def sweep(now=None, idle_ttl=SESSION_IDLE_TTL):
+    """Evict heavy keys from idle sessions, forget closed ones and release unreferenced blobs
+
+    Only one thread sweeps at a time; others return straight away.
+    """
+    global _last_sweep
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    try:
+        now = time.time() if now is None else now
+        _last_sweep = now
+        with _sessions_lock:
+            records = list(_sessions.items())
+        runtime = Runtime.instance() if Runtime.exists() else None
+
+        referenced = set()
+        for session_id, record in records:
+            state = record.state
+            if runtime is not None and not runtime.is_active_session(session_id):
+                # Closed (or disconnected) session: forget it, and its blobs are no longer referenced
+                with _sessions_lock:
+                    _sessions.pop(session_id, None)
+                continue
+            if now - record.last_seen > idle_ttl and record.sizes:
+                try:
+                    changed = _evict(state)
+                except Exception:
+                    # The session may be mid-rerun or shutting down; try again next sweep
+                    changed = 0
+                if changed:
+                    _evicted["sessions"] += 1
+                    _evicted["keys"] += changed
+                    # Re-account what is left; evicted keys no longer hold blob references
+                    refs = set()
+                    record.sizes = {key: deep_size(value, refs) for key, value in state.filtered_state.items()}
+                    record.refs = refs
+            referenced |= record.refs
+
+        _evicted["blob_bytes"] += blob_store.release_unreferenced(referenced, now=now)
+    finally:
+        _sweep_lock.release()
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def memory_report(now=None):
+    """Session-state memory of this worker: totals, bytes per key, the largest sessions and the blob store"""
+    now = time.time() if now is None else now
+    with _sessions_lock:
+        records = [(sid, dict(r.sizes), r.last_seen) for sid, r in _sessions.items()]
+
+    by_key = {}
+    sessions = []
+    for session_id, sizes, last_seen in records:
+        for key, size in sizes.items():
+            by_key[key] = by_key.get(key, 0) + size
+        sessions.append({"session_id": session_id, "bytes": sum(sizes.values()), "idle_seconds": now - last_seen})
+    sessions.sort(key=lambda s: s["bytes"], reverse=True)
+
+    blobs = blob_store.stats()
+    return {
+        "sessions": len(records),
+        "idle_sessions": sum(1 for s in sessions if s["idle_seconds"] > SESSION_IDLE_TTL),
+        "session_bytes": sum(by_key.values()),
+        "by_key": dict(sorted(by_key.items(), key=lambda item: item[1], reverse=True)),
+        "top_sessions": sessions[:REPORT_TOP_SESSIONS],
+        "blobs": blobs,
+        "evicted": dict(_evicted),
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    }
+
+def prometheus_memory_metrics():
+    """memory_report() in the Prometheus text exposition format"""
+    report = memory_report()
+    lines = [
+        "# TYPE smartlearn_sessions gauge",
+        f"smartlearn_sessions {report['sessions']}",
+        "# TYPE smartlearn_idle_sessions gauge",
+        f"smartlearn_idle_sessions {report['idle_sessions']}",
+        "# TYPE smartlearn_session_state_bytes gauge"
+    ]
+    # Widget keys embed ids, so only the largest keys get their own series
+    keys = list(report["by_key"].items())
+    for key, size in keys[:METRIC_TOP_KEYS]:
+        label = str(key).replace("\\", "\\\\").replace('"', '\\"')
+        lines.append(f'smartlearn_session_state_bytes{{key="{label}"}} {size}')
+    if len(keys) > METRIC_TOP_KEYS:
+        lines.append(f'smartlearn_session_state_bytes{{key="other"}} {sum(size for _, size in keys[METRIC_TOP_KEYS:])}')
+    lines += [
+        "# TYPE smartlearn_session_blobs gauge",
+        f"smartlearn_session_blobs {report['blobs']['count']}",
+        "# TYPE smartlearn_session_blob_bytes gauge",
+        f"smartlearn_session_blob_bytes {report['blobs']['bytes']}",
+        "# TYPE smartlearn_session_blob_spilled_bytes gauge",
+        f"smartlearn_session_blob_spilled_bytes {report['blobs']['spilled_bytes']}",
+        "# TYPE smartlearn_session_blob_put_bytes_total counter",
+        f"smartlearn_session_blob_put_bytes_total {report['blobs']['put_bytes']}",
+        "# TYPE smartlearn_session_evicted_keys_total counter",
+        f"smartlearn_session_evicted_keys_total {report['evicted']['keys']}"
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,314 @@
+"""
+Local stub of the Hugging Face inference API for offline load testing
+
+Speaks the same HTTP contract as granite_model.API_URL: POST a JSON body with
+"inputs", "parameters" and "options" and get back a list of
+{"generated_text": ...}. Like the hosted API it answers 503 with an
+estimated_time while the model is "loading" (unless options.wait_for_model is
+set, in which case the request waits), 429 when the request rate or
+concurrency cap is exceeded, and streams server-sent events in the
+text-generation-inference format when the body has "stream": true.
+
+Latency is drawn from a configurable distribution (plus an optional per-token
+delay), errors are injected at a configurable rate, and every random draw comes
+from one seeded generator, so runs are reproducible. GET /stats returns the
+request, error and rejection counters.
+
+Point the app at it with GRANITE_API_URL (and any non-empty HF_TOKEN):
+    python stub_inference.py --port 8080 --latency lognormal:300,0.5 --error-rate 0.02
+    GRANITE_API_URL=http://127.0.0.1:8080/models/stub HF_TOKEN=stub streamlit run app.py
+"""
+
+import re
+import json
+import time
+import math
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+STUB_WORDS = (
+    "the key idea is that each concept builds on the previous one so practice "
+    "with small examples first then review the definitions and try again"
+).split()
+
+def parse_latency(spec):
+    """Parse a latency spec such as "fixed:50", "uniform:20,200", "normal:100,30",
+    "lognormal:100,0.5" (median ms, sigma) or "exponential:100" (mean ms)"""
+    name, _, args = spec.partition(":")
+    if name not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution '{name}', expected one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+    values = [float(v) for v in args.split(",") if v.strip()] if args else []
+    defaults = {"fixed": [0], "uniform": [0, 100], "normal": [100, 20], "lognormal": [100, 0.5], "exponential": [100]}
+    values += defaults[name][len(values):]
+    return name, values
+
+class StubConfig:
+    """Behaviour of the stub server; all times are in milliseconds"""
+
+    def __init__(self, latency="fixed:50", per_token_ms=0.0, error_rate=0.0, error_status=500,
+                 max_concurrency=0, rps=0.0, cold_start_ms=0.0, seed=0, model_id="stub"):
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.per_token_ms = per_token_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_concurrency = max_concurrency  # 0 means unlimited
+        self.rps = rps  # 0 means unlimited
+        self.cold_start_ms = cold_start_ms
+        self.seed = seed
+        self.model_id = model_id
+
+class StubState:
+    """Shared counters, throughput limiter and random generator of one server"""
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.in_flight = 0
+        self.tokens = max(config.rps, 1.0)
+        self.refilled = self.started
+        self.stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "loading": 0, "streamed": 0, "max_in_flight": 0}
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def draw_latency(self):
+        """One latency sample in seconds"""
+        name, args = self.config.latency
+        with self.lock:
+            if name == "fixed":
+                value = args[0]
+            elif name == "uniform":
+                value = self.rng.uniform(args[0], args[1])
+            elif name == "normal":
+                value = self.rng.gauss(args[0], args[1])
+            elif name == "lognormal":
+                value = self.rng.lognormvariate(math.log(max(args[0], 1e-6)), args[1])
+            else:
+                value = self.rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+        return max(value, 0.0) / 1000.0
+
+    def draw_error(self):
+        with self.lock:
+            return self.rng.random() < self.config.error_rate
+
+    def loading_remaining(self):
+        """Seconds until the simulated model has loaded"""
+        return max(0.0, self.config.cold_start_ms / 1000.0 - (time.monotonic() - self.started))
+
+    def admit(self):
+        """Take a rate token and a concurrency slot; False when either cap is hit"""
+        with self.lock:
+            now = time.monotonic()
+            if self.config.rps:
+                self.tokens = min(max(self.config.rps, 1.0), self.tokens + (now - self.refilled) * self.config.rps)
+                self.refilled = now
+                if self.tokens < 1.0:
+                    return False
+            if self.config.max_concurrency and self.in_flight >= self.config.max_concurrency:
+                return False
+            if self.config.rps:
+                self.tokens -= 1.0
+            self.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+def stub_completion(prompt, max_new_tokens):
+    """Deterministic text for a prompt: JSON arrays for recommendation and practice prompts, prose otherwise"""
+    if prompt.rstrip().endswith("JSON:") and '"course_id"' in prompt:
+        # Recommendation prompts list their candidates as "- id: title"
+        candidates = re.findall(r"^- (\S+): ", prompt, re.MULTILINE)
+        match = re.search(r"Pick up to (\d+) ", prompt)
+        count = int(match.group(1)) if match else 3
+        return json.dumps([{"course_id": c, "reason": "Stub reason."} for c in candidates[:count]])
+    if prompt.rstrip().endswith("JSON:"):
+        match = re.search(r"Write (\d+) ", prompt)
+        count = int(match.group(1)) if match else 1
+        questions = [{
+            "question": f"Stub practice question {i + 1}?",
+            "options": ["First option", "Second option", "Third option", "Fourth option"],
+            "correct_answer": i % 4,
+            "explanation": "Stub explanation."
+        } for i in range(count)]
+        return json.dumps(questions)
+    # Roughly one token per word, so the output length follows max_new_tokens
+    seed = sum(prompt.encode("utf-8")) % len(STUB_WORDS)
+    length = max(1, min(max_new_tokens, 64))
+    words = [STUB_WORDS[(seed + i) % len(STUB_WORDS)] for i in range(length)]
+    return "Stub answer: " + " ".join(words) + "."
+
+class StubHandler(BaseHTTPRequestHandler):
+    state = None  # set per server by start_stub_server
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/stats":
+            with self.state.lock:
+                stats = dict(self.state.stats, in_flight=self.state.in_flight)
+            self._send_json(200, stats)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        state = self.state
+        config = state.config
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "Request body is not valid JSON"})
+            return
+        state.count("requests")
+
+        remaining = state.loading_remaining()
+        if remaining > 0:
+            if not (body.get("options") or {}).get("wait_for_model"):
+                state.count("loading")
+                self._send_json(503, {
+                    "error": f"Model {config.model_id} is currently loading",
+                    "estimated_time": round(remaining, 1)
+                })
+                return
+            time.sleep(remaining)
+
+        if not state.admit():
+            state.count("rate_limited")
+            self._send_json(429, {"error": "Rate limit reached. Please retry later."}, {"Retry-After": "1"})
+            return
+        try:
+            self._generate(body)
+        finally:
+            state.leave()
+
+    def _generate(self, body):
+        state = self.state
+        config = state.config
+        parameters = body.get("parameters") or {}
+        max_new_tokens = int(parameters.get("max_new_tokens", 20))
+        inputs = body.get("inputs", "")
+        prompts = inputs if isinstance(inputs, list) else [inputs]
+
+        time.sleep(state.draw_latency())
+        if state.draw_error():
+            state.count("errors")
+            self._send_json(config.error_status, {"error": "Injected stub failure"})
+            return
+
+        completions = [stub_completion(str(prompt), max_new_tokens) for prompt in prompts]
+        if body.get("stream"):
+            self._stream(completions[0])
+            return
+
+        # The hosted text-generation task echoes the prompt unless return_full_text is false
+        full_text = parameters.get("return_full_text", True)
+        outputs = [
+            {"generated_text": (str(prompt) if full_text else "") + completion}
+            for prompt, completion in zip(prompts, completions)
+        ]
+        if config.per_token_ms:
+            time.sleep(sum(len(c.split()) for c in completions) * config.per_token_ms / 1000.0)
+        state.count("ok")
+        self._send_json(200, outputs)
+
+    def _stream(self, completion):
+        """Server-sent events, one per word, ending with the full generated_text"""
+        state = self.state
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        words = completion.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            event = {
+                "token": {"id": i, "text": word if i == 0 else " " + word, "logprob": 0.0, "special": False},
+                "generated_text": completion if last else None,
+                "details": None
+            }
+            self.wfile.write(f"data:{json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            if state.config.per_token_ms:
+                time.sleep(state.config.per_token_ms / 1000.0)
+        state.count("ok")
+        state.count("streamed")
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer:
+    """A running stub; use granite_model() in place of initialize_granite_model()"""
+
+    def __init__(self, server, state):
+        self.server = server
+        self.state = state
+        self.url = f"http://127.0.0.1:{server.server_port}/models/{state.config.model_id}"
+
+    def granite_model(self):
+        return {"api_url": self.url, "headers": {"Authorization": "Bearer stub"}, "model_name": self.state.config.model_id}
+
+    def stats(self):
+        with self.state.lock:
+            return dict(self.state.stats, in_flight=self.state.in_flight)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    """Serve the stub on a daemon thread (port 0 picks a free port)"""
+    state = StubState(config or StubConfig())
+    handler = type("BoundStubHandler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-inference", daemon=True).start()
+    return StubServer(server, state)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", default="fixed:50", help="fixed:MS, uniform:LO,HI, normal:MEAN,SD, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+    parser.add_argument("--per-token-ms", type=float, default=0.0, help="extra delay per generated word")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--max-concurrency", type=int, default=0, help="requests beyond this many in flight get 429")
+    parser.add_argument("--rps", type=float, default=0.0, help="requests per second before 429")
+    parser.add_argument("--cold-start-ms", type=float, default=0.0, help="answer 503 loading for this long after start")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.latency, per_token_ms=args.per_token_ms, error_rate=args.error_rate,
+        error_status=args.error_status, max_concurrency=args.max_concurrency, rps=args.rps,
+        cold_start_ms=args.cold_start_ms, seed=args.seed
+    )
+    stub = start_stub_server(config, args.host, args.port)
+    print(f"Stub inference server on {stub.url} (stats at /stats); Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+if __name__ == "__main__":
+    main()
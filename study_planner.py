@@ -0,0 +1,215 @@
+"""
+Study plan scheduler for the Task Planner
+
+Assigns a user's open tasks to days so that each day's planned minutes stay
+within the time they have available, higher-priority tasks and earlier
+deadlines first. The default packer is an earliest-deadline, priority-ordered
+first fit over a per-day capacity array, which plans hundreds of tasks in
+milliseconds. Small instances can instead be solved exactly as an integer
+program with scipy's milp (maximizing the priority-weighted minutes planned,
+earlier days preferred), falling back to the heuristic when it is
+unavailable or does not finish in time.
+
+Recurring occurrences are not moved: their minutes count against the day's
+capacity. A rebalance keeps every task that still fits where it is and only
+re-places the ones that no longer do (overdue, past their deadline or on an
+overbooked day). Plans are written back with one bulk update.
+"""
+
+import time
+import numpy as np
+import pymongo
+from datetime import datetime, timedelta
+from tasks import day_start, get_tasks_in_range
+
+try:
+    from scipy.optimize import Bounds, LinearConstraint, milp
+except ImportError:  # scipy < 1.9
+    milp = None
+
+PRIORITY_WEIGHTS = {"High": 3, "Medium": 2, "Low": 1}
+DEFAULT_DAILY_MINUTES = 120
+PLAN_DAYS = 7
+OVERDUE_DAYS = 14            # open tasks this far in the past are pulled into the plan
+ILP_MAX_VARIABLES = 2000     # task-day pairs; larger plans always use the heuristic
+ILP_TIME_LIMIT = 2.0         # seconds
+EARLY_DAY_BONUS = 0.01       # per day, so the exact plan prefers earlier days among equal-value plans
+
+def get_study_minutes(db, user_id):
+    """Minutes the user can study on each weekday (Monday first)"""
+    user = db["users"].find_one({"_id": user_id}, {"preferences": 1}) or {}
+    minutes = user.get("preferences", {}).get("study_minutes")
+    return list(minutes) if minutes and len(minutes) == 7 else [DEFAULT_DAILY_MINUTES] * 7
+
+def set_study_minutes(db, user_id, minutes):
+    """Store the user's available minutes per weekday (Monday first)"""
+    db["users"].update_one({"_id": user_id}, {"$set": {"preferences.study_minutes": [int(m) for m in minutes]}})
+
+def auto_schedule_enabled(db, user_id):
+    """Whether the user wants their plan rebalanced whenever their tasks change"""
+    user = db["users"].find_one({"_id": user_id}, {"preferences": 1}) or {}
+    return bool(user.get("preferences", {}).get("auto_schedule", False))
+
+def set_auto_schedule(db, user_id, enabled):
+    db["users"].update_one({"_id": user_id}, {"$set": {"preferences.auto_schedule": bool(enabled)}})
+
+def daily_capacity(study_minutes, start, days):
+    """Available minutes for each of the days from start, from the per-weekday minutes"""
+    start = day_start(start)
+    return np.array([study_minutes[(start + timedelta(days=i)).weekday()] for i in range(days)], dtype=float)
+
+def _task_arrays(tasks, start, days):
+    """Minutes, priority weights, latest allowed day index and current day index for each task"""
+    minutes = np.array([t.get("time_estimate", 0) or 0 for t in tasks], dtype=float)
+    weights = np.array([PRIORITY_WEIGHTS.get(t.get("priority"), 1) for t in tasks], dtype=float)
+    # A deadline before the plan (already missed) makes the task as urgent as possible
+    latest = np.array([
+        min(max((day_start(t["deadline"]) - start).days, 0), days - 1) if t.get("deadline") else days - 1
+        for t in tasks
+    ], dtype=int)
+    current = np.array([(t["day"] - start).days if t.get("day") else -1 for t in tasks], dtype=int)
+    return minutes, weights, latest, current
+
+def _order(minutes, weights, latest):
+    """Earliest deadline first, then higher priority, then longer tasks (which are harder to fit)"""
+    return np.lexsort((-minutes, -weights, latest))
+
+def _first_fit(order, minutes, latest, remaining):
+    """Place tasks in order on the first day up to their deadline with room; -1 if none has room"""
+    days = np.full(len(minutes), -1, dtype=int)
+    for i in order:
+        fits = np.flatnonzero(remaining[:latest[i] + 1] >= minutes[i])
+        if len(fits):
+            days[i] = fits[0]
+            remaining[fits[0]] -= minutes[i]
+    return days
+
+def _solve_exact(minutes, weights, latest, remaining, time_limit):
+    """Exact assignment with milp, or None if it is unavailable or does not find a plan"""
+    n, days = len(minutes), len(remaining)
+    # One binary variable per allowed (task, day) pair
+    pairs = [(i, d) for i in range(n) for d in range(latest[i] + 1)]
+    if milp is None or not pairs or len(pairs) > ILP_MAX_VARIABLES:
+        return None
+    task_index = np.array([p[0] for p in pairs])
+    day_index = np.array([p[1] for p in pairs])
+    value = weights[task_index] * minutes[task_index] * (1 - EARLY_DAY_BONUS * day_index)
+
+    each_task = np.zeros((n, len(pairs)))
+    each_task[task_index, np.arange(len(pairs))] = 1
+    each_day = np.zeros((days, len(pairs)))
+    each_day[day_index, np.arange(len(pairs))] = minutes[task_index]
+
+    result = milp(
+        c=-value,
+        constraints=[LinearConstraint(each_task, 0, 1), LinearConstraint(each_day, -np.inf, np.maximum(remaining, 0))],
+        integrality=np.ones(len(pairs)),
+        bounds=Bounds(0, 1),
+        options={"time_limit": time_limit}
+    )
+    if result.x is None:
+        return None
+    assigned = np.full(n, -1, dtype=int)
+    chosen = result.x > 0.5
+    assigned[task_index[chosen]] = day_index[chosen]
+    return assigned
+
+def schedule(tasks, capacity, start, fixed_minutes=None, exact=False, time_limit=ILP_TIME_LIMIT):
+    """Assign tasks to the days from start, ignoring where they are now
+
+    capacity holds the available minutes per day and fixed_minutes the
+    minutes already taken on each day by tasks that are not moved. Returns
+    a plan dict: assignments ({task _id: day}), unscheduled (ids that fit on
+    no day up to their deadline), load (planned minutes per day) and method.
+    """
+    start = day_start(start)
+    remaining = np.asarray(capacity, dtype=float) - (0 if fixed_minutes is None else np.asarray(fixed_minutes, dtype=float))
+    minutes, weights, latest, _ = _task_arrays(tasks, start, len(remaining))
+
+    assigned, method = None, "greedy"
+    if exact:
+        assigned = _solve_exact(minutes, weights, latest, remaining.copy(), time_limit)
+        method = "exact" if assigned is not None else method
+    if assigned is None:
+        assigned = _first_fit(_order(minutes, weights, latest), minutes, latest, remaining.copy())
+    return _plan(tasks, assigned, minutes, capacity, fixed_minutes, start, method)
+
+def rebalance(tasks, capacity, start, fixed_minutes=None):
+    """Keep tasks that still fit on their current day and re-place only the rest
+
+    Higher-priority, earlier-deadline tasks keep their day first when a day
+    is overbooked. Returns a plan like schedule().
+    """
+    start = day_start(start)
+    remaining = np.asarray(capacity, dtype=float) - (0 if fixed_minutes is None else np.asarray(fixed_minutes, dtype=float))
+    minutes, weights, latest, current = _task_arrays(tasks, start, len(remaining))
+
+    assigned = np.full(len(tasks), -1, dtype=int)
+    moved = []
+    for i in _order(minutes, weights, latest):
+        day = current[i]
+        if 0 <= day <= latest[i] and remaining[day] >= minutes[i]:
+            assigned[i] = day
+            remaining[day] -= minutes[i]
+        else:
+            moved.append(i)
+    if moved:
+        moved = np.array(moved)
+        assigned[moved] = _first_fit(np.arange(len(moved)), minutes[moved], latest[moved], remaining)
+    return _plan(tasks, assigned, minutes, capacity, fixed_minutes, start, "incremental")
+
+def _plan(tasks, assigned, minutes, capacity, fixed_minutes, start, method):
+    load = np.zeros(len(capacity)) if fixed_minutes is None else np.asarray(fixed_minutes, dtype=float).copy()
+    np.add.at(load, assigned[assigned >= 0], minutes[assigned >= 0])
+    return {
+        "assignments": {t["_id"]: start + timedelta(days=int(d)) for t, d in zip(tasks, assigned) if d >= 0},
+        "unscheduled": [t["_id"] for t, d in zip(tasks, assigned) if d < 0],
+        "load": load,
+        "capacity": np.asarray(capacity, dtype=float),
+        "start": start,
+        "method": method
+    }
+
+def plan_tasks(db, user_id, start=None, days=PLAN_DAYS, exact=False, incremental=False):
+    """Plan a user's open tasks over the days from start (today by default)
+
+    Open tasks planned in the window or up to OVERDUE_DAYS before it are
+    scheduled; recurring occurrences in the window only take up capacity.
+    Returns (plan, tasks) without writing anything.
+    """
+    start = day_start(start or datetime.now())
+    end = start + timedelta(days=days)
+    open_tasks = get_tasks_in_range(db, user_id, start - timedelta(days=OVERDUE_DAYS), end, completed=False)
+
+    movable = [t for t in open_tasks if not t.get("recurring")]
+    fixed_minutes = np.zeros(days)
+    for task in open_tasks:
+        if task.get("recurring") and task["day"] >= start:
+            fixed_minutes[(task["day"] - start).days] += task.get("time_estimate", 0) or 0
+
+    capacity = daily_capacity(get_study_minutes(db, user_id), start, days)
+    begin = time.perf_counter()
+    if incremental:
+        plan = rebalance(movable, capacity, start, fixed_minutes)
+    else:
+        plan = schedule(movable, capacity, start, fixed_minutes, exact=exact)
+    plan["elapsed_ms"] = (time.perf_counter() - begin) * 1000
+    return plan, movable
+
+def apply_plan(db, plan, tasks):
+    """Move the tasks whose planned day changed, in one bulk update; returns the number moved"""
+    requests = [
+        pymongo.UpdateOne({"_id": task["_id"], "completed": {"$ne": True}}, {"$set": {"day": plan["assignments"][task["_id"]]}})
+        for task in tasks
+        if task["_id"] in plan["assignments"] and plan["assignments"][task["_id"]] != task.get("day")
+    ]
+    if not requests:
+        return 0
+    return db["user_tasks"].bulk_write(requests, ordered=False).modified_count
+
+def rebalance_tasks(db, user_id):
+    """Incrementally rebalance the user's plan if they enabled automatic scheduling; returns the number moved"""
+    if not auto_schedule_enabled(db, user_id):
+        return 0
+    plan, tasks = plan_tasks(db, user_id, incremental=True)
+    return apply_plan(db, plan, tasks)
@@ -0,0 +1,231 @@
+"""
+Summarization engine for the SmartLearn Platform
+
+Provides a fast extractive path (TF-IDF sentence vectors ranked with TextRank,
+or by similarity to the document centroid for very long inputs) and an optional
+Granite map-reduce path that summarizes chunks in parallel and merges them.
+The Granite calls run on the shared async client under the requesting user's
+fair-queue flow, and calls still running when the latency budget expires are
+cancelled so they stop holding a Granite slot. Summaries are cached by content
+hash so re-opening a material is instant.
+"""
+
+import os
+import re
+import time
+import zlib
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from granite_model import current_user, run_async
+from prompts import acomplete
+from retrieval import chunk_text
+
+SUMMARY_BUDGET_MS = int(os.getenv("SUMMARY_BUDGET_MS", "8000"))
+SUMMARY_CACHE_SIZE = 256
+HASH_FEATURES = 2048
+TEXTRANK_MAX_SENTENCES = 1500   # above this, rank by centroid similarity instead of the O(n^2) graph
+MAP_CHUNK_CHARS = 3000
+MAP_MAX_CHUNKS = 8
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def split_sentences(text):
+    """Split text into sentences, dropping empty fragments"""
+    return [s.strip() for s in _SENTENCE_RE.split(text or "") if s and s.strip()]
+
+def _sentence_terms(sentences):
+    """TF-IDF weighted, L2-normalised hashed terms in coordinate form
+
+    Returns (rows, cols, weights) with one entry per distinct term of each
+    sentence, so memory stays linear in the length of the text.
+    """
+    rows, cols = [], []
+    for i, sentence in enumerate(sentences):
+        tokens = [t for t in _TOKEN_RE.findall(sentence.lower()) if t not in _STOPWORDS]
+        rows.extend([i] * len(tokens))
+        cols.extend(zlib.crc32(t.encode()) % HASH_FEATURES for t in tokens)
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0, dtype=np.float64)
+
+    # Collapse repeated terms within a sentence into counts
+    keys, counts = np.unique(np.asarray(rows, dtype=np.int64) * HASH_FEATURES + np.asarray(cols), return_counts=True)
+    rows, cols = keys // HASH_FEATURES, keys % HASH_FEATURES
+
+    document_frequency = np.bincount(cols, minlength=HASH_FEATURES)
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1.0
+    weights = counts * idf[cols]
+
+    norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=len(sentences)))
+    norms[norms == 0] = 1.0
+    return rows, cols, weights / norms[rows]
+
+def _textrank(matrix, damping=0.85, iterations=30, tolerance=1e-6):
+    """PageRank over the cosine-similarity graph of sentences"""
+    similarity = matrix @ matrix.T
+    np.fill_diagonal(similarity, 0.0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    out_weight[out_weight == 0] = 1.0
+    transition = similarity / out_weight
+
+    n = matrix.shape[0]
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(iterations):
+        updated = (1 - damping) / n + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < tolerance:
+            return updated
+        scores = updated
+    return scores
+
+def score_sentences(sentences):
+    """Importance score for each sentence"""
+    n = len(sentences)
+    rows, cols, weights = _sentence_terms(sentences)
+    if n <= TEXTRANK_MAX_SENTENCES:
+        matrix = np.zeros((n, HASH_FEATURES), dtype=np.float32)
+        matrix[rows, cols] = weights
+        return _textrank(matrix)
+
+    # Linear-time fallback for very long documents: similarity to the centroid
+    centroid = np.bincount(cols, weights=weights, minlength=HASH_FEATURES) / n
+    return np.bincount(rows, weights=weights * centroid[cols], minlength=n)
+
+def extractive_summary(text, max_length=500):
+    """Pick the highest-scoring sentences that fit in max_length characters, in document order"""
+    sentences = split_sentences(text)
+    if not sentences:
+        return ""
+    if len(text) <= max_length:
+        return text.strip()
+
+    scores = score_sentences(sentences)
+    chosen = []
+    used = 0
+    for index in np.argsort(-scores):
+        length = len(sentences[index]) + 1
+        if used + length > max_length:
+            continue
+        chosen.append(index)
+        used += length
+        if used >= max_length * 0.9:
+            break
+
+    if not chosen:
+        # Every sentence is longer than the budget; truncate the best one
+        return sentences[int(np.argmax(scores))][:max_length].rstrip() + "..."
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+def key_takeaways(text, count=3):
+    """Top-ranked sentences of the text, in document order"""
+    sentences = split_sentences(text)
+    if len(sentences) <= count:
+        return sentences
+    scores = score_sentences(sentences)
+    top = np.argsort(-scores)[:count]
+    return [sentences[i] for i in sorted(top)]
+
+async def _agranite_summary(granite_model, text, max_length, user):
+    response, _ = await acomplete(
+        granite_model, "summary", max_new_tokens=max(64, max_length // 3), user=user, text=text, max_length=max_length
+    )
+    if not response or response.startswith("Error"):
+        return None
+    return response.strip()
+
+async def _agranite_summaries(granite_model, texts, max_length, user, deadline):
+    """Granite summaries of texts, None for calls that failed or missed the deadline (those are cancelled)"""
+    tasks = [asyncio.ensure_future(_agranite_summary(granite_model, text, max_length, user)) for text in texts]
+    done, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+    for task in pending:
+        task.cancel()
+    return [task.result() if task in done and task.exception() is None else None for task in tasks]
+
+def abstractive_summary(granite_model, text, max_length=500, budget_ms=SUMMARY_BUDGET_MS, user=None):
+    """Granite map-reduce summary within a latency budget
+
+    Returns (summary, complete). Chunks whose map call misses the deadline fall
+    back to their extractive summary, and the reduce step is skipped if there is
+    no time left for it, in which case complete is False. The calls are queued
+    under user (the current session's user by default).
+    """
+    deadline = time.monotonic() + budget_ms / 1000.0
+    user = user or current_user()
+
+    # Cap the fan-out: very long inputs are first condensed extractively
+    if len(text) > MAP_CHUNK_CHARS * MAP_MAX_CHUNKS:
+        text = extractive_summary(text, MAP_CHUNK_CHARS * MAP_MAX_CHUNKS)
+    chunks = chunk_text(text, chunk_size=MAP_CHUNK_CHARS, overlap=0)
+    if not chunks:
+        return "", True
+    per_chunk_length = max(200, (max_length * 2) // len(chunks))
+
+    complete = True
+    partials = []
+    results = run_async(_agranite_summaries(granite_model, chunks, per_chunk_length, user, deadline))
+    for result, chunk in zip(results, chunks):
+        if result is None:
+            complete = False
+            result = extractive_summary(chunk, per_chunk_length)
+        partials.append(result)
+
+    merged = "\n".join(partials)
+    if len(partials) == 1 and len(merged) <= max_length:
+        return merged, complete
+
+    # Reduce step: merge the partial summaries if the budget still allows it
+    if time.monotonic() < deadline:
+        reduced = run_async(_agranite_summaries(granite_model, [merged], max_length, user, deadline))[0]
+        if reduced:
+            return reduced, complete
+
+    return extractive_summary(merged, max_length), False
+
+def _cache_key(content, max_length, mode):
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return f"{digest}:{max_length}:{mode}"
+
+def summarize(content, max_length=500, granite_model=None, budget_ms=SUMMARY_BUDGET_MS, user=None):
+    """Summarize content, using Granite when a model is given and the extractive path otherwise
+
+    Returns a dict with the summary, key takeaways, the method used and the
+    elapsed time in milliseconds.
+    """
+    mode = "granite" if granite_model else "extractive"
+    key = _cache_key(content, max_length, mode)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return dict(_cache[key], cached=True)
+
+    start = time.perf_counter()
+    complete = True
+    if granite_model:
+        summary, complete = abstractive_summary(granite_model, content, max_length, budget_ms, user)
+    else:
+        summary = extractive_summary(content, max_length)
+
+    result = {
+        "summary": summary,
+        "takeaways": key_takeaways(summary if granite_model else content),
+        "method": mode if complete else "extractive-fallback",
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+        "cached": False
+    }
+
+    # Summaries degraded by the latency budget are not cached so a later call can do better
+    if complete:
+        with _cache_lock:
+            _cache[key] = result
+            while len(_cache) > SUMMARY_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
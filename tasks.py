@@ -0,0 +1,473 @@
+"""
+Task service for the Task Planner
+
+Every write to user_tasks goes through this module so that a per-user
+rollup in task_stats stays in step with it: totals, completed counts and
+minutes overall, per task type and per week of completion. The history view
+reads that one document plus an indexed "recently completed" query, so its
+cost does not grow with the number of tasks a user has ever created.
+
+Tasks are planned for a day, stored as a native datetime at midnight in the
+day field, so calendar views are single range scans over the (user_id, day)
+index.
+
+Recurring tasks are stored once, as rules in task_rules (an RRULE plus the
+task fields), and expanded into occurrences only for the range being viewed.
+An occurrence becomes a real task when it is completed; deleting one records
+its day on the rule so it is skipped from then on.
+"""
+
+import pymongo
+import pandas as pd
+from bson import ObjectId
+from collections import Counter
+from datetime import datetime, timedelta
+from dateutil.rrule import DAILY, rrule, rrulestr
+
+TREND_WEEKS = 12      # weeks shown in the completion trend
+RECENT_LIMIT = 10
+MIGRATION_BATCH_SIZE = 1000
+DAY_MIGRATION_ID = "user_tasks_day"
+
+# Fields a recurring rule copies into each occurrence
+TASK_FIELDS = ("name", "priority", "time_estimate", "task_type", "notes")
+REPEAT_PRESETS = {
+    "Daily": "FREQ=DAILY",
+    "Weekdays": "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR",
+    "Weekly": "FREQ=WEEKLY",
+    "Monthly": "FREQ=MONTHLY"
+}
+OCCURRENCE_PREFIX = "rule:"
+
+def day_start(value):
+    """Midnight at the start of a date or datetime's day"""
+    return datetime(value.year, value.month, value.day)
+
+def week_start(moment):
+    """Monday of the week a datetime falls in, as a YYYY-MM-DD string"""
+    return (moment - timedelta(days=moment.weekday())).strftime("%Y-%m-%d")
+
+def completion_time(task):
+    """When a task was completed; tasks completed before completed_at existed fall back to their planned day"""
+    return task.get("completed_at") or task.get("day") or task.get("created_at") or datetime.now()
+
+# ---------------------------------------------------------------------------
+# Rollups
+# ---------------------------------------------------------------------------
+
+def _contribution(task):
+    """What one task adds to its user's rollup, as dotted $inc paths"""
+    task_type = task.get("task_type", "Other")
+    minutes = task.get("time_estimate", 0) or 0
+    counts = {"total": 1, f"types.{task_type}.total": 1}
+    if task.get("completed", False):
+        week = week_start(completion_time(task))
+        counts.update({
+            "completed": 1,
+            "completed_minutes": minutes,
+            f"types.{task_type}.completed": 1,
+            f"types.{task_type}.minutes": minutes,
+            f"weeks.{week}.completed": 1,
+            f"weeks.{week}.minutes": minutes
+        })
+    return counts
+
+def _update_rollups(db, changes, exact=True):
+    """Apply task changes to their owners' rollups in one bulk write
+
+    changes are (before, after) pairs, with None for an inserted or deleted
+    task. When exact is False some of the writes did not apply (e.g. a task
+    was completed concurrently), so the affected rollups are rebuilt instead.
+    """
+    deltas = {}
+    for before, after in changes:
+        task = after or before
+        delta = deltas.setdefault(task["user_id"], Counter())
+        if after:
+            delta.update(_contribution(after))
+        if before:
+            delta.subtract(_contribution(before))
+
+    if not exact:
+        for user_id in deltas:
+            rebuild_task_stats(db, user_id)
+        return
+
+    now = datetime.now()
+    # No upsert: a user without a rollup gets one built from their tasks on first read
+    requests = [
+        pymongo.UpdateOne({"_id": user_id}, {"$inc": {k: v for k, v in delta.items() if v}, "$set": {"updated_at": now}})
+        for user_id, delta in deltas.items()
+        if any(delta.values())
+    ]
+    if requests:
+        db["task_stats"].bulk_write(requests, ordered=False)
+
+def rebuild_task_stats(db, user_id):
+    """Recompute a user's rollup from all of their tasks (one pass, projected to the counted fields)"""
+    totals = Counter()
+    cursor = db["user_tasks"].find(
+        {"user_id": user_id},
+        {"task_type": 1, "time_estimate": 1, "completed": 1, "completed_at": 1, "day": 1, "created_at": 1}
+    )
+    for task in cursor:
+        totals.update(_contribution(task))
+
+    stats = {"_id": user_id, "total": 0, "completed": 0, "completed_minutes": 0, "types": {}, "weeks": {}}
+    for path, value in totals.items():
+        parts = path.split(".")
+        target = stats
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    stats["updated_at"] = datetime.now()
+    db["task_stats"].replace_one({"_id": user_id}, stats, upsert=True)
+    return stats
+
+def get_task_stats(db, user_id):
+    """A user's task rollup, built on first use"""
+    stats = db["task_stats"].find_one({"_id": user_id})
+    return stats if stats is not None else rebuild_task_stats(db, user_id)
+
+# ---------------------------------------------------------------------------
+# Task writes
+# ---------------------------------------------------------------------------
+
+def _new_task(task):
+    task["day"] = day_start(task.get("day") or datetime.now())
+    task.setdefault("completed", False)
+    task.setdefault("created_at", datetime.now())
+    return task
+
+def add_task(db, task):
+    """Insert a task and count it in the owner's rollup"""
+    result = db["user_tasks"].insert_one(_new_task(task))
+    _update_rollups(db, [(None, task)])
+    return result.inserted_id
+
+def add_tasks(db, tasks):
+    """Insert several tasks with one bulk write; returns how many were inserted"""
+    tasks = [_new_task(task) for task in tasks]
+    if not tasks:
+        return 0
+    result = db["user_tasks"].bulk_write([pymongo.InsertOne(task) for task in tasks], ordered=False)
+    _update_rollups(db, [(None, task) for task in tasks])
+    return result.inserted_count
+
+def complete_task(db, task_id):
+    """Mark a task completed now; returns the task, or None if it was missing or already completed"""
+    if is_occurrence(task_id):
+        occurrence = get_occurrence(db, task_id)
+        if occurrence is None or not complete_tasks(db, [task_id]):
+            return None
+        # The occurrence is now a stored task; return that rather than the open occurrence
+        return db["user_tasks"].find_one({"user_id": occurrence["user_id"], "rule_id": occurrence["rule_id"], "day": occurrence["day"]})
+    completed_at = datetime.now()
+    # Matching only open tasks makes a repeated click a no-op instead of a double count
+    task = db["user_tasks"].find_one_and_update(
+        {"_id": task_id, "completed": {"$ne": True}},
+        {"$set": {"completed": True, "completed_at": completed_at}}
+    )
+    if task:
+        _update_rollups(db, [(task, dict(task, completed=True, completed_at=completed_at))])
+    return task
+
+def complete_tasks(db, task_ids):
+    """Mark several tasks (or recurring occurrences) completed with one bulk write; returns how many changed"""
+    completed_at = datetime.now()
+    task_ids, occurrence_ids = _split_ids(task_ids)
+    requests, changes = [], []
+
+    if task_ids:
+        for task in db["user_tasks"].find({"_id": {"$in": task_ids}, "completed": {"$ne": True}}):
+            requests.append(pymongo.UpdateOne(
+                {"_id": task["_id"], "completed": {"$ne": True}},
+                {"$set": {"completed": True, "completed_at": completed_at}}
+            ))
+            changes.append((task, dict(task, completed=True, completed_at=completed_at)))
+
+    # Completing an occurrence stores it as a real task; the upsert keeps that to one task per rule and day
+    for occurrence in _load_occurrences(db, occurrence_ids):
+        task = dict(occurrence, completed=True, completed_at=completed_at, created_at=completed_at)
+        task.pop("_id")
+        key = {"user_id": task["user_id"], "rule_id": task["rule_id"], "day": task["day"]}
+        requests.append(pymongo.UpdateOne(
+            key,
+            {"$setOnInsert": {k: v for k, v in task.items() if k not in key}},
+            upsert=True
+        ))
+        changes.append((None, task))
+
+    if not requests:
+        return 0
+    result = db["user_tasks"].bulk_write(requests, ordered=False)
+    changed = result.modified_count + result.upserted_count
+    _update_rollups(db, changes, exact=changed == len(requests))
+    return changed
+
+def delete_task(db, task_id):
+    """Delete a task and remove it from the owner's rollup; returns the deleted task or None"""
+    if is_occurrence(task_id):
+        occurrence = get_occurrence(db, task_id)
+        delete_tasks(db, [task_id])
+        return occurrence
+    task = db["user_tasks"].find_one_and_delete({"_id": task_id})
+    if task:
+        _update_rollups(db, [(task, None)])
+        if task.get("rule_id") is not None:
+            # A stored occurrence; skip its day so the rule doesn't bring it back as an open task
+            db["task_rules"].update_one({"_id": task["rule_id"]}, {"$addToSet": {"skip_days": task["day"]}})
+    return task
+
+def delete_tasks(db, task_ids):
+    """Delete several tasks with one bulk write; recurring occurrences are skipped on their rule instead
+
+    Stored occurrences (completed ones) are deleted and their day skipped as
+    well, so they don't reappear as open occurrences. Returns how many tasks
+    and occurrences were removed.
+    """
+    task_ids, occurrence_ids = _split_ids(task_ids)
+    deleted = 0
+    skipped = {}
+
+    if task_ids:
+        tasks = list(db["user_tasks"].find({"_id": {"$in": task_ids}}))
+        if tasks:
+            result = db["user_tasks"].bulk_write([pymongo.DeleteOne({"_id": task["_id"]}) for task in tasks], ordered=False)
+            _update_rollups(db, [(task, None) for task in tasks], exact=result.deleted_count == len(tasks))
+            deleted += result.deleted_count
+            for task in tasks:
+                if task.get("rule_id") is not None:
+                    skipped.setdefault(task["rule_id"], []).append(task["day"])
+
+    occurrences = _load_occurrences(db, occurrence_ids)
+    for occurrence in occurrences:
+        skipped.setdefault(occurrence["rule_id"], []).append(occurrence["day"])
+    if skipped:
+        db["task_rules"].bulk_write([
+            pymongo.UpdateOne({"_id": rule_id}, {"$addToSet": {"skip_days": {"$each": days}}})
+            for rule_id, days in skipped.items()
+        ], ordered=False)
+        deleted += len(occurrences)
+    return deleted
+
+def copy_tasks(db, user_id, source_start, days, target_start):
+    """Copy the tasks planned over days days from source_start to the same weekdays from target_start
+
+    Copies are new open tasks; recurring occurrences are not copied since
+    their rule already covers the target days. Returns the number of copies.
+    """
+    offset = day_start(target_start) - day_start(source_start)
+    source = get_tasks_in_range(db, user_id, source_start, day_start(source_start) + timedelta(days=days), recurring=False)
+    now = datetime.now()
+    copies = [
+        dict({field: task.get(field) for field in TASK_FIELDS}, user_id=user_id, day=task["day"] + offset, completed=False, created_at=now)
+        for task in source
+    ]
+    return add_tasks(db, copies)
+
+# ---------------------------------------------------------------------------
+# Calendar queries
+# ---------------------------------------------------------------------------
+
+def get_tasks_in_range(db, user_id, start, end, completed=None, recurring=True):
+    """A user's tasks planned from start up to (not including) end, in day order
+
+    start and end are dates or datetimes; only their day counts. Pass
+    completed=False or True to fetch only open or only completed tasks.
+    With recurring, open occurrences of the user's recurring rules are
+    included too (they have an occurrence id in _id and a rule_id).
+    """
+    start, end = day_start(start), day_start(end)
+    query = {"user_id": user_id, "day": {"$gte": start, "$lt": end}}
+    rules = _active_rules(db, user_id, start, end) if recurring and completed is not True else []
+    if completed is not None and not rules:
+        query["completed"] = completed
+    tasks = list(db["user_tasks"].find(query).sort("day", pymongo.ASCENDING))
+
+    if rules:
+        # Completed occurrences are real tasks now and replace their virtual counterpart
+        stored = {(task.get("rule_id"), task["day"]) for task in tasks if task.get("rule_id") is not None}
+        tasks.extend(o for o in expand_rules(rules, start, end) if (o["rule_id"], o["day"]) not in stored)
+        tasks.sort(key=lambda task: task["day"])
+        if completed is not None:
+            tasks = [task for task in tasks if task.get("completed", False) == completed]
+    return tasks
+
+def group_by_day(tasks, start, days):
+    """{day: [tasks]} for each of the days from start, including days without tasks"""
+    first = day_start(start)
+    grouped = {first + timedelta(days=i): [] for i in range(days)}
+    for task in tasks:
+        grouped.setdefault(task["day"], []).append(task)
+    return grouped
+
+# ---------------------------------------------------------------------------
+# Recurring tasks
+# ---------------------------------------------------------------------------
+
+def parse_rule(rule, start):
+    """Parse an RRULE string (e.g. FREQ=WEEKLY;BYDAY=MO,WE) starting on start's day
+
+    Raises ValueError for invalid rules and for rules that repeat more often
+    than daily, including daily rules with several times of day (BYHOUR,
+    BYMINUTE, BYSECOND) and rule sets.
+    """
+    try:
+        parsed = rrulestr(rule.strip(), dtstart=day_start(start))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid repeat rule: {e}") from e
+    if not isinstance(parsed, rrule):
+        raise ValueError("Only a single repeat rule is supported")
+    parts = {part.split("=", 1)[0].strip().upper() for part in rule.strip().upper().removeprefix("RRULE:").split(";")}
+    if parsed._freq > DAILY or parts & {"BYHOUR", "BYMINUTE", "BYSECOND"}:
+        raise ValueError("Tasks can repeat at most once a day")
+    return parsed
+
+def add_rule(db, user_id, task, rule, start, until=None):
+    """Store a recurring task; task holds the TASK_FIELDS and until is the last day (inclusive) or None"""
+    parse_rule(rule, start)
+    document = {field: task.get(field) for field in TASK_FIELDS}
+    document.update({
+        "user_id": user_id,
+        "rule": rule.strip(),
+        "start": day_start(start),
+        # Stored even when open-ended so the range query can match it
+        "until": day_start(until) if until else None,
+        "skip_days": [],
+        "created_at": datetime.now()
+    })
+    return db["task_rules"].insert_one(document).inserted_id
+
+def get_rules(db, user_id):
+    """A user's recurring task rules, oldest first"""
+    return list(db["task_rules"].find({"user_id": user_id}).sort("created_at", pymongo.ASCENDING))
+
+def delete_rule(db, rule_id):
+    """Stop a recurring task; occurrences already completed stay in the history"""
+    return db["task_rules"].delete_one({"_id": rule_id}).deleted_count
+
+def _active_rules(db, user_id, start, end):
+    return list(db["task_rules"].find({
+        "user_id": user_id,
+        "start": {"$lt": end},
+        "$or": [{"until": None}, {"until": {"$gte": start}}]
+    }))
+
+def expand_rules(rules, start, end):
+    """Open occurrences of rules on the days from start up to (not including) end"""
+    occurrences = []
+    for rule in rules:
+        last = min(end, rule["until"] + timedelta(days=1)) if rule.get("until") else end
+        first = max(start, rule["start"])
+        if first >= last:
+            continue
+        try:
+            # Not parse_rule, so rules stored before it tightened still expand
+            days = rrulestr(rule["rule"], dtstart=rule["start"]).between(first, last - timedelta(seconds=1), inc=True)
+        except (ValueError, TypeError):
+            continue
+        skipped = set(rule.get("skip_days", []))
+        # One occurrence per day, whatever times of day the rule has
+        for day in sorted({day_start(day) for day in days}):
+            if day not in skipped:
+                occurrences.append(_occurrence(rule, day))
+    return occurrences
+
+def _occurrence(rule, day):
+    task = {field: rule.get(field) for field in TASK_FIELDS}
+    task.update({
+        "_id": f"{OCCURRENCE_PREFIX}{rule['_id']}:{day.strftime('%Y-%m-%d')}",
+        "user_id": rule["user_id"],
+        "rule_id": rule["_id"],
+        "day": day,
+        "completed": False,
+        "recurring": True
+    })
+    return task
+
+def is_occurrence(task_id):
+    """Whether a task id refers to a not yet stored occurrence of a recurring rule"""
+    return isinstance(task_id, str) and task_id.startswith(OCCURRENCE_PREFIX)
+
+def _split_ids(task_ids):
+    task_ids = list(task_ids)
+    return [t for t in task_ids if not is_occurrence(t)], [t for t in task_ids if is_occurrence(t)]
+
+def _parse_occurrence_id(occurrence_id):
+    rule_id, day = occurrence_id[len(OCCURRENCE_PREFIX):].rsplit(":", 1)
+    # Rules stored in MongoDB have ObjectIds; the in-memory database uses strings
+    return (ObjectId(rule_id) if ObjectId.is_valid(rule_id) else rule_id), datetime.strptime(day, "%Y-%m-%d")
+
+def _load_occurrences(db, occurrence_ids):
+    parsed = [_parse_occurrence_id(o) for o in occurrence_ids]
+    if not parsed:
+        return []
+    rules = {rule["_id"]: rule for rule in db["task_rules"].find({"_id": {"$in": list({r for r, _ in parsed})}})}
+    return [_occurrence(rules[rule_id], day) for rule_id, day in parsed if rule_id in rules]
+
+def get_occurrence(db, occurrence_id):
+    """The occurrence an occurrence id refers to, or None if its rule is gone"""
+    occurrences = _load_occurrences(db, [occurrence_id])
+    return occurrences[0] if occurrences else None
+
+# ---------------------------------------------------------------------------
+# Migration and history
+# ---------------------------------------------------------------------------
+
+def migrate_task_days(db):
+    """Convert tasks stored with a "%Y-%m-%d" date string to the day field; runs once per database
+
+    Returns the number of migrated tasks.
+    """
+    migrations = db["job_watermarks"]
+    if migrations.find_one({"_id": DAY_MIGRATION_ID}):
+        return 0
+
+    tasks = db["user_tasks"]
+    migrated = 0
+    batch = []
+    for task in tasks.find({"day": {"$exists": False}}, {"date": 1, "created_at": 1}):
+        try:
+            day = datetime.strptime(task.get("date", ""), "%Y-%m-%d")
+        except (TypeError, ValueError):
+            day = day_start(task.get("created_at") or datetime.now())
+        batch.append(pymongo.UpdateOne({"_id": task["_id"]}, {"$set": {"day": day}, "$unset": {"date": ""}}))
+        if len(batch) >= MIGRATION_BATCH_SIZE:
+            migrated += tasks.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        migrated += tasks.bulk_write(batch, ordered=False).modified_count
+
+    migrations.update_one({"_id": DAY_MIGRATION_ID}, {"$set": {"completed_at": datetime.now(), "migrated": migrated}}, upsert=True)
+    return migrated
+
+def recent_completed_tasks(db, user_id, limit=RECENT_LIMIT):
+    """The most recently completed tasks, newest first (served by the user_id/completed/completed_at index)"""
+    return list(
+        db["user_tasks"].find({"user_id": user_id, "completed": True})
+        .sort("completed_at", pymongo.DESCENDING)
+        .limit(limit)
+    )
+
+def weekly_trend(stats, weeks=TREND_WEEKS, today=None):
+    """Completed tasks and minutes for each of the last few weeks, oldest first"""
+    today = today or datetime.now()
+    starts = [week_start(today - timedelta(weeks=n)) for n in reversed(range(weeks))]
+    by_week = stats.get("weeks", {})
+    return pd.DataFrame({
+        "week": starts,
+        "completed": [by_week.get(w, {}).get("completed", 0) for w in starts],
+        "minutes": [by_week.get(w, {}).get("minutes", 0) for w in starts]
+    })
+
+def type_breakdown(stats):
+    """Per task type totals and completion rates, most used types first"""
+    rows = [
+        (task_type, counts.get("total", 0), counts.get("completed", 0), counts.get("minutes", 0))
+        for task_type, counts in stats.get("types", {}).items()
+        if counts.get("total", 0) > 0
+    ]
+    frame = pd.DataFrame(rows, columns=["Task Type", "Total", "Completed", "Minutes"])
+    frame["Completion Rate (%)"] = (frame["Completed"] / frame["Total"].where(frame["Total"] > 0) * 100).fillna(0).round(1)
+    return frame.sort_values("Total", ascending=False, ignore_index=True)
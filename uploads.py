@@ -0,0 +1,159 @@
+"""
+Upload handling for note images
+
+Streamlit's file uploader returns the same files on every rerun. Uploads are
+staged once: a file whose (name, size) was already staged is skipped without
+being read, and the rest are keyed by the SHA-256 of their content so the
+same image uploaded under another name is still kept once. Files larger than
+SPOOL_MAX_MEMORY are streamed in chunks to a temporary file instead of being
+copied into memory.
+
+Staged images hold BlobRefs, so the blob store keeps them for as long as the
+session has them in its form state. An image whose blob was released anyway
+is dropped from the staged list when saving, so uploading it again stages it
+afresh.
+
+Saved materials hold references ({"name", "blob", "size", "type"}) to
+content-addressed documents in the material_blobs collection, each stored
+once with a reference count, instead of inline base64 copies. Materials
+saved before this still carry {"name", "data"} and are read as before.
+"""
+
+import base64
+import os
+import pymongo
+import streamlit as st
+from datetime import datetime
+from session_memory import BlobRef, blob_store, get_blob, put_blob
+
+SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", str(256 * 1024)))
+MAX_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(8 * 1024 * 1024)))  # well under MongoDB's 16MB document limit
+
+def _file_size(uploaded_file):
+    size = getattr(uploaded_file, "size", None)
+    if size is None:
+        uploaded_file.seek(0, os.SEEK_END)
+        size = uploaded_file.tell()
+    return size
+
+def stage_upload(uploaded_file):
+    """Store an uploaded file in the blob store and return its reference, or None if it is too large"""
+    size = _file_size(uploaded_file)
+    if size > MAX_IMAGE_BYTES:
+        st.toast(f"{uploaded_file.name} is larger than {MAX_IMAGE_BYTES // (1024 * 1024)}MB and was skipped", icon="⚠️")
+        return None
+    uploaded_file.seek(0)
+    if size > SPOOL_MAX_MEMORY:
+        ref, size = blob_store.put_stream(uploaded_file)
+    else:
+        ref = put_blob(uploaded_file.read())
+    return {"name": uploaded_file.name, "blob": ref, "size": size, "type": getattr(uploaded_file, "type", None)}
+
+def stage_uploads(images, uploaded_files):
+    """Add uploaded files not already in images (by name and size, then by content); returns the number added"""
+    seen = {(image["name"], image.get("size")) for image in images}
+    seen.update(tuple(alias) for image in images for alias in image.get("aliases", []))
+    known = {image["blob"]: image for image in images}
+    added = 0
+    for uploaded_file in uploaded_files:
+        key = (uploaded_file.name, _file_size(uploaded_file))
+        if key in seen:
+            continue
+        seen.add(key)
+        image = stage_upload(uploaded_file)
+        if image is None:
+            continue
+        if image["blob"] in known:
+            # Same content under another name: remember the name so later reruns skip it unread
+            known[image["blob"]].setdefault("aliases", []).append(list(key))
+            continue
+        images.append(image)
+        known[image["blob"]] = image
+        added += 1
+    return added
+
+def edit_images(material):
+    """Staged references for a saved material's images, for the edit form"""
+    images = []
+    for image in material.get("images", []):
+        if "data" in image:
+            # Inline base64 from before blob storage
+            data = base64.b64decode(image["data"])
+            images.append({"name": image["name"], "blob": put_blob(data), "size": len(data), "type": None})
+        else:
+            # A BlobRef, so the session's form state counts as a reference to it
+            images.append(dict(image, blob=BlobRef(image["blob"])))
+    return images
+
+def _blob_document(image, data):
+    return {"data": data, "size": len(data), "type": image.get("type"), "created_at": datetime.now()}
+
+def save_images(db, images):
+    """Store staged images once each in material_blobs and return the references for the material
+
+    Returns None, without storing anything, if some images are no longer
+    available; those are removed from images so the same files can be staged
+    again.
+    """
+    refs = {}
+    for image in images:
+        refs.setdefault(image["blob"], image)
+    if not refs:
+        return []
+
+    blobs = db["material_blobs"]
+    stored = {doc["_id"] for doc in blobs.find({"_id": {"$in": list(refs)}}, {"_id": 1})}
+    missing = {ref for ref in refs if ref not in stored and ref not in blob_store}
+    if missing:
+        for ref in missing:
+            st.toast(f"Image {refs[ref]['name']} is no longer available; please upload it again.", icon="⚠️")
+        images[:] = [image for image in images if image["blob"] not in missing]
+        return None
+
+    requests = []
+    saved = []
+    unsent = set()  # indexes of requests sent without the data, for blobs already stored
+    for ref, image in refs.items():
+        update = {"$inc": {"refs": 1}}
+        data = None if ref in stored else get_blob(ref)
+        if data is None:
+            unsent.add(len(requests))
+        else:
+            update["$setOnInsert"] = _blob_document(image, data)
+        requests.append(pymongo.UpdateOne({"_id": str(ref)}, update, upsert=True))
+        saved.append({"name": image["name"], "blob": str(ref), "size": image.get("size"), "type": image.get("type")})
+
+    result = blobs.bulk_write(requests, ordered=False)
+    # A blob found above but deleted by release_images before the write was inserted without its data
+    for index in unsent.intersection(result.upserted_ids):
+        ref = saved[index]["blob"]
+        data = get_blob(ref)
+        if data is not None:
+            blobs.update_one({"_id": ref}, {"$set": _blob_document(refs[ref], data)})
+        else:
+            blobs.delete_one({"_id": ref, "data": {"$exists": False}})
+            st.toast(f"Image {saved[index]['name']} is no longer available and was not saved.", icon="⚠️")
+            saved[index] = None
+    return [image for image in saved if image is not None]
+
+def load_image(db, image):
+    """The bytes of a saved image, from an inline copy, this worker's blob store or material_blobs"""
+    if "data" in image:
+        return base64.b64decode(image["data"])
+    data = get_blob(image["blob"])
+    if data is None:
+        doc = db["material_blobs"].find_one({"_id": image["blob"]}, {"data": 1})
+        if doc is None:
+            return None
+        data = bytes(doc["data"])
+        put_blob(data)
+    return data
+
+def release_images(db, images):
+    """Drop a material's references and delete blobs no material uses any more"""
+    refs = list({image["blob"] for image in images if "blob" in image})
+    if not refs:
+        return
+    blobs = db["material_blobs"]
+    blobs.bulk_write([pymongo.UpdateOne({"_id": ref}, {"$inc": {"refs": -1}}) for ref in refs], ordered=False)
+    blobs.delete_many({"_id": {"$in": refs}, "refs": {"$lte": 0}})